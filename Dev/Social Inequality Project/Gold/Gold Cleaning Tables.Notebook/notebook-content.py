@@ -26,19 +26,41 @@
 # META   }
 # META }
 
+# MARKDOWN ********************
+
+# # Gold Layer Build
+# Every table is built in the `staging` schema of the Gold Lakehouse. Each cell registers a step with the tables it reads and writes, and the steps are run with **Pipeline Scheduler (NB)** (independent steps in parallel, unchanged steps skipped by the build cache). Power BI keeps reading the published tables in `dbo` until the last cell publishes the whole set at once with **Gold Publish (NB)**. If a cell fails, nothing is published and `dbo` stays on the previous release (`rollback_gold()` goes back to an earlier one).
+
+# PARAMETERS CELL ********************
+
+# Schema onde as tabelas Gold são construídas (dbo só é alterado pela publicação no fim)
+gold_schema = "staging"
+publish = True
+use_build_cache = True
+# Substituir os agregados do Banco Mundial na Fact_Benchmarks pelos recalculados a partir dos países
+replace_benchmark_aggregates = False
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
 # CELL ********************
 
-from pyspark.sql import functions as F
+spark.sql(f"CREATE SCHEMA IF NOT EXISTS gold_lakehouse.{gold_schema}")
 
-df_countries_silver = spark.read.table("silver_lakehouse.dbo.Countries_Social_Barriers")
+# METADATA ********************
 
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-df_countries_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Social_Barriers")
+# CELL ********************
 
-print("✅ Tabela Gold criada !")
+%run Pipeline Scheduler (NB)
 
 # METADATA ********************
 
@@ -49,52 +71,29 @@ print("✅ Tabela Gold criada !")
 
 # CELL ********************
 
-from pyspark.sql import functions as F
+%run Data Lineage (NB)
 
-# 1. Definição do Dicionário de Mapeamento
-data = [
-    ("AFE", "Africa Eastern and Southern"), ("AFW", "Africa Western and Central"),
-    ("ARB", "Arab World"), ("CEB", "Central Europe and the Baltics"),
-    ("CHI", "Channel Islands"), ("CSS", "Caribbean small states"),
-    ("EAP", "East Asia & Pacific (excluding high income)"), ("EAR", "Early-demographic dividend"),
-    ("EAS", "East Asia & Pacific"), ("ECA", "Europe & Central Asia (excluding high income)"),
-    ("ECS", "Europe & Central Asia"), ("EMU", "Euro area"),
-    ("EUU", "European Union"), ("FCS", "Fragile and conflict affected situations"),
-    ("HIC", "High income"), ("HPC", "Heavily indebted poor countries (HIPC)"),
-    ("IBD", "IBRD only"), ("IBT", "IBRD & IDA total"),
-    ("IDA", "IDA total"), ("IDB", "IDA blend"),
-    ("IDX", "IDA only"), ("LAC", "Latin America & Caribbean (excluding high income)"),
-    ("LCN", "Latin America & Caribbean"), ("LDC", "Least developed countries: UN classification"),
-    ("LIC", "Low income"), ("LMC", "Lower middle income"),
-    ("LMY", "Low & middle income"), ("LTE", "Late-demographic dividend"),
-    ("MEA", "Middle East & North Africa (excluding high income)"), ("MIC", "Middle income"),
-    ("MNA", "Middle East & North Africa"), ("NAC", "North America"),
-    ("OED", "OECD members"), ("OSS", "Other small states"),
-    ("PRE", "Pre-demographic dividend"), ("PSS", "Pacific island small states"),
-    ("PST", "Post-demographic dividend"), ("SAS", "South Asia"),
-    ("SSA", "Sub-Saharan Africa (excluding high income)"), ("SSF", "Sub-Saharan Africa"),
-    ("SST", "Small states"), ("TEA", "East Asia & Pacific (IDA & IBRD countries)"),
-    ("TEC", "Europe & Central Asia (IDA & IBRD countries)"), ("TLA", "Latin America & the Caribbean (IDA & IBRD countries)"),
-    ("TMN", "Middle East & North Africa (IDA & IBRD countries)"), ("TSA", "South Asia (IDA & IBRD countries)"),
-    ("TSS", "Sub-Saharan Africa (IDA & IBRD countries)"), ("UMC", "Upper middle income"),
-    ("WLD", "World")
-]
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
 
-df_descricoes = spark.createDataFrame(data, ["Aggregate_Code", "Description"])
+%run Inequality Metrics (NB)
 
-df_aggregates_silver = spark.read.table("silver_lakehouse.dbo.Global_Social_Barriers") \
-    .withColumnRenamed("Country_Code", "Aggregate_Code")
+# METADATA ********************
 
-df_gold_aggregates = df_aggregates_silver.join(df_descricoes, on="Aggregate_Code", how="inner") \
-    .withColumn("Entity_Type", F.lit("Aggregate/Benchmark"))
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-df_gold_aggregates.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Benchmarks")
+# CELL ********************
 
-print("✅ Tabela Gold de Agregados criada e mapeada!")
-df_gold_aggregates.select("Aggregate_Code", "Description").distinct().show(5, truncate=False)
+%run Country Code Crosswalk (NB)
 
 # METADATA ********************
 
@@ -107,12 +106,21 @@ df_gold_aggregates.select("Aggregate_Code", "Description").distinct().show(5, tr
 
 from pyspark.sql import functions as F
 
-df_geo_silver = spark.read.table("silver_lakehouse.dbo.geography")
 
-df_geo_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Dim_Geography")
+@step(
+    inputs=["silver_lakehouse.dbo.Countries_Social_Barriers"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers"]
+)
+def gold_social_barriers():
+    df_countries_silver = spark.read.table("silver_lakehouse.dbo.Countries_Social_Barriers")
+
+
+    df_countries_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers")
+
+    print("✅ Tabela Gold criada !")
 
 # METADATA ********************
 
@@ -125,12 +133,56 @@ df_geo_silver.write.format("delta") \
 
 from pyspark.sql import functions as F
 
-df_geo_silver = spark.read.table("silver_lakehouse.dbo.Dim_Date")
 
-df_geo_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Dim_Date")
+@step(
+    inputs=["silver_lakehouse.dbo.Global_Social_Barriers"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
+)
+def gold_benchmarks():
+    # 1. Definição do Dicionário de Mapeamento
+    data = [
+        ("AFE", "Africa Eastern and Southern"), ("AFW", "Africa Western and Central"),
+        ("ARB", "Arab World"), ("CEB", "Central Europe and the Baltics"),
+        ("CHI", "Channel Islands"), ("CSS", "Caribbean small states"),
+        ("EAP", "East Asia & Pacific (excluding high income)"), ("EAR", "Early-demographic dividend"),
+        ("EAS", "East Asia & Pacific"), ("ECA", "Europe & Central Asia (excluding high income)"),
+        ("ECS", "Europe & Central Asia"), ("EMU", "Euro area"),
+        ("EUU", "European Union"), ("FCS", "Fragile and conflict affected situations"),
+        ("HIC", "High income"), ("HPC", "Heavily indebted poor countries (HIPC)"),
+        ("IBD", "IBRD only"), ("IBT", "IBRD & IDA total"),
+        ("IDA", "IDA total"), ("IDB", "IDA blend"),
+        ("IDX", "IDA only"), ("LAC", "Latin America & Caribbean (excluding high income)"),
+        ("LCN", "Latin America & Caribbean"), ("LDC", "Least developed countries: UN classification"),
+        ("LIC", "Low income"), ("LMC", "Lower middle income"),
+        ("LMY", "Low & middle income"), ("LTE", "Late-demographic dividend"),
+        ("MEA", "Middle East & North Africa (excluding high income)"), ("MIC", "Middle income"),
+        ("MNA", "Middle East & North Africa"), ("NAC", "North America"),
+        ("OED", "OECD members"), ("OSS", "Other small states"),
+        ("PRE", "Pre-demographic dividend"), ("PSS", "Pacific island small states"),
+        ("PST", "Post-demographic dividend"), ("SAS", "South Asia"),
+        ("SSA", "Sub-Saharan Africa (excluding high income)"), ("SSF", "Sub-Saharan Africa"),
+        ("SST", "Small states"), ("TEA", "East Asia & Pacific (IDA & IBRD countries)"),
+        ("TEC", "Europe & Central Asia (IDA & IBRD countries)"), ("TLA", "Latin America & the Caribbean (IDA & IBRD countries)"),
+        ("TMN", "Middle East & North Africa (IDA & IBRD countries)"), ("TSA", "South Asia (IDA & IBRD countries)"),
+        ("TSS", "Sub-Saharan Africa (IDA & IBRD countries)"), ("UMC", "Upper middle income"),
+        ("WLD", "World")
+    ]
+
+    df_descricoes = spark.createDataFrame(data, ["Aggregate_Code", "Description"])
+
+    df_aggregates_silver = spark.read.table("silver_lakehouse.dbo.Global_Social_Barriers") \
+        .withColumnRenamed("Country_Code", "Aggregate_Code")
+
+    df_gold_aggregates = df_aggregates_silver.join(df_descricoes, on="Aggregate_Code", how="inner") \
+        .withColumn("Entity_Type", F.lit("Aggregate/Benchmark"))
+
+    df_gold_aggregates.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+
+    print("✅ Tabela Gold de Agregados criada e mapeada!")
+    df_gold_aggregates.select("Aggregate_Code", "Description").distinct().show(5, truncate=False)
 
 # METADATA ********************
 
@@ -143,35 +195,40 @@ df_geo_silver.write.format("delta") \
 
 from pyspark.sql import functions as F
 
-# 1. Arredondar Fact_Social_Barriers (Estrutura WIDE)
-# Temos de aplicar o arredondamento a cada coluna de métrica individualmente
-df_social = spark.read.table("gold_lakehouse.dbo.Fact_Social_Barriers")
 
-metric_columns = [
-    "Female_Account_Ownership", "Internet_Access", "Literacy_Rate", 
-    "School_Attendance", "Child_Mortality_Rate", "Life_Expectancy", "MPI"
-]
+@step(
+    inputs=["silver_lakehouse.dbo.geography"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Dim_Geography"]
+)
+def gold_dim_geography():
+    df_geo_silver = spark.read.table("silver_lakehouse.dbo.geography")
 
-for col_name in metric_columns:
-    if col_name in df_social.columns:
-        df_social = df_social.withColumn(col_name, F.round(F.col(col_name), 2))
+    df_geo_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Dim_Geography")
 
-df_social.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable("gold_lakehouse.dbo.Fact_Social_Barriers")
-print("✅ Fact_Social_Barriers: Números arredondados.")
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
+# CELL ********************
 
-# 2. Arredondar Fact_Benchmarks (Estrutura LONG)
-# Aqui é mais fácil, pois só existe uma coluna de valores: "Value"
-df_bench = spark.read.table("gold_lakehouse.dbo.Fact_Benchmarks")
+from pyspark.sql import functions as F
 
-if "Value" in df_bench.columns:
-    df_bench = df_bench.withColumn("Value", F.round(F.col("Value"), 2))
 
-df_bench.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable("gold_lakehouse.dbo.Fact_Benchmarks")
-print("✅ Fact_Benchmarks: Números arredondados.")
+@step(
+    inputs=["silver_lakehouse.dbo.Dim_Date"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Dim_Date"]
+)
+def gold_dim_date():
+    df_date_silver = spark.read.table("silver_lakehouse.dbo.Dim_Date")
 
-# Limpar cache para garantir que o Power BI vê os novos valores
-spark.catalog.clearCache()
+    # Anos novos acrescentados (ver Pipeline Scheduler (NB), secção 3)
+    append_new_keys(df_date_silver, f"gold_lakehouse.{gold_schema}.Dim_Date", ["Year"])
 
 # METADATA ********************
 
@@ -184,51 +241,47 @@ spark.catalog.clearCache()
 
 from pyspark.sql import functions as F
 
-# 1. Carregar as fontes da Silver (Normalizando o nome para country_code_iso3 em todas)
-df_gini = spark.read.table("silver_lakehouse.dbo.gini_index").select(
-    F.col("Country_Code_Iso3").alias("country_code_iso3"), 
-    "Year", 
-    F.col("Value").alias("Gini_Index")
-)
 
-df_hdi = spark.read.table("silver_lakehouse.dbo.hdi").select(
-    F.col("Country_Code_Iso3").alias("country_code_iso3"), 
-    "Year", 
-    F.col("Human_Development_Index").alias("HDI")
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers",
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"
+    ],
+    outputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers",
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"
+    ]
 )
+def round_social_barriers_and_benchmarks():
+    # 1. Arredondar Fact_Social_Barriers (Estrutura WIDE)
+    # Temos de aplicar o arredondamento a cada coluna de métrica individualmente
+    df_social = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers")
 
-df_econ = spark.read.table("silver_lakehouse.dbo.economic_indicators").select(
-    F.col("Country_Code_Iso3").alias("country_code_iso3"), 
-    "Year", 
-    "GDP_per_Capita", 
-    "GDP_Annual_Growth_Pct", 
-    "Inflation_CPI_Pct"
-)
+    metric_columns = [
+        "Female_Account_Ownership", "Internet_Access", "Literacy_Rate", 
+        "School_Attendance", "Child_Mortality_Rate", "Life_Expectancy", "MPI"
+    ]
 
-# 2. Unir as tabelas usando o nome comum
-# Agora todas têm "country_code_iso3", por isso o join funciona perfeitamente
-df_main = df_econ.join(df_gini, ["country_code_iso3", "Year"], "outer") \
-                 .join(df_hdi, ["country_code_iso3", "Year"], "outer")
-
-# 3. Arredondar e selecionar
-df_final = df_main.select(
-    "country_code_iso3",
-    "Year",
-    F.round("Gini_Index", 2).alias("Gini_Index"),
-    F.round("GDP_per_Capita", 2).alias("GDP_per_Capita"),
-    F.round("GDP_Annual_Growth_Pct", 2).alias("GDP_Annual_Growth_Pct"),
-    F.round("Inflation_CPI_Pct", 2).alias("Inflation_CPI_Pct"),
-    F.round("HDI", 3).alias("HDI")
-)
+    for col_name in metric_columns:
+        if col_name in df_social.columns:
+            df_social = df_social.withColumn(col_name, F.round(F.col(col_name), 2))
+
+    df_social.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers")
+    print("✅ Fact_Social_Barriers: Números arredondados.")
 
-# 4. Gravar na Gold
-df_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Macro_Indicators")
 
-print("✅ Fact_Macro_Indicators criada com sucesso!")
-df_final.show(5)
+    # 2. Arredondar Fact_Benchmarks (Estrutura LONG)
+    # Aqui é mais fácil, pois só existe uma coluna de valores: "Value"
+    df_bench = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+
+    if "Value" in df_bench.columns:
+        df_bench = df_bench.withColumn("Value", F.round(F.col("Value"), 2))
+
+    df_bench.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+    print("✅ Fact_Benchmarks: Números arredondados.")
+
+    # Limpar cache para garantir que o Power BI vê os novos valores
+    spark.catalog.clearCache()
 
 # METADATA ********************
 
@@ -241,30 +294,61 @@ df_final.show(5)
 
 from pyspark.sql import functions as F
 
-# 1. Carregar a tabela Income_Share da Silver
-df_wealth = spark.read.table("silver_lakehouse.dbo.income_share")
 
-# 2. Identificar as colunas de métricas (Percentis de rendimento)
-# Geralmente são: Income_Share_Lowest_20pct, Highest_20pct, etc.
-# Vamos arredondar todas as colunas exceto as de identificação
-exclude_cols = ["Country_Code_Iso3", "Year"]
-metric_cols = [c for c in df_wealth.columns if c not in exclude_cols]
-
-# 3. Criar a tabela final com arredondamento e renomear colunas
-df_wealth_final = df_wealth.select(
-    F.col("Country_Code_Iso3"),
-    F.col("Year").cast("long"),
-    *[F.round(F.col(c).cast("double"), 2).alias(c) for c in metric_cols]
+@step(
+    inputs=[
+        "silver_lakehouse.dbo.un_gini_index",
+        "silver_lakehouse.dbo.hdi",
+        "silver_lakehouse.dbo.economic_indicators"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators"]
 )
+def gold_macro_indicators():
+    # 1. Carregar as fontes da Silver (Normalizando o nome para country_code_iso3 em todas)
+    df_gini = spark.read.table("silver_lakehouse.dbo.un_gini_index").select(
+        F.col("Country_Code_Iso3").alias("country_code_iso3"), 
+        "Year", 
+        "Gini_Index"
+    )
+
+    df_hdi = spark.read.table("silver_lakehouse.dbo.hdi").select(
+        F.col("Country_Code_Iso3").alias("country_code_iso3"), 
+        "Year", 
+        F.col("Human_Development_Index").alias("HDI")
+    )
+
+    df_econ = spark.read.table("silver_lakehouse.dbo.economic_indicators").select(
+        F.col("Country_Code_Iso3").alias("country_code_iso3"), 
+        "Year", 
+        "GDP_per_Capita", 
+        "GDP_Annual_Growth_Pct", 
+        "Inflation_CPI_Pct"
+    )
 
-# 4. Gravar na Gold como Fact_Wealth_Distribution
-df_wealth_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Wealth_Distribution")
+    # 2. Unir as tabelas usando o nome comum
+    # Agora todas têm "country_code_iso3", por isso o join funciona perfeitamente
+    df_main = df_econ.join(df_gini, ["country_code_iso3", "Year"], "outer") \
+                     .join(df_hdi, ["country_code_iso3", "Year"], "outer")
+
+    # 3. Arredondar e selecionar
+    df_final = df_main.select(
+        "country_code_iso3",
+        "Year",
+        F.round("Gini_Index", 2).alias("Gini_Index"),
+        F.round("GDP_per_Capita", 2).alias("GDP_per_Capita"),
+        F.round("GDP_Annual_Growth_Pct", 2).alias("GDP_Annual_Growth_Pct"),
+        F.round("Inflation_CPI_Pct", 2).alias("Inflation_CPI_Pct"),
+        F.round("HDI", 3).alias("HDI")
+    )
+
+    # 4. Gravar na Gold
+    df_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
 
-print("✅ Fact_Wealth_Distribution criada com sucesso na Gold!")
-df_wealth_final.show(5)
+    print("✅ Fact_Macro_Indicators criada com sucesso!")
+    df_final.show(5)
 
 # METADATA ********************
 
@@ -277,33 +361,86 @@ df_wealth_final.show(5)
 
 from pyspark.sql import functions as F
 
-# 1. Carregar o que já existe na Benchmarks e o que queremos adicionar (Macro Agregados)
-df_bench_existente = spark.read.table("gold_lakehouse.dbo.Fact_Benchmarks")
-df_macro = spark.read.table("gold_lakehouse.dbo.Fact_Macro_Indicators")
-df_geo = spark.read.table("gold_lakehouse.dbo.Dim_Geography")
 
-# 2. Isolar apenas os 51 agregados da Macro
-valid_codes = df_geo.select("country_code_iso3").distinct()
-df_macro_aggr = df_macro.join(valid_codes, ["country_code_iso3"], "left_anti") \
-    .withColumnRenamed("country_code_iso3", "Aggregate_Code")
+@step(
+    inputs=["silver_lakehouse.dbo.income_share"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"]
+)
+def gold_wealth_distribution():
+    # 1. Carregar a tabela Income_Share da Silver
+    df_wealth = spark.read.table("silver_lakehouse.dbo.income_share")
+
+    # 2. Identificar as colunas de métricas (Percentis de rendimento)
+    # Geralmente são: Income_Share_Lowest_20pct, Highest_20pct, etc.
+    # Vamos arredondar todas as colunas exceto as de identificação
+    exclude_cols = ["Country_Code_Iso3", "Year"]
+    metric_cols = [c for c in df_wealth.columns if c not in exclude_cols]
+
+    # 3. Criar a tabela final com arredondamento e renomear colunas
+    df_wealth_final = df_wealth.select(
+        F.col("Country_Code_Iso3"),
+        F.col("Year").cast("long"),
+        *[F.round(F.col(c).cast("double"), 2).alias(c) for c in metric_cols]
+    )
 
-# 3. Fazer o MERGE (Outer Join)
-# Isto vai juntar as colunas que já existiam com as novas colunas da Macro
-# Se o Aggregate_Code e o Year coincidirem, ele junta na mesma linha.
-df_bench_final = df_bench_existente.join(df_macro_aggr, ["Aggregate_Code", "Year"], "outer")
+    # 4. Gravar na Gold como Fact_Wealth_Distribution
+    df_wealth_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution")
 
-# 4. Limpeza: Remover a última coluna a mais (como pediste)
-cols = df_bench_final.columns
-df_bench_final = df_bench_final.drop(cols[-1])
+    print("✅ Fact_Wealth_Distribution criada com sucesso na Gold!")
+    df_wealth_final.show(5)
 
-# 5. Guardar com as novas colunas
-df_bench_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Benchmarks")
+# METADATA ********************
 
-print("✅ Fact_Benchmarks atualizada!")
-print(f"Novas colunas adicionadas: {[c for c in df_macro_aggr.columns if c not in ['Aggregate_Code', 'Year']]}")
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+
+
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks",
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        "silver_lakehouse.dbo.geography"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
+)
+def benchmarks_add_macro_aggregates():
+    # 1. Carregar o que já existe na Benchmarks e o que queremos adicionar (Macro Agregados)
+    df_bench_existente = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+    df_macro = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    # Os códigos dos países vêm da Silver (os mesmos da Dim_Geography), assim este passo não depende das coordenadas
+    df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+
+    # 2. Isolar apenas os 51 agregados da Macro
+    valid_codes = df_geo.select("country_code_iso3").distinct()
+    df_macro_aggr = df_macro.join(valid_codes, ["country_code_iso3"], "left_anti") \
+        .withColumnRenamed("country_code_iso3", "Aggregate_Code")
+
+    # 3. Fazer o MERGE (Outer Join)
+    # Isto vai juntar as colunas que já existiam com as novas colunas da Macro
+    # Se o Aggregate_Code e o Year coincidirem, ele junta na mesma linha.
+    df_bench_final = df_bench_existente.join(df_macro_aggr, ["Aggregate_Code", "Year"], "outer")
+
+    # 4. Limpeza: Remover a última coluna a mais (como pediste)
+    cols = df_bench_final.columns
+    df_bench_final = df_bench_final.drop(cols[-1])
+
+    # 5. Guardar com as novas colunas
+    df_bench_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+
+    print("✅ Fact_Benchmarks atualizada!")
+    print(f"Novas colunas adicionadas: {[c for c in df_macro_aggr.columns if c not in ['Aggregate_Code', 'Year']]}")
 
 # METADATA ********************
 
@@ -316,20 +453,26 @@ print(f"Novas colunas adicionadas: {[c for c in df_macro_aggr.columns if c not i
 
 from pyspark.sql import functions as F
 
-df_benchmarks = spark.read.table("gold_lakehouse.dbo.Fact_Benchmarks")
 
-# Remover o Kosovo e as colunas indesejadas
-df_benchmarks_clean = df_benchmarks.filter(
-    F.col("Aggregate_Code") != "XKX"
-).drop("Gini_Index", "MPI")
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
+)
+def benchmarks_remove_kosovo():
+    df_benchmarks = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+
+    # Remover o Kosovo e as colunas indesejadas
+    df_benchmarks_clean = df_benchmarks.filter(
+        F.col("Aggregate_Code") != "XKX"
+    ).drop("Gini_Index", "MPI")
 
-df_benchmarks_clean.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.Fact_Benchmarks")
+    df_benchmarks_clean.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
 
-print("✅ Fact_Benchmarks limpa!")
-print(f"Colunas restantes: {df_benchmarks_clean.columns}")
+    print("✅ Fact_Benchmarks limpa!")
+    print(f"Colunas restantes: {df_benchmarks_clean.columns}")
 
 # METADATA ********************
 
@@ -342,49 +485,82 @@ print(f"Colunas restantes: {df_benchmarks_clean.columns}")
 
 from pyspark.sql import functions as F
 
-df_earnings_silver = spark.read.table("silver_lakehouse.dbo.monthly_employee_earnings")
-df_geography = spark.read.table("gold_lakehouse.dbo.dim_geography")
-df_fact_wealth = spark.read.table("gold_lakehouse.dbo.fact_wealth_distribution")
-
-
-valid_years = df_fact_wealth.select(F.col("Year")).distinct()
-
-
-df_earnings_prepared = df_earnings_silver \
-    .withColumnRenamed("year", "Year") \
-    .join(
-        df_geography.select("country_code_numeric", "country_code_iso3"),
-        on="country_code_numeric",
-        how="inner"
-    ) \
-    .join(
-        valid_years,
-        on="Year",
-        how="inner"
-    ) \
-    .select(
-        F.col("country_code_iso3"),
-        F.col("Year"),
-        F.round(F.col("Value"), 2).alias("Monthly_Employee_Earnings")
+
+@step(
+    inputs=[
+        "silver_lakehouse.dbo.un_monthly_employee_earnings",
+        f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"]
+)
+def wealth_add_monthly_earnings():
+    # Uma linha por país/ano (série preferida já escolhida na Silver), só as séries em dólares nominais
+    df_earnings_silver = spark.read.table("silver_lakehouse.dbo.un_monthly_employee_earnings") \
+        .filter(F.col("Currency") == "Currency: U.S. dollars")
+    df_fact_wealth = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+
+    valid_years = df_fact_wealth.select(F.col("Year")).distinct()
+
+
+    df_earnings_prepared = df_earnings_silver \
+        .join(
+            valid_years,
+            on="Year",
+            how="inner"
+        ) \
+        .select(
+            F.col("country_code_iso3"),
+            F.col("Year"),
+            F.round(F.col("Monthly_Employee_Earnings_Total"), 2).alias("Monthly_Employee_Earnings")
+        )
+
+
+    df_fact_final = df_fact_wealth.join(
+        df_earnings_prepared,
+        on=["country_code_iso3", "Year"],
+        how="left"
     )
 
+    # 5. Gravação
+    print("🚀 A atualizar Fact_Wealth_Distribution...")
 
-df_fact_final = df_fact_wealth.join(
-    df_earnings_prepared,
-    on=["country_code_iso3", "Year"],
-    how="left"
+    df_fact_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+    print("✅ Concluído! Monthly_Employee_Earnings integrado na Fact.")
+    df_fact_final.select("country_code_iso3", "Year", "Monthly_Employee_Earnings").show(5)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+
+
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"]
 )
+def wealth_keep_years_from_2010():
+    df_fact_wealth_filtered = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution") \
+        .filter(F.col("Year") >= 2010)
 
-# 5. Gravação
-print("🚀 A atualizar Fact_Wealth_Distribution...")
+    print("🚀 A filtrar Fact_Wealth_Distribution para anos >= 2010...")
 
-df_fact_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.fact_wealth_distribution")
+    df_fact_wealth_filtered.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
 
-print("✅ Concluído! Monthly_Employee_Earnings integrado na Fact.")
-df_fact_final.select("country_code_iso3", "Year", "Monthly_Employee_Earnings").show(5)
+    print("✅ Concluído! Tabela filtrada.")
 
 # METADATA ********************
 
@@ -397,17 +573,46 @@ df_fact_final.select("country_code_iso3", "Year", "Monthly_Employee_Earnings").s
 
 from pyspark.sql import functions as F
 
-df_fact_wealth_filtered = df_fact_final.filter(F.col("Year") >= 2010)
 
-print("🚀 A filtrar Fact_Wealth_Distribution para anos >= 2010...")
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        "silver_lakehouse.dbo.unemployment_rate"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators"]
+)
+def macro_add_unemployment():
+    df_macro = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_macro_indicators")
+    df_unemployment_silver = spark.read.table("silver_lakehouse.dbo.unemployment_rate")
 
-df_fact_wealth_filtered.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.fact_wealth_distribution")
 
-print("✅ Concluído! Tabela filtrada.")
+    df_unemployment_subset = df_unemployment_silver.select(
+        "country_code_iso3", 
+        "Year", 
+        "Unemployment_Total"
+    )
 
+    if "Unemployment_Total" in df_macro.columns:
+        df_macro = df_macro.drop("Unemployment_Total")
+
+    df_macro_final = df_macro.join(
+        df_unemployment_subset,
+        on=["country_code_iso3", "Year"],
+        how="left"
+    )
+
+    print("🚀 A atualizar Fact_Macro_Indicators com a taxa de desemprego...")
+
+    df_macro_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_macro_indicators")
+
+    print("✅ Concluído! Coluna Unemployment_Total integrada.")
+
+    df_macro_final.filter(F.col("Year") >= 2010).select(
+        "country_code_iso3", "Year", "Unemployment_Total"
+    ).show(5)
 
 # METADATA ********************
 
@@ -420,37 +625,54 @@ print("✅ Concluído! Tabela filtrada.")
 
 from pyspark.sql import functions as F
 
-df_macro = spark.read.table("gold_lakehouse.dbo.fact_macro_indicators")
-df_unemployment_silver = spark.read.table("silver_lakehouse.dbo.unemployment_rate")
 
-
-df_unemployment_subset = df_unemployment_silver.select(
-    "country_code_iso3", 
-    "Year", 
-    "Unemployment_Total"
+@step(
+    inputs=[
+        "silver_lakehouse.dbo.unemployment_rate",
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
 )
+def benchmarks_add_unemployment():
+    df_unemployment_silver = spark.read.table("silver_lakehouse.dbo.unemployment_rate")
+    df_fact_benchmark = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_benchmarks")
 
-if "Unemployment_Total" in df_macro.columns:
-    df_macro = df_macro.drop("Unemployment_Total")
 
-df_macro_final = df_macro.join(
-    df_unemployment_subset,
-    on=["country_code_iso3", "Year"],
-    how="left"
-)
+    df_unemployment_prepared = df_unemployment_silver \
+        .filter(F.col("Year") >= 2010) \
+        .select(
+            F.col("country_code_iso3").alias("aggregate_code"),
+            F.col("Year"),
+            F.round(F.col("Unemployment_Total"), 2).alias("Unemployment_Rate")
+        )
+
+
+    if "Unemployment_Rate" in df_fact_benchmark.columns:
+        df_fact_benchmark = df_fact_benchmark.drop("Unemployment_Rate")
 
-print("🚀 A atualizar Fact_Macro_Indicators com a taxa de desemprego...")
 
-df_macro_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.fact_macro_indicators")
+    df_benchmark_final = df_fact_benchmark \
+        .filter(F.col("Year") >= 2010) \
+        .join(
+            df_unemployment_prepared,
+            on=["aggregate_code", "Year"],
+            how="left"
+        )
 
-print("✅ Concluído! Coluna Unemployment_Total integrada.")
 
-df_macro_final.filter(F.col("Year") >= 2010).select(
-    "country_code_iso3", "Year", "Unemployment_Total"
-).show(5)
+    full_table_path = f"gold_lakehouse.{gold_schema}.fact_benchmarks"
+    print(f"🚀 A atualizar {full_table_path} com dados de Desemprego (2010+)...")
+
+    df_benchmark_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(full_table_path)
+
+    print(f"✅ Concluído! Coluna Unemployment_Rate integrada na Benchmarks.")
+
+    df_validacao = df_benchmark_final.filter(F.col("Unemployment_Rate").isNotNull())
+    print(f"📊 Registos preenchidos encontrados: {df_validacao.count()}")
+    df_validacao.select("aggregate_code", "Year", "Unemployment_Rate").show(10)
 
 # METADATA ********************
 
@@ -463,45 +685,45 @@ df_macro_final.filter(F.col("Year") >= 2010).select(
 
 from pyspark.sql import functions as F
 
-df_unemployment_silver = spark.read.table("silver_lakehouse.dbo.unemployment_rate")
-df_fact_benchmark = spark.read.table("gold_lakehouse.dbo.fact_benchmarks")
 
-
-df_unemployment_prepared = df_unemployment_silver \
-    .filter(F.col("Year") >= 2010) \
-    .select(
-        F.col("country_code_iso3").alias("aggregate_code"),
-        F.col("Year"),
-        F.round(F.col("Unemployment_Total"), 2).alias("Unemployment_Rate")
-    )
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
+)
+def benchmarks_drop_empty_rows():
+    df_benchmark = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_benchmarks")
 
 
-if "Unemployment_Rate" in df_fact_benchmark.columns:
-    df_fact_benchmark = df_fact_benchmark.drop("Unemployment_Rate")
+    metrics_to_check = [
+        "Female_Account_Ownership",
+        "Internet_Access",
+        "Literacy_Rate",
+        "School_Attendance",
+        "Child_Mortality_Rate",
+        "Life_Expectancy",
+        "GDP_per_Capita",
+        "GDP_Annual_Growth_Pct",
+        "Inflation_CPI_Pct",
+        "Unemployment_Rate"
+    ]
 
+    existing_metrics = [c for c in metrics_to_check if c in df_benchmark.columns]
 
-df_benchmark_final = df_fact_benchmark \
-    .filter(F.col("Year") >= 2010) \
-    .join(
-        df_unemployment_prepared,
-        on=["aggregate_code", "Year"],
-        how="left"
-    )
 
+    df_benchmark_clean = df_benchmark.dropna(how='all', subset=existing_metrics)
 
-full_table_path = "gold_lakehouse.dbo.fact_benchmarks"
-print(f"🚀 A atualizar {full_table_path} com dados de Desemprego (2010+)...")
+    print(f"🧹 A limpar Fact_Benchmark...")
+    print(f"📉 Registos antes: {df_benchmark.count()}")
+    print(f"📈 Registos depois: {df_benchmark_clean.count()}")
 
-df_benchmark_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(full_table_path)
+    df_benchmark_clean.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_benchmarks")
 
-print(f"✅ Concluído! Coluna Unemployment_Rate integrada na Benchmarks.")
+    print("✅ Concluído! A tabela agora contém apenas anos e entidades com dados reais.")
 
-df_validacao = df_benchmark_final.filter(F.col("Unemployment_Rate").isNotNull())
-print(f"📊 Registos preenchidos encontrados: {df_validacao.count()}")
-df_validacao.select("aggregate_code", "Year", "Unemployment_Rate").show(10)
+    df_benchmark_clean.select("Aggregate_Code", "Year", "GDP_per_Capita", "Unemployment_Rate").show(10)
 
 # METADATA ********************
 
@@ -514,39 +736,160 @@ df_validacao.select("aggregate_code", "Year", "Unemployment_Rate").show(10)
 
 from pyspark.sql import functions as F
 
-df_benchmark = spark.read.table("gold_lakehouse.dbo.fact_benchmarks")
 
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Dim_Geography"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Dim_Geography"]
+)
+def geography_country_coordinates():
+    # 1. Carregar a tua tabela
+    df_geo = spark.read.table(f"gold_lakehouse.{gold_schema}.dim_geography")
+
+    # 2. Dicionário de REGIONS (Topo da Hierarquia)
+    regions_coords = {
+        "Africa": (1.0, 17.0), "Americas": (15.0, -85.0), "Antarctica": (-75.0, 0.0),
+        "Asia": (35.0, 90.0), "Europe": (50.0, 15.0), "Oceania": (-25.0, 140.0)
+    }
+
+    # 3. DICIONÁRIO COMPLETO (249 Países e Territórios)
+    # Organizado por ordem alfabética conforme a tua lista
+    all_countries_coords = {
+        "Afghanistan": (33.9, 67.7), "Albania": (41.1, 20.2), "Algeria": (28.0, 1.6), "American Samoa": (-14.3, -170.1),
+        "Andorra": (42.5, 1.5), "Angola": (-11.2, 17.8), "Anguilla": (18.2, -63.1), "Antarctica": (-75.0, 0.0),
+        "Antigua and Barbuda": (17.1, -61.8), "Argentina": (-38.4, -63.6), "Armenia": (40.1, 45.0), "Aruba": (12.5, -70.0),
+        "Australia": (-25.3, 133.8), "Austria": (47.5, 14.5), "Azerbaijan": (40.1, 47.6), "Bahamas": (25.0, -77.4),
+        "Bahrain": (26.1, 50.5), "Bangladesh": (23.7, 90.4), "Barbados": (13.2, -59.5), "Belarus": (53.7, 28.0),
+        "Belgium": (50.5, 4.5), "Belize": (17.2, -88.5), "Benin": (9.3, 2.3), "Bermuda": (32.3, -64.8),
+        "Bhutan": (27.5, 90.4), "Bolivia (Plurinational State of)": (-16.3, -63.6), "Bonaire, Sint Eustatius and Saba": (12.2, -68.3),
+        "Bosnia and Herzegovina": (43.9, 17.7), "Botswana": (-22.3, 24.7), "Bouvet Island": (-54.4, 3.4), "Brazil": (-14.2, -51.9),
+        "British Indian Ocean Territory": (-6.0, 71.5), "British Virgin Islands": (18.4, -64.6), "Brunei Darussalam": (4.5, 114.7),
+        "Bulgaria": (42.7, 25.5), "Burkina Faso": (12.2, -1.6), "Burundi": (-3.4, 29.9), "Cabo Verde": (16.0, -24.0),
+        "Cambodia": (12.6, 104.9), "Cameroon": (7.4, 12.4), "Canada": (56.1, -106.3), "Cayman Islands": (19.3, -81.3),
+        "Central African Republic": (6.6, 20.9), "Chad": (15.5, 18.7), "Chile": (-35.7, -71.5), "China": (35.9, 104.2),
+        "China, Hong Kong Special Administrative Region": (22.3, 114.2), "China, Macao Special Administrative Region": (22.2, 113.5),
+        "Christmas Island": (-10.5, 105.7), "Cocos (Keeling) Islands": (-12.2, 96.8), "Colombia": (4.6, -74.3), "Comoros": (-11.6, 43.3),
+        "Congo": (-0.2, 15.8), "Cook Islands": (-21.2, -159.8), "Costa Rica": (9.7, -83.8), "Croatia": (45.1, 15.2),
+        "Cuba": (21.5, -77.8), "Curaçao": (12.2, -69.0), "Cyprus": (35.1, 33.4), "Czechia": (49.8, 15.5), "Côte d’Ivoire": (7.5, -5.5),
+        "Democratic People's Republic of Korea": (40.3, 127.5), "Democratic Republic of the Congo": (-4.0, 21.7), "Denmark": (56.3, 9.5),
+        "Djibouti": (11.8, 42.6), "Dominica": (15.4, -61.4), "Dominican Republic": (18.7, -70.2), "Ecuador": (-1.8, -78.2),
+        "Egypt": (26.8, 30.8), "El Salvador": (13.8, -88.9), "Equatorial Guinea": (1.6, 10.3), "Eritrea": (15.2, 39.8),
+        "Estonia": (58.6, 25.0), "Eswatini": (-26.5, 31.5), "Ethiopia": (9.1, 40.5), "Falkland Islands (Malvinas)": (-51.8, -59.5),
+        "Faroe Islands": (61.9, -6.9), "Fiji": (-17.7, 178.1), "Finland": (61.9, 25.7), "France": (46.2, 2.2),
+        "French Guiana": (3.9, -53.1), "French Polynesia": (-17.7, -149.4), "French Southern Territories": (-49.2, 69.4), "Gabon": (-0.8, 11.6),
+        "Gambia": (13.4, -15.3), "Georgia": (42.3, 43.4), "Germany": (51.2, 10.5), "Ghana": (7.9, -1.0), "Gibraltar": (36.1, -5.3),
+        "Greece": (39.1, 21.8), "Greenland": (71.7, -42.6), "Grenada": (12.1, -61.7), "Guadeloupe": (16.2, -61.6), "Guam": (13.4, 144.8),
+        "Guatemala": (15.8, -90.2), "Guernsey": (49.5, -2.6), "Guinea": (9.9, -9.7), "Guinea-Bissau": (11.8, -15.2), "Guyana": (4.9, -58.9),
+        "Haiti": (18.9, -72.7), "Heard Island and McDonald Islands": (-53.1, 73.5), "Holy See": (41.9, 12.5), "Honduras": (15.2, -86.2),
+        "Hungary": (47.2, 19.5), "Iceland": (64.9, -18.1), "India": (20.6, 78.9), "Indonesia": (-0.8, 113.9),
+        "Iran (Islamic Republic of)": (32.4, 53.7), "Iraq": (33.2, 43.7), "Ireland": (53.4, -8.2), "Isle of Man": (54.2, -4.5),
+        "Israel": (31.0, 34.9), "Italy": (41.9, 12.6), "Jamaica": (18.1, -77.3), "Japan": (36.2, 138.3), "Jersey": (49.2, -2.1),
+        "Jordan": (30.6, 36.2), "Kazakhstan": (48.0, 66.9), "Kenya": (-0.02, 37.9), "Kiribati": (-3.4, -168.7), "Kuwait": (29.3, 47.5),
+        "Kyrgyzstan": (41.2, 74.8), "Lao People's Democratic Republic": (19.9, 102.5), "Latvia": (56.9, 24.6), "Lebanon": (33.9, 35.9),
+        "Lesotho": (-29.6, 28.2), "Liberia": (6.4, -9.4), "Libya": (26.3, 17.2), "Liechtenstein": (47.2, 9.5), "Lithuania": (55.2, 23.9),
+        "Luxembourg": (49.8, 6.1), "Madagascar": (-18.8, 46.9), "Malawi": (-13.3, 34.3), "Malaysia": (4.2, 102.0),
+        "Maldives": (3.2, 73.2), "Mali": (17.6, -3.9), "Malta": (35.9, 14.4), "Marshall Islands": (7.1, 171.2), "Martinique": (14.6, -61.0),
+        "Mauritania": (21.0, -10.9), "Mauritius": (-20.3, 57.5), "Mayotte": (-12.8, 45.2), "Mexico": (23.6, -102.6),
+        "Micronesia (Federated States of)": (7.4, 151.2), "Monaco": (43.7, 7.4), "Mongolia": (46.9, 103.8), "Montenegro": (42.7, 19.4),
+        "Montserrat": (16.7, -62.2), "Morocco": (31.8, -7.1), "Mozambique": (-18.7, 35.5), "Myanmar": (21.9, 95.9),
+        "Namibia": (-22.9, 18.5), "Nauru": (-0.5, 166.9), "Nepal": (28.4, 84.1), "Netherlands (Kingdom of the)": (52.1, 5.3),
+        "New Caledonia": (-20.9, 165.6), "New Zealand": (-40.9, 174.9), "Nicaragua": (12.9, -85.2), "Niger": (17.6, 8.1),
+        "Nigeria": (9.1, 8.7), "Niue": (-19.0, -169.9), "Norfolk Island": (-29.0, 167.9), "North Macedonia": (41.6, 21.7),
+        "Northern Mariana Islands": (15.1, 145.7), "Norway": (60.5, 8.4), "Oman": (21.5, 56.0), "Pakistan": (30.4, 69.3),
+        "Palau": (7.5, 134.6), "Panama": (8.5, -80.8), "Papua New Guinea": (-6.3, 143.9), "Paraguay": (-23.4, -58.4),
+        "Peru": (-9.2, -75.0), "Philippines": (12.9, 121.8), "Pitcairn": (-24.7, -127.4), "Poland": (51.9, 19.1),
+        "Portugal": (39.4, -8.2), "Puerto Rico": (18.2, -66.6), "Qatar": (25.3, 51.2), "Republic of Korea": (35.9, 127.7),
+        "Republic of Moldova": (47.4, 28.4), "Romania": (45.9, 25.0), "Russian Federation": (61.5, 105.3), "Rwanda": (-2.0, 29.9),
+        "Réunion": (-21.1, 55.5), "Saint Barthélemy": (17.9, -62.8), "Saint Helena": (-15.9, -5.7), "Saint Kitts and Nevis": (17.4, -62.8),
+        "Saint Lucia": (13.9, -60.9), "Saint Martin (French Part)": (18.1, -63.0), "Saint Pierre and Miquelon": (46.9, -56.3),
+        "Saint Vincent and the Grenadines": (12.9, -61.2), "Samoa": (-13.7, -172.1), "San Marino": (43.9, 12.5),
+        "Sao Tome and Principe": (0.2, 6.6), "Saudi Arabia": (23.9, 45.1), "Senegal": (14.5, -14.5), "Serbia": (44.0, 21.0),
+        "Seychelles": (-4.7, 55.5), "Sierra Leone": (8.5, -11.8), "Singapore": (1.3, 103.8), "Sint Maarten (Dutch part)": (18.0, -63.0),
+        "Slovakia": (48.7, 19.7), "Slovenia": (46.1, 15.0), "Solomon Islands": (-9.6, 160.1), "Somalia": (5.2, 46.2),
+        "South Africa": (-30.6, 22.9), "South Georgia and the South Sandwich Islands": (-54.4, -36.6), "South Sudan": (6.9, 31.3),
+        "Spain": (40.5, -3.7), "Sri Lanka": (7.9, 80.7), "State of Palestine": (31.9, 35.2), "Sudan": (12.9, 30.2),
+        "Suriname": (3.9, -56.0), "Svalbard and Jan Mayen Islands": (77.5, 23.6), "Sweden": (60.1, 18.6), "Switzerland": (46.8, 8.2),
+        "Syrian Arab Republic": (34.8, 39.0), "Taiwan": (23.7, 121.0), "Tajikistan": (38.9, 71.2), "Thailand": (15.9, 100.9),
+        "Timor-Leste": (-8.9, 125.7), "Togo": (8.6, 0.8), "Tokelau": (-9.2, -171.8), "Tonga": (-21.1, -175.2),
+        "Trinidad and Tobago": (10.7, -61.2), "Tunisia": (33.9, 9.5), "Turkmenistan": (39.0, 59.5), "Turks and Caicos Islands": (21.7, -71.8),
+        "Tuvalu": (-7.1, 177.6), "Türkiye": (39.0, 35.2), "Uganda": (1.4, 32.3), "Ukraine": (48.4, 31.2),
+        "United Arab Emirates": (23.4, 53.8), "United Kingdom of Great Britain and Northern Ireland": (55.4, -3.4),
+        "United Republic of Tanzania": (-6.3, 34.9), "United States Minor Outlying Islands": (19.3, -166.6),
+        "United States Virgin Islands": (18.3, -64.9), "United States of America": (37.1, -95.7), "Uruguay": (-32.5, -55.8),
+        "Uzbekistan": (41.4, 64.6), "Vanuatu": (-15.4, 166.9), "Venezuela (Bolivarian Republic of)": (6.4, -66.6),
+        "Viet Nam": (14.0, 108.3), "Wallis and Futuna Islands": (-13.8, -176.2), "Western Sahara": (24.2, -12.9),
+        "Yemen": (15.6, 48.5), "Zambia": (-13.1, 27.8), "Zimbabwe": (-19.0, 29.2), "Åland Islands": (60.2, 20.0)
+    }
+
+    # 4. Criar as Expressões de Latitude e Longitude (Região e País)
+    reg_lat_expr = F.when(F.col("region_name") == "Africa", 1.0)
+    reg_long_expr = F.when(F.col("region_name") == "Africa", 17.0)
+    for r, (la, lo) in regions_coords.items():
+        reg_lat_expr = reg_lat_expr.when(F.col("region_name") == r, la)
+        reg_long_expr = reg_long_expr.when(F.col("region_name") == r, lo)
+
+    c_lat_expr = F.lit(None).cast("double")
+    c_long_expr = F.lit(None).cast("double")
+    for country, (lat, lon) in all_countries_coords.items():
+        c_lat_expr = F.when(F.col("country_or_area") == country, lat).otherwise(c_lat_expr)
+        c_long_expr = F.when(F.col("country_or_area") == country, lon).otherwise(c_long_expr)
+
+    # 5. Aplicar à tabela e Gravar na Gold
+    df_final = df_geo.withColumn("reg_lat", reg_lat_expr) \
+                     .withColumn("reg_long", reg_long_expr) \
+                     .withColumn("country_lat", c_lat_expr) \
+                     .withColumn("country_long", c_long_expr)
+
+    df_final.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable(f"gold_lakehouse.{gold_schema}.dim_geography")
 
-metrics_to_check = [
-    "Female_Account_Ownership",
-    "Internet_Access",
-    "Literacy_Rate",
-    "School_Attendance",
-    "Child_Mortality_Rate",
-    "Life_Expectancy",
-    "GDP_per_Capita",
-    "GDP_Annual_Growth_Pct",
-    "Inflation_CPI_Pct",
-    "Unemployment_Rate"
-]
+# METADATA ********************
 
-existing_metrics = [c for c in metrics_to_check if c in df_benchmark.columns]
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
+# CELL ********************
 
-df_benchmark_clean = df_benchmark.dropna(how='all', subset=existing_metrics)
+from pyspark.sql import functions as F
 
-print(f"🧹 A limpar Fact_Benchmark...")
-print(f"📉 Registos antes: {df_benchmark.count()}")
-print(f"📈 Registos depois: {df_benchmark_clean.count()}")
 
-df_benchmark_clean.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.fact_benchmarks")
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        "bronze_lakehouse.world_bank.population_migration"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators"]
+)
+def macro_add_population():
+    # 1. Carregar a tabela Fact da Gold
+    df_fact = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+
+    # 2. Carregar a tabela de População da Bronze
+    df_pop_bronze = spark.read.table("Bronze_LakeHouse.world_bank.population_migration")
+
+    # 3. Preparar os dados da Bronze (Ajustado aos nomes reais das colunas)
+    df_pop_clean = df_pop_bronze.select(
+        F.col("Country_Code").alias("Pop_Country_Code"), # Nome temporário para o join
+        F.col("Year").cast("int").alias("Pop_Year"),     # Nome temporário para o join
+        F.col("Pop_Total_Count").cast("double")
+    )
+
+    # 4. Executar o Join
+    # Ligamos Country_Code_Iso3 (da Fact) com Pop_Country_Code (da Pop)
+    df_gold_enriched = df_fact.join(
+        df_pop_clean,
+        (df_fact.country_code_iso3 == df_pop_clean.Pop_Country_Code) & 
+        (df_fact.Year == df_pop_clean.Pop_Year),
+        how="left"
+    ).drop("Pop_Country_Code", "Pop_Year") # Removemos as colunas repetidas
 
-print("✅ Concluído! A tabela agora contém apenas anos e entidades com dados reais.")
+    # 5. Gravar de volta na Gold
+    df_gold_enriched.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
 
-df_benchmark_clean.select("Aggregate_Code", "Year", "GDP_per_Capita", "Unemployment_Rate").show(10)
+    print("✅ Fact_Macro_Indicators atualizada com sucesso!")
 
 # METADATA ********************
 
@@ -558,105 +901,69 @@ df_benchmark_clean.select("Aggregate_Code", "Year", "GDP_per_Capita", "Unemploym
 # CELL ********************
 
 from pyspark.sql import functions as F
+from pyspark.sql.window import Window
 
-# 1. Carregar a tua tabela
-df_geo = spark.read.table("gold_lakehouse.dbo.dim_geography")
 
-# 2. Dicionário de REGIONS (Topo da Hierarquia)
-regions_coords = {
-    "Africa": (1.0, 17.0), "Americas": (15.0, -85.0), "Antarctica": (-75.0, 0.0),
-    "Asia": (35.0, 90.0), "Europe": (50.0, 15.0), "Oceania": (-25.0, 140.0)
-}
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks",
+        "bronze_lakehouse.world_bank.population_migration"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Benchmarks"]
+)
+def benchmarks_add_population():
+    # 1. Limpar cache TOTAL do Spark para evitar metadados antigos
+    spark.catalog.clearCache()
+
+    # 2. Ler as tabelas (Usar nomes diferentes para os DataFrames ajuda a depurar)
+    df_bench_raw = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+    df_pop_bronze = spark.read.table("Bronze_LakeHouse.world_bank.population_migration")
+
+    # 3. Preparar a População
+    df_pop_clean = df_pop_bronze.select(
+        F.col("Country_Code").alias("Pop_CC"), 
+        F.col("Year").cast("int").alias("Pop_YR"),
+        F.col("Pop_Total_Count").cast("double")
+    )
 
-# 3. DICIONÁRIO COMPLETO (249 Países e Territórios)
-# Organizado por ordem alfabética conforme a tua lista
-all_countries_coords = {
-    "Afghanistan": (33.9, 67.7), "Albania": (41.1, 20.2), "Algeria": (28.0, 1.6), "American Samoa": (-14.3, -170.1),
-    "Andorra": (42.5, 1.5), "Angola": (-11.2, 17.8), "Anguilla": (18.2, -63.1), "Antarctica": (-75.0, 0.0),
-    "Antigua and Barbuda": (17.1, -61.8), "Argentina": (-38.4, -63.6), "Armenia": (40.1, 45.0), "Aruba": (12.5, -70.0),
-    "Australia": (-25.3, 133.8), "Austria": (47.5, 14.5), "Azerbaijan": (40.1, 47.6), "Bahamas": (25.0, -77.4),
-    "Bahrain": (26.1, 50.5), "Bangladesh": (23.7, 90.4), "Barbados": (13.2, -59.5), "Belarus": (53.7, 28.0),
-    "Belgium": (50.5, 4.5), "Belize": (17.2, -88.5), "Benin": (9.3, 2.3), "Bermuda": (32.3, -64.8),
-    "Bhutan": (27.5, 90.4), "Bolivia (Plurinational State of)": (-16.3, -63.6), "Bonaire, Sint Eustatius and Saba": (12.2, -68.3),
-    "Bosnia and Herzegovina": (43.9, 17.7), "Botswana": (-22.3, 24.7), "Bouvet Island": (-54.4, 3.4), "Brazil": (-14.2, -51.9),
-    "British Indian Ocean Territory": (-6.0, 71.5), "British Virgin Islands": (18.4, -64.6), "Brunei Darussalam": (4.5, 114.7),
-    "Bulgaria": (42.7, 25.5), "Burkina Faso": (12.2, -1.6), "Burundi": (-3.4, 29.9), "Cabo Verde": (16.0, -24.0),
-    "Cambodia": (12.6, 104.9), "Cameroon": (7.4, 12.4), "Canada": (56.1, -106.3), "Cayman Islands": (19.3, -81.3),
-    "Central African Republic": (6.6, 20.9), "Chad": (15.5, 18.7), "Chile": (-35.7, -71.5), "China": (35.9, 104.2),
-    "China, Hong Kong Special Administrative Region": (22.3, 114.2), "China, Macao Special Administrative Region": (22.2, 113.5),
-    "Christmas Island": (-10.5, 105.7), "Cocos (Keeling) Islands": (-12.2, 96.8), "Colombia": (4.6, -74.3), "Comoros": (-11.6, 43.3),
-    "Congo": (-0.2, 15.8), "Cook Islands": (-21.2, -159.8), "Costa Rica": (9.7, -83.8), "Croatia": (45.1, 15.2),
-    "Cuba": (21.5, -77.8), "Curaçao": (12.2, -69.0), "Cyprus": (35.1, 33.4), "Czechia": (49.8, 15.5), "Côte d’Ivoire": (7.5, -5.5),
-    "Democratic People's Republic of Korea": (40.3, 127.5), "Democratic Republic of the Congo": (-4.0, 21.7), "Denmark": (56.3, 9.5),
-    "Djibouti": (11.8, 42.6), "Dominica": (15.4, -61.4), "Dominican Republic": (18.7, -70.2), "Ecuador": (-1.8, -78.2),
-    "Egypt": (26.8, 30.8), "El Salvador": (13.8, -88.9), "Equatorial Guinea": (1.6, 10.3), "Eritrea": (15.2, 39.8),
-    "Estonia": (58.6, 25.0), "Eswatini": (-26.5, 31.5), "Ethiopia": (9.1, 40.5), "Falkland Islands (Malvinas)": (-51.8, -59.5),
-    "Faroe Islands": (61.9, -6.9), "Fiji": (-17.7, 178.1), "Finland": (61.9, 25.7), "France": (46.2, 2.2),
-    "French Guiana": (3.9, -53.1), "French Polynesia": (-17.7, -149.4), "French Southern Territories": (-49.2, 69.4), "Gabon": (-0.8, 11.6),
-    "Gambia": (13.4, -15.3), "Georgia": (42.3, 43.4), "Germany": (51.2, 10.5), "Ghana": (7.9, -1.0), "Gibraltar": (36.1, -5.3),
-    "Greece": (39.1, 21.8), "Greenland": (71.7, -42.6), "Grenada": (12.1, -61.7), "Guadeloupe": (16.2, -61.6), "Guam": (13.4, 144.8),
-    "Guatemala": (15.8, -90.2), "Guernsey": (49.5, -2.6), "Guinea": (9.9, -9.7), "Guinea-Bissau": (11.8, -15.2), "Guyana": (4.9, -58.9),
-    "Haiti": (18.9, -72.7), "Heard Island and McDonald Islands": (-53.1, 73.5), "Holy See": (41.9, 12.5), "Honduras": (15.2, -86.2),
-    "Hungary": (47.2, 19.5), "Iceland": (64.9, -18.1), "India": (20.6, 78.9), "Indonesia": (-0.8, 113.9),
-    "Iran (Islamic Republic of)": (32.4, 53.7), "Iraq": (33.2, 43.7), "Ireland": (53.4, -8.2), "Isle of Man": (54.2, -4.5),
-    "Israel": (31.0, 34.9), "Italy": (41.9, 12.6), "Jamaica": (18.1, -77.3), "Japan": (36.2, 138.3), "Jersey": (49.2, -2.1),
-    "Jordan": (30.6, 36.2), "Kazakhstan": (48.0, 66.9), "Kenya": (-0.02, 37.9), "Kiribati": (-3.4, -168.7), "Kuwait": (29.3, 47.5),
-    "Kyrgyzstan": (41.2, 74.8), "Lao People's Democratic Republic": (19.9, 102.5), "Latvia": (56.9, 24.6), "Lebanon": (33.9, 35.9),
-    "Lesotho": (-29.6, 28.2), "Liberia": (6.4, -9.4), "Libya": (26.3, 17.2), "Liechtenstein": (47.2, 9.5), "Lithuania": (55.2, 23.9),
-    "Luxembourg": (49.8, 6.1), "Madagascar": (-18.8, 46.9), "Malawi": (-13.3, 34.3), "Malaysia": (4.2, 102.0),
-    "Maldives": (3.2, 73.2), "Mali": (17.6, -3.9), "Malta": (35.9, 14.4), "Marshall Islands": (7.1, 171.2), "Martinique": (14.6, -61.0),
-    "Mauritania": (21.0, -10.9), "Mauritius": (-20.3, 57.5), "Mayotte": (-12.8, 45.2), "Mexico": (23.6, -102.6),
-    "Micronesia (Federated States of)": (7.4, 151.2), "Monaco": (43.7, 7.4), "Mongolia": (46.9, 103.8), "Montenegro": (42.7, 19.4),
-    "Montserrat": (16.7, -62.2), "Morocco": (31.8, -7.1), "Mozambique": (-18.7, 35.5), "Myanmar": (21.9, 95.9),
-    "Namibia": (-22.9, 18.5), "Nauru": (-0.5, 166.9), "Nepal": (28.4, 84.1), "Netherlands (Kingdom of the)": (52.1, 5.3),
-    "New Caledonia": (-20.9, 165.6), "New Zealand": (-40.9, 174.9), "Nicaragua": (12.9, -85.2), "Niger": (17.6, 8.1),
-    "Nigeria": (9.1, 8.7), "Niue": (-19.0, -169.9), "Norfolk Island": (-29.0, 167.9), "North Macedonia": (41.6, 21.7),
-    "Northern Mariana Islands": (15.1, 145.7), "Norway": (60.5, 8.4), "Oman": (21.5, 56.0), "Pakistan": (30.4, 69.3),
-    "Palau": (7.5, 134.6), "Panama": (8.5, -80.8), "Papua New Guinea": (-6.3, 143.9), "Paraguay": (-23.4, -58.4),
-    "Peru": (-9.2, -75.0), "Philippines": (12.9, 121.8), "Pitcairn": (-24.7, -127.4), "Poland": (51.9, 19.1),
-    "Portugal": (39.4, -8.2), "Puerto Rico": (18.2, -66.6), "Qatar": (25.3, 51.2), "Republic of Korea": (35.9, 127.7),
-    "Republic of Moldova": (47.4, 28.4), "Romania": (45.9, 25.0), "Russian Federation": (61.5, 105.3), "Rwanda": (-2.0, 29.9),
-    "Réunion": (-21.1, 55.5), "Saint Barthélemy": (17.9, -62.8), "Saint Helena": (-15.9, -5.7), "Saint Kitts and Nevis": (17.4, -62.8),
-    "Saint Lucia": (13.9, -60.9), "Saint Martin (French Part)": (18.1, -63.0), "Saint Pierre and Miquelon": (46.9, -56.3),
-    "Saint Vincent and the Grenadines": (12.9, -61.2), "Samoa": (-13.7, -172.1), "San Marino": (43.9, 12.5),
-    "Sao Tome and Principe": (0.2, 6.6), "Saudi Arabia": (23.9, 45.1), "Senegal": (14.5, -14.5), "Serbia": (44.0, 21.0),
-    "Seychelles": (-4.7, 55.5), "Sierra Leone": (8.5, -11.8), "Singapore": (1.3, 103.8), "Sint Maarten (Dutch part)": (18.0, -63.0),
-    "Slovakia": (48.7, 19.7), "Slovenia": (46.1, 15.0), "Solomon Islands": (-9.6, 160.1), "Somalia": (5.2, 46.2),
-    "South Africa": (-30.6, 22.9), "South Georgia and the South Sandwich Islands": (-54.4, -36.6), "South Sudan": (6.9, 31.3),
-    "Spain": (40.5, -3.7), "Sri Lanka": (7.9, 80.7), "State of Palestine": (31.9, 35.2), "Sudan": (12.9, 30.2),
-    "Suriname": (3.9, -56.0), "Svalbard and Jan Mayen Islands": (77.5, 23.6), "Sweden": (60.1, 18.6), "Switzerland": (46.8, 8.2),
-    "Syrian Arab Republic": (34.8, 39.0), "Taiwan": (23.7, 121.0), "Tajikistan": (38.9, 71.2), "Thailand": (15.9, 100.9),
-    "Timor-Leste": (-8.9, 125.7), "Togo": (8.6, 0.8), "Tokelau": (-9.2, -171.8), "Tonga": (-21.1, -175.2),
-    "Trinidad and Tobago": (10.7, -61.2), "Tunisia": (33.9, 9.5), "Turkmenistan": (39.0, 59.5), "Turks and Caicos Islands": (21.7, -71.8),
-    "Tuvalu": (-7.1, 177.6), "Türkiye": (39.0, 35.2), "Uganda": (1.4, 32.3), "Ukraine": (48.4, 31.2),
-    "United Arab Emirates": (23.4, 53.8), "United Kingdom of Great Britain and Northern Ireland": (55.4, -3.4),
-    "United Republic of Tanzania": (-6.3, 34.9), "United States Minor Outlying Islands": (19.3, -166.6),
-    "United States Virgin Islands": (18.3, -64.9), "United States of America": (37.1, -95.7), "Uruguay": (-32.5, -55.8),
-    "Uzbekistan": (41.4, 64.6), "Vanuatu": (-15.4, 166.9), "Venezuela (Bolivarian Republic of)": (6.4, -66.6),
-    "Viet Nam": (14.0, 108.3), "Wallis and Futuna Islands": (-13.8, -176.2), "Western Sahara": (24.2, -12.9),
-    "Yemen": (15.6, 48.5), "Zambia": (-13.1, 27.8), "Zimbabwe": (-19.0, 29.2), "Åland Islands": (60.2, 20.0)
-}
+    # 4. Resolver nome da coluna de join (Benchmarks)
+    # IMPORTANTE: Se queres padronizar para 'Country_Code_Iso3', fazemos o rename ANTES do join
+    if "Aggregate_Code" in df_bench_raw.columns:
+        df_bench_ready = df_bench_raw.withColumnRenamed("Aggregate_Code", "Country_Code_Iso3")
+    else:
+        df_bench_ready = df_bench_raw
+
+    # Remover Pop_Total_Count se já existir para evitar colunas duplicadas
+    if "Pop_Total_Count" in df_bench_ready.columns:
+        df_bench_ready = df_bench_ready.drop("Pop_Total_Count")
+
+    # 5. Executar o Join
+    df_final = df_bench_ready.join(
+        df_pop_clean,
+        (F.col("Country_Code_Iso3") == F.col("Pop_CC")) &
+        (F.col("Year") == F.col("Pop_YR")),
+        how="left"
+    ).drop("Pop_CC", "Pop_YR")
 
-# 4. Criar as Expressões de Latitude e Longitude (Região e País)
-reg_lat_expr = F.when(F.col("region_name") == "Africa", 1.0)
-reg_long_expr = F.when(F.col("region_name") == "Africa", 17.0)
-for r, (la, lo) in regions_coords.items():
-    reg_lat_expr = reg_lat_expr.when(F.col("region_name") == r, la)
-    reg_long_expr = reg_long_expr.when(F.col("region_name") == r, lo)
+    # 6. Filtros finais e Reordenar
+    # (os códigos já vêm normalizados da Bronze pelo crosswalk, o join é uma igualdade simples)
+    df_final = df_final.filter(F.col("Year") >= 2010)
 
-c_lat_expr = F.lit(None).cast("double")
-c_long_expr = F.lit(None).cast("double")
-for country, (lat, lon) in all_countries_coords.items():
-    c_lat_expr = F.when(F.col("country_or_area") == country, lat).otherwise(c_lat_expr)
-    c_long_expr = F.when(F.col("country_or_area") == country, lon).otherwise(c_long_expr)
+    cols_primeiro = ["Country_Code_Iso3", "Year"]
+    outras_cols = [c for c in df_final.columns if c not in cols_primeiro]
+    df_final = df_final.select(cols_primeiro + outras_cols)
 
-# 5. Aplicar à tabela e Gravar na Gold
-df_final = df_geo.withColumn("reg_lat", reg_lat_expr) \
-                 .withColumn("reg_long", reg_long_expr) \
-                 .withColumn("country_lat", c_lat_expr) \
-                 .withColumn("country_long", c_long_expr)
+    # 7. Gravar na Gold (O segredo está em não tentar ler e mostrar o DF antigo depois disto)
+    df_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
 
-df_final.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable("gold_lakehouse.dbo.dim_geography")
+    # 8. RE-LER a tabela do disco para o Display
+    # Isto força o Spark a ler o novo schema que acabou de ser gravado
+    print("✅ Tabela Gold atualizada com sucesso!")
+    df_view = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+    display(df_view.limit(5))
 
 # METADATA ********************
 
@@ -669,35 +976,108 @@ df_final.write.format("delta").mode("overwrite").option("overwriteSchema", "true
 
 from pyspark.sql import functions as F
 
-# 1. Carregar a tabela Fact da Gold
-df_fact = spark.read.table("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
 
-# 2. Carregar a tabela de População da Bronze
-df_pop_bronze = spark.read.table("Bronze_LakeHouse.world_bank.population_migration")
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        "silver_lakehouse.dbo.geography"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators"]
+)
+def macro_keep_countries():
+    # 1. Carregar as tabelas
+    df_fact = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+
+    # 2. Os códigos já vêm em ISO3 maiúsculo da Bronze (crosswalk), só o nome da coluna é padronizado
+    df_fact = df_fact.withColumnRenamed("country_code_iso3", "Country_Code_Iso3")
+    df_geo = df_geo.select("Country_Code_Iso3")
+
+    # 3. Join de Limpeza: Mantém apenas países que existam na tabela Geography
+    # Isto remove automaticamente SSA, WLD, AFE, etc.
+    df_macro_clean = df_fact.join(F.broadcast(df_geo), on="Country_Code_Iso3", how="left_semi")
+
+    # 4. Gravar na Gold com sobrescrita de Schema
+    df_macro_clean.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+
+    # 5. REFRESH E DIAGNÓSTICO (O segredo para não dar erro)
+    spark.catalog.refreshTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_final = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+
+    print("🚀 Fact_Macro_Indicators sincronizada com a Geografia!")
+
+    # Comparação segura para ver o que foi expulso
+    codigos_antes = df_fact.select("Country_Code_Iso3").distinct()
+    codigos_depois = df_final.select("Country_Code_Iso3").distinct()
+    df_removidos = codigos_antes.subtract(codigos_depois)
+
+    if df_removidos.count() > 0:
+        print(f"⚠️ Foram removidos {df_removidos.count()} códigos (Agregados/Regionais).")
+        display(df_removidos)
+    else:
+        print("✅ A tabela já estava limpa e sincronizada.")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+
 
-# 3. Preparar os dados da Bronze (Ajustado aos nomes reais das colunas)
-df_pop_clean = df_pop_bronze.select(
-    F.col("Country_Code").alias("Pop_Country_Code"), # Nome temporário para o join
-    F.col("Year").cast("int").alias("Pop_Year"),     # Nome temporário para o join
-    F.col("Pop_Total_Count").cast("double")
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        "silver_lakehouse.dbo.geography"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators"]
 )
+def macro_keep_years_from_2010():
+    # 0. Limpar cache para evitar erros de esquema/metadados
+    spark.catalog.clearCache()
+
+    # 1. Carregar as tabelas
+    df_macro = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+
+    # 2. Filtro de Ano (os códigos já vêm normalizados da Bronze pelo crosswalk)
+    df_cleaned = df_macro.filter(F.col("Year") >= 2010) \
+                         .withColumnRenamed("country_code_iso3", "Country_Code_Iso3")
+
+    # 3. Join para garantir que SÓ existem países (remove AFE, SSA, etc.)
+    df_final = df_cleaned.join(
+        F.broadcast(df_geo.select("Country_Code_Iso3")),
+        on="Country_Code_Iso3",
+        how="left_semi"
+    )
+
+    # 4. Reordenar (Corrigido o erro do caractere estranho na linha 23)
+    cols_primeiro = ["Country_Code_Iso3", "Year"]
+    outras_cols = [c for c in df_final.columns if c not in cols_primeiro]
+    df_final = df_final.select(cols_primeiro + outras_cols) # <- Agora sem o símbolo '綁'
 
-# 4. Executar o Join
-# Ligamos Country_Code_Iso3 (da Fact) com Pop_Country_Code (da Pop)
-df_gold_enriched = df_fact.join(
-    df_pop_clean,
-    (df_fact.country_code_iso3 == df_pop_clean.Pop_Country_Code) & 
-    (df_fact.Year == df_pop_clean.Pop_Year),
-    how="left"
-).drop("Pop_Country_Code", "Pop_Year") # Removemos as colunas repetidas
+    # 5. Gravar de volta
+    df_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
 
-# 5. Gravar de volta na Gold
-df_gold_enriched.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
+    # 6. Refresh e Diagnóstico
+    spark.catalog.refreshTable(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_display = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
 
-print("✅ Fact_Macro_Indicators atualizada com sucesso!")
+    print("🧹 Limpeza concluída!")
+    print(f"✅ Nome da coluna mantido: 'Country_Code_Iso3'")
+    print(f"📅 Registos a partir de: {df_display.agg(F.min('Year')).collect()[0][0]}")
+
+    display(df_display.sort("Country_Code_Iso3", "Year").limit(10))
 
 # METADATA ********************
 
@@ -709,60 +1089,155 @@ print("✅ Fact_Macro_Indicators atualizada com sucesso!")
 # CELL ********************
 
 from pyspark.sql import functions as F
-from pyspark.sql.window import Window
 
-# 1. Limpar cache TOTAL do Spark para evitar metadados antigos
-spark.catalog.clearCache()
 
-# 2. Ler as tabelas (Usar nomes diferentes para os DataFrames ajuda a depurar)
-df_bench_raw = spark.read.table("Gold_Lakehouse.dbo.Fact_Benchmarks")
-df_pop_bronze = spark.read.table("Bronze_LakeHouse.world_bank.population_migration")
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Dim_Geography"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Dim_Geography"]
+)
+def geography_intermediate_coordinates():
+    # 1. Carregar a tua dimensão atual
+    # Usamos Spark para ler a tabela de geografia da Gold
+    df_geo = spark.read.table(f"gold_lakehouse.{gold_schema}.dim_geography")
+
+    # 2. Mapeamento das Coordenadas das Regiões Intermédias
+    # Adicionamos as colunas de latitude e longitude baseadas no nome da região
+    df_final = df_geo.withColumn(
+        "intermediate_lat",
+        F.when(F.col("intermediate_region_name") == "Antarctica", -75.0)
+         .when(F.col("intermediate_region_name") == "Australia and New Zealand", -30.0)
+         .when(F.col("intermediate_region_name") == "Caribbean", 15.0)
+         .when(F.col("intermediate_region_name") == "Central America", 13.0)
+         .when(F.col("intermediate_region_name") == "Central Asia", 45.0)
+         .when(F.col("intermediate_region_name") == "Eastern Africa", 1.0)
+         .when(F.col("intermediate_region_name") == "Eastern Asia", 35.0)
+         .when(F.col("intermediate_region_name") == "Eastern Europe", 50.0)
+         .when(F.col("intermediate_region_name") == "Melanesia", -9.0)
+         .when(F.col("intermediate_region_name") == "Micronesia", 7.0)
+         .when(F.col("intermediate_region_name") == "Middle Africa", -1.0)
+         .when(F.col("intermediate_region_name") == "Northern Africa", 25.0)
+         .when(F.col("intermediate_region_name") == "Northern America", 45.0)
+         .when(F.col("intermediate_region_name") == "Northern Europe", 60.0)
+         .when(F.col("intermediate_region_name") == "Polynesia", -18.0)
+         .when(F.col("intermediate_region_name") == "South America", -15.0)
+         .when(F.col("intermediate_region_name") == "South-eastern Asia", 5.0)
+         .when(F.col("intermediate_region_name") == "Southern Africa", -29.0)
+         .when(F.col("intermediate_region_name") == "Southern Asia", 25.0)
+         .when(F.col("intermediate_region_name") == "Southern Europe", 41.0)
+         .when(F.col("intermediate_region_name") == "Western Africa", 14.0)
+         .when(F.col("intermediate_region_name") == "Western Asia", 33.0)
+         .when(F.col("intermediate_region_name") == "Western Europe", 48.0)
+         .otherwise(0.0)
+    ).withColumn(
+        "intermediate_long",
+        F.when(F.col("intermediate_region_name") == "Antarctica", 0.0)
+         .when(F.col("intermediate_region_name") == "Australia and New Zealand", 140.0)
+         .when(F.col("intermediate_region_name") == "Caribbean", -75.0)
+         .when(F.col("intermediate_region_name") == "Central America", -85.0)
+         .when(F.col("intermediate_region_name") == "Central Asia", 65.0)
+         .when(F.col("intermediate_region_name") == "Eastern Africa", 38.0)
+         .when(F.col("intermediate_region_name") == "Eastern Asia", 110.0)
+         .when(F.col("intermediate_region_name") == "Eastern Europe", 35.0)
+         .when(F.col("intermediate_region_name") == "Melanesia", 150.0)
+         .when(F.col("intermediate_region_name") == "Micronesia", 155.0)
+         .when(F.col("intermediate_region_name") == "Middle Africa", 18.0)
+         .when(F.col("intermediate_region_name") == "Northern Africa", 15.0)
+         .when(F.col("intermediate_region_name") == "Northern America", -100.0)
+         .when(F.col("intermediate_region_name") == "Northern Europe", 15.0)
+         .when(F.col("intermediate_region_name") == "Polynesia", -150.0)
+         .when(F.col("intermediate_region_name") == "South America", -60.0)
+         .when(F.col("intermediate_region_name") == "South-eastern Asia", 110.0)
+         .when(F.col("intermediate_region_name") == "Southern Africa", 25.0)
+         .when(F.col("intermediate_region_name") == "Southern Asia", 75.0)
+         .when(F.col("intermediate_region_name") == "Southern Europe", 15.0)
+         .when(F.col("intermediate_region_name") == "Western Africa", 1.0)
+         .when(F.col("intermediate_region_name") == "Western Asia", 40.0)
+         .when(F.col("intermediate_region_name") == "Western Europe", 6.0)
+         .otherwise(0.0)
+    )
+
+    # 3. Gravar na Tabela Gold (Overwrite para atualizar as colunas)
+    df_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.dim_geography")
+
+    print("✅ Dim_Geography atualizada com as coordenadas das regiões intermédias!")
+    display(df_final.select("intermediate_region_name", "intermediate_lat", "intermediate_long").distinct().limit(10))
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-# 3. Preparar a População
-df_pop_clean = df_pop_bronze.select(
-    F.col("Country_Code").alias("Pop_CC"), 
-    F.col("Year").cast("int").alias("Pop_YR"),
-    F.col("Pop_Total_Count").cast("double")
+# CELL ********************
+
+from pyspark.sql import functions as F
+
+
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    outputs=[]
 )
+def wealth_iceland_check():
+    # 1. Carregar a tabela da camada Gold
+    df_gold = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
 
-# 4. Resolver nome da coluna de join (Benchmarks)
-# IMPORTANTE: Se queres padronizar para 'Country_Code_Iso3', fazemos o rename ANTES do join
-if "Aggregate_Code" in df_bench_raw.columns:
-    df_bench_ready = df_bench_raw.withColumnRenamed("Aggregate_Code", "Country_Code_Iso3")
-else:
-    df_bench_ready = df_bench_raw
+    # 2. Diagnóstico: Ver exatamente o que existe para a Islândia
+    print("Verificando dados da Islândia:")
+    df_gold.filter(F.col("country_code_iso3") == "ISL") \
+           .select("country_code_iso3", "Year", "Monthly_Employee_Earnings") \
+           .orderBy("Year") \
+           .show()
 
-# Remover Pop_Total_Count se já existir para evitar colunas duplicadas
-if "Pop_Total_Count" in df_bench_ready.columns:
-    df_bench_ready = df_bench_ready.drop("Pop_Total_Count")
+    # 3. Solução: Filtrar outliers ou valores que parecem ser anuais/moeda errada
+    # O Luxemburgo (topo real) anda pelos 8.000, logo 15.000 é um limite seguro.
+    df_gold_final = df_gold.filter((F.col("Monthly_Employee_Earnings") < 15000) | (F.col("Monthly_Employee_Earnings").isNull()))
 
-# 5. Executar o Join
-df_final = df_bench_ready.join(
-    df_pop_clean,
-    (F.upper(F.col("Country_Code_Iso3")) == F.upper(F.col("Pop_CC"))) & 
-    (F.col("Year") == F.col("Pop_YR")),
-    how="left"
-).drop("Pop_CC", "Pop_YR")
+    # 4. Gravar a tabela limpa ou usar este df_gold_final para o Power BI
+    # df_gold_final.write.mode("overwrite").saveAsTable("fact_wealth_distribution_clean")
 
-# 6. Filtros finais e Reordenar
-df_final = df_final.filter(F.col("Year") >= 2010) \
-                   .withColumn("Country_Code_Iso3", F.upper(F.col("Country_Code_Iso3")))
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+from pyspark.sql import functions as F
 
-cols_primeiro = ["Country_Code_Iso3", "Year"]
-outras_cols = [c for c in df_final.columns if c not in cols_primeiro]
-df_final = df_final.select(cols_primeiro + outras_cols)
 
-# 7. Gravar na Gold (O segredo está em não tentar ler e mostrar o DF antigo depois disto)
-df_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Gold_Lakehouse.dbo.Fact_Benchmarks")
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"]
+)
+def wealth_null_earnings_outliers():
+    # 1. Carregar a tabela (ajusta o nome se necessário)
+    df_gold = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+    # 2. Marcar os outliers (a conversão para PPP usa esta marca) e anulá-los: se o valor for > 15000, vira NULL
+    outlier = F.coalesce(F.col("Monthly_Employee_Earnings") > 15000, F.lit(False))
+    if "Monthly_Earnings_Outlier" in df_gold.columns:
+        outlier = F.coalesce(F.col("Monthly_Earnings_Outlier"), F.lit(False)) | outlier
+    df_gold_corrigido = df_gold.withColumn("Monthly_Earnings_Outlier", outlier).withColumn(
+        "Monthly_Employee_Earnings",
+        F.when(F.col("Monthly_Employee_Earnings") > 15000, F.lit(None))
+         .otherwise(F.col("Monthly_Employee_Earnings"))
+    )
+
+    # 3. Dar OVERWRITE na tabela Gold
+    # ATENÇÃO: Isto vai atualizar a tabela original
+    df_gold_corrigido.write \
+        .format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
 
-# 8. RE-LER a tabela do disco para o Display
-# Isto força o Spark a ler o novo schema que acabou de ser gravado
-print("✅ Tabela Gold atualizada com sucesso!")
-df_view = spark.read.table("Gold_Lakehouse.dbo.Fact_Benchmarks")
-display(df_view.limit(5))
+    print("Sucesso: Valor da Islândia (2016) anulado e tabela Gold atualizada!")
 
 # METADATA ********************
 
@@ -771,44 +1246,171 @@ display(df_view.limit(5))
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# # Earnings in Constant PPP Dollars
+# `Monthly_Employee_Earnings` stays in nominal U.S. dollars. `Monthly_Earnings_PPP` is the same earnings in constant `ppp_base_year` international dollars, so wages can be compared across countries and years in the report without a DAX conversion:
+#
+# `PPP_B = Earnings_LCU(t) × CPI(B) / CPI(t) / PPP(B)`
+#
+# - **Earnings_LCU(t):** the earnings in local currency. U.S. dollar series are multiplied by the official exchange rate of the year; local currency series are used as they are. Series already published in `2021 PPP $` are kept when the base year is 2021.
+# - **CPI(B) / CPI(t):** price change between year `t` and the base year, chained from `Economic_Indicators.Inflation_CPI_Pct` (`Π (1 + inflation / 100)`). It is null when an inflation year is missing between the two.
+# - **PPP(B):** the private consumption PPP factor of the base year (the GDP factor when it is missing), from `bronze_lakehouse.reference_database.conversion_factors` (see **World Bank Data Gathering**, 1.4.3).
+#
+# The factors and the CPI index are one small row per country (and year), so they are broadcast and the conversion is a join plus column arithmetic.
+#
+# `Monthly_Employee_Earnings` only comes from U.S. dollar series, so countries that publish earnings only in local currency or in PPP have `Monthly_Earnings_PPP` without a nominal value. Rows nulled as outliers (the Iceland case, see above) are flagged in `Monthly_Earnings_Outlier` and keep a null `Monthly_Earnings_PPP` too. The step stops if a flagged row has a PPP value, and it reports the rows where only the PPP value is missing (no conversion factor or CPI).
+
 # CELL ********************
 
 from pyspark.sql import functions as F
+from pyspark.sql.window import Window
 
-# 1. Carregar as tabelas
-df_fact = spark.read.table("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
-df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+ppp_base_year = 2021
+conversion_factors_table = "bronze_lakehouse.reference_database.conversion_factors"
 
-# 2. Padronizar para Upper Case (evita falhas de join por 'abc' vs 'ABC')
-df_fact = df_fact.withColumn("Country_Code_Iso3", F.upper(F.col("Country_Code_Iso3")))
-df_geo = df_geo.select(F.upper(F.col("Country_Code_Iso3")).alias("Country_Code_Iso3")).distinct()
+# Moeda de cada série da Silver (classif1.label do ILOSTAT)
+earnings_currencies = {
+    "usd": "Currency: U.S. dollars",
+    "local": "Currency: Local currency",
+    "ppp": f"Currency: {ppp_base_year} PPP $"
+}
 
-# 3. Join de Limpeza: Mantém apenas países que existam na tabela Geography
-# Isto remove automaticamente SSA, WLD, AFE, etc.
-df_macro_clean = df_fact.join(df_geo, on="Country_Code_Iso3", how="inner")
 
-# 4. Gravar na Gold com sobrescrita de Schema
-df_macro_clean.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
+def cpi_to_base_year(df_econ, base_year=ppp_base_year):
+    """(Country_Code_Iso3, Year, CPI_To_Base): CPI(B) / CPI(t) encadeado a partir da inflação anual."""
+    by_country = Window.partitionBy("Country_Code_Iso3").orderBy("Year") \
+        .rowsBetween(Window.unboundedPreceding, Window.currentRow)
+    df_index = df_econ.select(
+        "Country_Code_Iso3",
+        F.col("Year").cast("int").alias("Year"),
+        F.log1p(F.col("Inflation_CPI_Pct") / 100).alias("Log_Inflation")
+    ).select(
+        "Country_Code_Iso3", "Year",
+        F.sum(F.coalesce("Log_Inflation", F.lit(0.0))).over(by_country).alias("Log_CPI"),
+        F.sum(F.col("Log_Inflation").isNull().cast("int")).over(by_country).alias("Missing")
+    )
 
-# 5. REFRESH E DIAGNÓSTICO (O segredo para não dar erro)
-spark.catalog.refreshTable("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
-df_final = spark.read.table("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
+    df_base = df_index.filter(F.col("Year") == base_year) \
+        .select("Country_Code_Iso3", F.col("Log_CPI").alias("Base_Log_CPI"), F.col("Missing").alias("Base_Missing"))
 
-print("🚀 Fact_Macro_Indicators sincronizada com a Geografia!")
+    # Um ano de inflação em falta entre t e B parte a cadeia
+    return df_index.join(F.broadcast(df_base), "Country_Code_Iso3") \
+        .select(
+            "Country_Code_Iso3", "Year",
+            F.when(F.col("Missing") == F.col("Base_Missing"), F.exp(F.col("Base_Log_CPI") - F.col("Log_CPI")))
+             .alias("CPI_To_Base")
+        )
 
-# Comparação segura para ver o que foi expulso
-codigos_antes = df_fact.select("Country_Code_Iso3").distinct()
-codigos_depois = df_final.select("Country_Code_Iso3").distinct()
-df_removidos = codigos_antes.subtract(codigos_depois)
 
-if df_removidos.count() > 0:
-    print(f"⚠️ Foram removidos {df_removidos.count()} códigos (Agregados/Regionais).")
-    display(df_removidos)
-else:
-    print("✅ A tabela já estava limpa e sincronizada.")
+def earnings_to_constant_ppp(df_earnings, df_factors, df_cpi, value_col, base_year=ppp_base_year):
+    """Acrescenta Monthly_Earnings_PPP (dólares internacionais constantes do ano base) às linhas de ganhos."""
+    df_rates = df_factors.select(
+        "Country_Code_Iso3",
+        F.col("Year").cast("int").alias("Year"),
+        F.col("Exchange_Rate_LCU_per_USD").cast("double").alias("Exchange_Rate")
+    )
+    df_base_ppp = df_factors.filter(F.col("Year") == base_year).select(
+        "Country_Code_Iso3",
+        F.coalesce("PPP_Private_Consumption_Factor", "PPP_Conversion_Factor").cast("double").alias("Base_PPP")
+    )
+
+    earnings_lcu = F.when(F.col("Currency") == earnings_currencies["usd"], F.col(value_col) * F.col("Exchange_Rate")) \
+        .when(F.col("Currency") == earnings_currencies["local"], F.col(value_col))
+
+    return df_earnings \
+        .join(F.broadcast(df_rates), ["Country_Code_Iso3", "Year"], "left") \
+        .join(F.broadcast(df_cpi), ["Country_Code_Iso3", "Year"], "left") \
+        .join(F.broadcast(df_base_ppp), "Country_Code_Iso3", "left") \
+        .withColumn(
+            "Monthly_Earnings_PPP",
+            F.when(F.col("Currency") == earnings_currencies["ppp"], F.col(value_col))
+             .otherwise(earnings_lcu * F.col("CPI_To_Base") / F.col("Base_PPP"))
+        ) \
+        .drop("Exchange_Rate", "CPI_To_Base", "Base_PPP")
+
+
+@step(
+    inputs=[
+        "silver_lakehouse.dbo.un_monthly_employee_earnings",
+        "silver_lakehouse.dbo.economic_indicators",
+        conversion_factors_table,
+        f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    extra=code_fingerprint(cpi_to_base_year) + code_fingerprint(earnings_to_constant_ppp) + repr(earnings_currencies)
+)
+def wealth_earnings_constant_ppp():
+    df_fact_wealth = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution") \
+        .drop("Monthly_Earnings_PPP")
+
+    # Todas as séries preferidas da Silver (qualquer moeda), não só as em dólares
+    df_earnings = spark.read.table("silver_lakehouse.dbo.un_monthly_employee_earnings") \
+        .select(F.col("Country_Code_Iso3"), F.col("Year").cast("int").alias("Year"), "Currency", "Monthly_Employee_Earnings_Total")
+    df_cpi = cpi_to_base_year(spark.read.table("silver_lakehouse.dbo.economic_indicators"))
+    df_factors = spark.read.table(conversion_factors_table)
+
+    df_ppp = earnings_to_constant_ppp(df_earnings, df_factors, df_cpi, "Monthly_Employee_Earnings_Total") \
+        .select(
+            F.col("Country_Code_Iso3").alias("country_code_iso3"),
+            "Year",
+            F.round("Monthly_Earnings_PPP", 2).alias("Monthly_Earnings_PPP")
+        )
+
+    # Só as linhas anuladas como outliers (wealth_null_earnings_outliers) ficam nulas também em PPP;
+    # os países que só publicam em moeda local ou em PPP mantêm o valor PPP sem o valor em dólares
+    is_outlier = F.coalesce(F.col("Monthly_Earnings_Outlier"), F.lit(False)) \
+        if "Monthly_Earnings_Outlier" in df_fact_wealth.columns else F.lit(False)
+    df_fact_final = df_fact_wealth.join(df_ppp, ["country_code_iso3", "Year"], "left") \
+        .withColumn("Monthly_Earnings_PPP", F.when(~is_outlier, F.col("Monthly_Earnings_PPP")))
+
+    coverage = df_fact_final.agg(
+        F.sum((is_outlier & F.col("Monthly_Earnings_PPP").isNotNull()).cast("int")).alias("Outliers_With_Ppp"),
+        F.sum((F.col("Monthly_Employee_Earnings").isNull() & F.col("Monthly_Earnings_PPP").isNotNull()).cast("int")).alias("Ppp_Only"),
+        F.sum((F.col("Monthly_Employee_Earnings").isNotNull() & F.col("Monthly_Earnings_PPP").isNull()).cast("int")).alias("Nominal_Without_Ppp")
+    ).first()
+    if coverage["Outliers_With_Ppp"]:
+        raise ValueError(f"{coverage['Outliers_With_Ppp']} linhas marcadas como outlier com Monthly_Earnings_PPP")
+    print(f"ℹ️ {coverage['Ppp_Only']} linhas só com Monthly_Earnings_PPP (séries em moeda local ou PPP)")
+    if coverage["Nominal_Without_Ppp"]:
+        print(f"⚠️ {coverage['Nominal_Without_Ppp']} linhas com Monthly_Employee_Earnings sem fatores de conversão ou CPI (Monthly_Earnings_PPP nulo)")
+
+    df_fact_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+    print(f"✅ Monthly_Earnings_PPP (dólares PPP constantes de {ppp_base_year}) integrado na Fact.")
+    df_fact_final.select("country_code_iso3", "Year", "Monthly_Employee_Earnings", "Monthly_Earnings_PPP") \
+        .filter(F.col("Monthly_Earnings_PPP").isNotNull()).show(5)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+@step(
+    inputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Wealth_Distribution"],
+    extra=code_fingerprint(inequality_metrics) + code_fingerprint(metrics_batch)
+)
+def wealth_inequality_metrics():
+    # Palma, top10/bottom50, Gini aproximado e Theil a partir das partilhas WID (ver Inequality Metrics (NB))
+    df_wealth = spark.read.table(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+    df_wealth_metrics = add_inequality_metrics(df_wealth)
+
+    df_wealth_metrics.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.fact_wealth_distribution")
+
+    print("✅ Métricas de desigualdade integradas na Fact_Wealth_Distribution.")
+    df_wealth_metrics.select("country_code_iso3", "Year", *metric_columns).show(5)
 
 # METADATA ********************
 
@@ -817,48 +1419,128 @@ else:
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# # GDP Bloc Analytics
+# `Dim_Bloc_Membership` lists the members of each bloc with the years they joined and left (BRICS expansion in 2024, Croatia joining the EU in 2013, the United Kingdom leaving in 2020, after the transition period, so 2020 is its last year in the EU series). `Mart_Bloc_Growth` has one row per bloc and year, computed from `Fact_Macro_Indicators` with window functions over the bloc series sorted by year:
+# - **GDP_per_Capita** (population-weighted) and **GDP_Growth_Pct** (GDP-weighted) of the bloc members in that year;
+# - **Rolling_Growth_Mean / Rolling_Growth_Std:** mean and standard deviation (volatility) of the bloc growth over the last `bloc_window_years` years;
+# - **Sigma_Convergence:** standard deviation of log GDP per capita across the members (falling = members converging);
+# - **Beta_Convergence:** slope of the members' average annual growth of log GDP per capita over the window on their initial log GDP per capita (negative = poorer members grow faster);
+# - **Relative_To_Reference / Catch_Up_Rate_Pct:** bloc GDP per capita as a share of the reference (`USA`) and the average annual change of that gap in % over the window (positive = catching up).
+
 # CELL ********************
 
 from pyspark.sql import functions as F
+from pyspark.sql.window import Window
 
-# 0. Limpar cache para evitar erros de esquema/metadados
-spark.catalog.clearCache()
+# (Bloco, país, ano de entrada, último ano como membro)
+bloc_members = [
+    ("BRICS", "BRA", 2009, None), ("BRICS", "RUS", 2009, None), ("BRICS", "IND", 2009, None),
+    ("BRICS", "CHN", 2009, None), ("BRICS", "ZAF", 2011, None), ("BRICS", "EGY", 2024, None),
+    ("BRICS", "ETH", 2024, None), ("BRICS", "IRN", 2024, None), ("BRICS", "ARE", 2024, None),
+    ("BRICS", "IDN", 2025, None),
+    ("EU", "AUT", 1995, None), ("EU", "BEL", 1958, None), ("EU", "BGR", 2007, None),
+    ("EU", "HRV", 2013, None), ("EU", "CYP", 2004, None), ("EU", "CZE", 2004, None),
+    ("EU", "DNK", 1973, None), ("EU", "EST", 2004, None), ("EU", "FIN", 1995, None),
+    ("EU", "FRA", 1958, None), ("EU", "DEU", 1958, None), ("EU", "GRC", 1981, None),
+    ("EU", "HUN", 2004, None), ("EU", "IRL", 1973, None), ("EU", "ITA", 1958, None),
+    ("EU", "LVA", 2004, None), ("EU", "LTU", 2004, None), ("EU", "LUX", 1958, None),
+    ("EU", "MLT", 2004, None), ("EU", "NLD", 1958, None), ("EU", "POL", 2004, None),
+    ("EU", "PRT", 1986, None), ("EU", "ROU", 2007, None), ("EU", "SVK", 2004, None),
+    ("EU", "SVN", 2004, None), ("EU", "ESP", 1986, None), ("EU", "SWE", 1995, None),
+    ("EU", "GBR", 1973, 2020),
+    ("USA", "USA", 1776, None)
+]
 
-# 1. Carregar as tabelas
-df_macro = spark.read.table("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
-df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+bloc_window_years = 5
+bloc_reference = "USA"
 
-# 2. Filtro de Ano e Padronização de Caixa (Uppercase)
-df_cleaned = df_macro.filter(F.col("Year") >= 2010) \
-                     .withColumn("Country_Code_Iso3", F.upper(F.col("Country_Code_Iso3")))
 
-# 3. Join para garantir que SÓ existem países (remove AFE, SSA, etc.)
-df_final = df_cleaned.join(
-    df_geo.select(F.upper(F.col("Country_Code_Iso3")).alias("Geo_Code")).distinct(),
-    df_cleaned.Country_Code_Iso3 == F.col("Geo_Code"),
-    how="inner"
-).drop("Geo_Code")
+@step(outputs=[f"gold_lakehouse.{gold_schema}.Dim_Bloc_Membership"], extra=repr(bloc_members))
+def gold_bloc_membership():
+    df_blocs = spark.createDataFrame(
+        bloc_members, "Bloc_Code string, Country_Code_Iso3 string, Joined_Year int, Left_Year int"
+    )
 
-# 4. Reordenar (Corrigido o erro do caractere estranho na linha 23)
-cols_primeiro = ["Country_Code_Iso3", "Year"]
-outras_cols = [c for c in df_final.columns if c not in cols_primeiro]
-df_final = df_final.select(cols_primeiro + outras_cols) # <- Agora sem o símbolo '綁'
+    df_blocs.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Dim_Bloc_Membership")
 
-# 5. Gravar de volta
-df_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
+    print(f"✅ Dim_Bloc_Membership criada ({len(bloc_members)} membros)")
+
+
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        f"gold_lakehouse.{gold_schema}.Dim_Bloc_Membership"
+    ],
+    outputs=[f"gold_lakehouse.{gold_schema}.Mart_Bloc_Growth"],
+    extra=repr((bloc_window_years, bloc_reference))
+)
+def gold_bloc_growth_mart():
+    df_macro = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_blocs = spark.read.table(f"gold_lakehouse.{gold_schema}.Dim_Bloc_Membership")
+
+    # 1. Membros de cada bloco em cada ano (composição da altura)
+    df_members = df_macro.join(F.broadcast(df_blocs), "Country_Code_Iso3") \
+        .filter((F.col("Year") >= F.col("Joined_Year")) &
+                (F.col("Left_Year").isNull() | (F.col("Year") <= F.col("Left_Year")))) \
+        .withColumn("GDP_Total", F.col("GDP_per_Capita") * F.col("Pop_Total_Count")) \
+        .withColumn("Log_GDP_pc", F.log(F.col("GDP_per_Capita")))
+
+    # 2. Crescimento anual médio do log do PIB per capita de cada país na janela (para a convergência beta)
+    w_country = Window.partitionBy("Bloc_Code", "Country_Code_Iso3").orderBy("Year") \
+        .rangeBetween(-bloc_window_years, -bloc_window_years)
+    df_members = df_members \
+        .withColumn("Initial_Log_GDP_pc", F.first("Log_GDP_pc").over(w_country)) \
+        .withColumn("Avg_Log_Growth", (F.col("Log_GDP_pc") - F.col("Initial_Log_GDP_pc")) / bloc_window_years)
+
+    # 3. Uma agregação por bloco/ano
+    df_bloc_year = df_members.groupBy("Bloc_Code", "Year").agg(
+        F.count(F.col("GDP_per_Capita")).alias("Member_Count"),
+        (F.sum(F.col("GDP_per_Capita") * F.col("Pop_Total_Count"))
+         / F.sum(F.when(F.col("GDP_per_Capita").isNotNull(), F.col("Pop_Total_Count")))).alias("GDP_per_Capita"),
+        (F.sum(F.col("GDP_Annual_Growth_Pct") * F.col("GDP_Total"))
+         / F.sum(F.when(F.col("GDP_Annual_Growth_Pct").isNotNull(), F.col("GDP_Total")))).alias("GDP_Growth_Pct"),
+        F.stddev_samp("Log_GDP_pc").alias("Sigma_Convergence"),
+        (F.covar_samp("Initial_Log_GDP_pc", "Avg_Log_Growth") / F.var_samp("Initial_Log_GDP_pc")).alias("Beta_Convergence")
+    )
 
-# 6. Refresh e Diagnóstico
-spark.catalog.refreshTable("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
-df_display = spark.read.table("Gold_Lakehouse.dbo.Fact_Macro_Indicators")
+    # 4. Janelas ordenadas por ano dentro de cada bloco (volatilidade e recuperação da diferença para a referência)
+    w_rolling = Window.partitionBy("Bloc_Code").orderBy("Year").rangeBetween(-(bloc_window_years - 1), 0)
+    w_lag = Window.partitionBy("Bloc_Code").orderBy("Year").rangeBetween(-bloc_window_years, -bloc_window_years)
+
+    df_reference = df_bloc_year.filter(F.col("Bloc_Code") == bloc_reference) \
+        .select("Year", F.col("GDP_per_Capita").alias("Reference_GDP_per_Capita"))
+
+    df_mart = df_bloc_year.join(df_reference, "Year", "left") \
+        .withColumn("Rolling_Growth_Mean", F.avg("GDP_Growth_Pct").over(w_rolling)) \
+        .withColumn("Rolling_Growth_Std", F.stddev_samp("GDP_Growth_Pct").over(w_rolling)) \
+        .withColumn("Relative_To_Reference", F.col("GDP_per_Capita") / F.col("Reference_GDP_per_Capita")) \
+        .withColumn("Relative_Lag", F.first("Relative_To_Reference").over(w_lag)) \
+        .withColumn(
+            "Catch_Up_Rate_Pct",
+            (F.log("Relative_To_Reference") - F.log("Relative_Lag")) / bloc_window_years * 100
+        ) \
+        .drop("Reference_GDP_per_Capita", "Relative_Lag")
+
+    df_mart = df_mart.select(
+        "Bloc_Code", "Year", "Member_Count",
+        *[F.round(c, 4).alias(c) for c in [
+            "GDP_per_Capita", "GDP_Growth_Pct", "Rolling_Growth_Mean", "Rolling_Growth_Std",
+            "Sigma_Convergence", "Beta_Convergence", "Relative_To_Reference", "Catch_Up_Rate_Pct"
+        ]]
+    )
 
-print("🧹 Limpeza concluída!")
-print(f"✅ Nome da coluna mantido: 'Country_Code_Iso3'")
-print(f"📅 Registos a partir de: {df_display.agg(F.min('Year')).collect()[0][0]}")
+    df_mart.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Mart_Bloc_Growth")
 
-display(df_display.sort("Country_Code_Iso3", "Year").limit(10))
+    print("✅ Mart_Bloc_Growth criada!")
+    df_mart.orderBy("Bloc_Code", "Year").show(10)
 
 # METADATA ********************
 
@@ -867,78 +1549,188 @@ display(df_display.sort("Country_Code_Iso3", "Year").limit(10))
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# # Shock Resilience
+# `Fact_Shock_Resilience` has one row per country, indicator and shock (the 2008 financial crisis and COVID-19, the eras labelled in `Dim_Date.Economic_Context`). For each series:
+# - **Baseline:** mean of the indicator over the pre-shock years;
+# - **Trough_Year / Trough_Depth:** the worst year inside the shock window and how far it moved from the baseline in the adverse direction (up for unemployment and top income shares, down for GDP), also as % of the baseline;
+# - **Time_To_Trough / Time_To_Recovery:** years from the start of the shock to the trough and to the first year after the trough back at (or better than) the baseline; `Time_To_Recovery` is null when the series had not recovered by the end of the window;
+# - **End_Shift:** the adverse deviation in the last observed year of the window, which shows whether the shock left a lasting change (for example a more concentrated income share).
+#
+# The windows are in `shock_windows`. The metrics are computed per country and indicator series with NumPy inside a grouped Arrow UDF (`applyInArrow` on Spark 4, `applyInPandas` on Spark 3). The Gold facts start in 2010, so the 2008 baselines use the long-history tables of the World Bank backfill when they exist, and the full WID history of `income_share`.
+
 # CELL ********************
 
+import numpy as np
+import pyarrow as pa
 from pyspark.sql import functions as F
+from pyspark.sql.group import GroupedData
+
+# Choque: (primeiro e último ano de referência, primeiro ano do choque, último ano da janela)
+shock_windows = {
+    "GFC_2008": (2005, 2007, 2008, 2016),
+    "COVID_19": (2017, 2019, 2020, 2024)
+}
 
-# 1. Carregar a tua dimensão atual
-# Usamos Spark para ler a tabela de geografia da Gold
-df_geo = spark.read.table("gold_lakehouse.dbo.dim_geography")
-
-# 2. Mapeamento das Coordenadas das Regiões Intermédias
-# Adicionamos as colunas de latitude e longitude baseadas no nome da região
-df_final = df_geo.withColumn(
-    "intermediate_lat",
-    F.when(F.col("intermediate_region_name") == "Antarctica", -75.0)
-     .when(F.col("intermediate_region_name") == "Australia and New Zealand", -30.0)
-     .when(F.col("intermediate_region_name") == "Caribbean", 15.0)
-     .when(F.col("intermediate_region_name") == "Central America", 13.0)
-     .when(F.col("intermediate_region_name") == "Central Asia", 45.0)
-     .when(F.col("intermediate_region_name") == "Eastern Africa", 1.0)
-     .when(F.col("intermediate_region_name") == "Eastern Asia", 35.0)
-     .when(F.col("intermediate_region_name") == "Eastern Europe", 50.0)
-     .when(F.col("intermediate_region_name") == "Melanesia", -9.0)
-     .when(F.col("intermediate_region_name") == "Micronesia", 7.0)
-     .when(F.col("intermediate_region_name") == "Middle Africa", -1.0)
-     .when(F.col("intermediate_region_name") == "Northern Africa", 25.0)
-     .when(F.col("intermediate_region_name") == "Northern America", 45.0)
-     .when(F.col("intermediate_region_name") == "Northern Europe", 60.0)
-     .when(F.col("intermediate_region_name") == "Polynesia", -18.0)
-     .when(F.col("intermediate_region_name") == "South America", -15.0)
-     .when(F.col("intermediate_region_name") == "South-eastern Asia", 5.0)
-     .when(F.col("intermediate_region_name") == "Southern Africa", -29.0)
-     .when(F.col("intermediate_region_name") == "Southern Asia", 25.0)
-     .when(F.col("intermediate_region_name") == "Southern Europe", 41.0)
-     .when(F.col("intermediate_region_name") == "Western Africa", 14.0)
-     .when(F.col("intermediate_region_name") == "Western Asia", 33.0)
-     .when(F.col("intermediate_region_name") == "Western Europe", 48.0)
-     .otherwise(0.0)
-).withColumn(
-    "intermediate_long",
-    F.when(F.col("intermediate_region_name") == "Antarctica", 0.0)
-     .when(F.col("intermediate_region_name") == "Australia and New Zealand", 140.0)
-     .when(F.col("intermediate_region_name") == "Caribbean", -75.0)
-     .when(F.col("intermediate_region_name") == "Central America", -85.0)
-     .when(F.col("intermediate_region_name") == "Central Asia", 65.0)
-     .when(F.col("intermediate_region_name") == "Eastern Africa", 38.0)
-     .when(F.col("intermediate_region_name") == "Eastern Asia", 110.0)
-     .when(F.col("intermediate_region_name") == "Eastern Europe", 35.0)
-     .when(F.col("intermediate_region_name") == "Melanesia", 150.0)
-     .when(F.col("intermediate_region_name") == "Micronesia", 155.0)
-     .when(F.col("intermediate_region_name") == "Middle Africa", 18.0)
-     .when(F.col("intermediate_region_name") == "Northern Africa", 15.0)
-     .when(F.col("intermediate_region_name") == "Northern America", -100.0)
-     .when(F.col("intermediate_region_name") == "Northern Europe", 15.0)
-     .when(F.col("intermediate_region_name") == "Polynesia", -150.0)
-     .when(F.col("intermediate_region_name") == "South America", -60.0)
-     .when(F.col("intermediate_region_name") == "South-eastern Asia", 110.0)
-     .when(F.col("intermediate_region_name") == "Southern Africa", 25.0)
-     .when(F.col("intermediate_region_name") == "Southern Asia", 75.0)
-     .when(F.col("intermediate_region_name") == "Southern Europe", 15.0)
-     .when(F.col("intermediate_region_name") == "Western Africa", 1.0)
-     .when(F.col("intermediate_region_name") == "Western Asia", 40.0)
-     .when(F.col("intermediate_region_name") == "Western Europe", 6.0)
-     .otherwise(0.0)
+# Indicador: (tabela, coluna, sentido adverso: +1 quando subir é pior, -1 quando descer é pior)
+shock_indicators = {
+    "Unemployment_Total": (f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators", "Unemployment_Total", 1),
+    "GDP_per_Capita": (f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators", "GDP_per_Capita", -1),
+    "GDP_Annual_Growth_Pct": (f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators", "GDP_Annual_Growth_Pct", -1),
+    "Share_Top_10_pct": ("silver_lakehouse.dbo.income_share", "Share_Top_10_pct", 1),
+    "Share_Top_1_pct": ("silver_lakehouse.dbo.income_share", "Share_Top_1_pct", 1)
+}
+
+# Histórico longo do backfill (World Bank Data Gathering, secção 2), usado só se existir
+shock_history = {
+    "Unemployment_Total": ("bronze_lakehouse.world_bank.unemployment_history", "SL.UEM.TOTL.ZS"),
+    "GDP_per_Capita": ("bronze_lakehouse.world_bank.economic_indicators_history", "NY.GDP.PCAP.PP.CD"),
+    "GDP_Annual_Growth_Pct": ("bronze_lakehouse.world_bank.economic_indicators_history", "NY.GDP.MKTP.KD.ZG")
+}
+shock_history = {k: v for k, v in shock_history.items() if spark.catalog.tableExists(v[0])}
+
+shock_schema = pa.schema([
+    ("Country_Code_Iso3", pa.string()),
+    ("Indicator", pa.string()),
+    ("Shock", pa.string()),
+    ("Baseline", pa.float64()),
+    ("Trough_Year", pa.int32()),
+    ("Trough_Value", pa.float64()),
+    ("Trough_Depth", pa.float64()),
+    ("Trough_Depth_Pct", pa.float64()),
+    ("Time_To_Trough", pa.int32()),
+    ("Time_To_Recovery", pa.int32()),
+    ("End_Shift", pa.float64())
+])
+shock_ddl = ", ".join(
+    f"{f.name} {'string' if f.type == pa.string() else 'int' if f.type == pa.int32() else 'double'}"
+    for f in shock_schema
 )
 
-# 3. Gravar na Tabela Gold (Overwrite para atualizar as colunas)
-df_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("gold_lakehouse.dbo.dim_geography")
 
-print("✅ Dim_Geography atualizada com as coordenadas das regiões intermédias!")
-display(df_final.select("intermediate_region_name", "intermediate_lat", "intermediate_long").distinct().limit(10))
+def shock_metrics(years, values, adverse, windows=shock_windows):
+    """Métricas de choque de uma série (anos, valores) para todas as janelas de uma vez. Devolve {coluna: array}."""
+    years = np.asarray(years, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    bounds = np.array(list(windows.values()), dtype=np.float64)
+    base_start, base_end, shock_start, shock_end = (bounds[:, i:i + 1] for i in range(4))
+
+    observed = np.isfinite(values)[None, :]
+    in_base = observed & (years >= base_start) & (years <= base_end)
+    in_shock = observed & (years >= shock_start) & (years <= shock_end)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        baseline = np.where(in_base, values, 0.0).sum(axis=1) / in_base.sum(axis=1)
+        deviation = adverse * (values[None, :] - baseline[:, None])
+
+        # Pior ano dentro da janela (desvio adverso máximo)
+        trough = np.where(in_shock, deviation, -np.inf).argmax(axis=1)
+        rows = np.arange(len(bounds))
+        valid = np.isfinite(baseline) & in_shock.any(axis=1)
+        trough_year = years[trough]
+        trough_depth = deviation[rows, trough]
+
+        # Primeiro ano a partir do pior ano em que a série voltou à referência
+        back = in_shock & (years >= trough_year[:, None]) & (deviation <= 0)
+        recovery_year = np.where(back, years, np.inf).min(axis=1)
+        recovered = np.isfinite(recovery_year) & valid
+
+        last = np.where(in_shock, years, -np.inf).argmax(axis=1)
+
+        return {
+            "Baseline": np.where(valid, baseline, np.nan),
+            "Trough_Year": np.where(valid, trough_year, np.nan),
+            "Trough_Value": np.where(valid, values[trough], np.nan),
+            "Trough_Depth": np.where(valid, trough_depth, np.nan),
+            "Trough_Depth_Pct": np.where(valid, trough_depth / np.abs(baseline) * 100, np.nan),
+            "Time_To_Trough": np.where(valid, trough_year - shock_start[:, 0], np.nan),
+            "Time_To_Recovery": np.where(recovered, np.where(trough_depth > 0, recovery_year - shock_start[:, 0], 0), np.nan),
+            "End_Shift": np.where(valid, deviation[rows, last], np.nan)
+        }
+
+
+def shock_table(table):
+    """Uma série (país, indicador) em Arrow -> tabela Arrow com uma linha por choque."""
+    order = np.argsort(table.column("Year").to_numpy(zero_copy_only=False))
+    years = table.column("Year").to_numpy(zero_copy_only=False)[order]
+    values = table.column("Value").to_numpy(zero_copy_only=False)[order]
+    adverse = table.column("Adverse").to_numpy(zero_copy_only=False)[0]
+    metrics = shock_metrics(years, values, adverse)
+
+    n = len(shock_windows)
+    columns = {
+        "Country_Code_Iso3": [table.column("Country_Code_Iso3")[0].as_py()] * n,
+        "Indicator": [table.column("Indicator")[0].as_py()] * n,
+        "Shock": list(shock_windows.keys())
+    }
+    arrays = []
+    for field in shock_schema:
+        if field.name in columns:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+        else:
+            data = metrics[field.name]
+            mask = ~np.isfinite(data)
+            data = np.where(mask, 0, np.round(data, 4))
+            arrays.append(pa.array(data.astype(field.type.to_pandas_dtype()), type=field.type, mask=mask))
+    return pa.Table.from_arrays(arrays, schema=shock_schema)
+
+
+def shock_series():
+    """Séries longas (país, indicador, ano, valor, sentido) com o histórico do backfill quando existe."""
+    parts = []
+    for indicator, (table, column, adverse) in shock_indicators.items():
+        parts.append(spark.read.table(table).select(
+            F.col("Country_Code_Iso3"), F.lit(indicator).alias("Indicator"),
+            F.col("Year").cast("int").alias("Year"), F.col(column).cast("double").alias("Value"),
+            F.lit(adverse).alias("Adverse"), F.lit(1).alias("Priority")
+        ))
+    for indicator, (table, series_code) in shock_history.items():
+        parts.append(spark.read.table(table).filter(F.col("Series_Code") == series_code).select(
+            F.col("Country_Code").alias("Country_Code_Iso3"), F.lit(indicator).alias("Indicator"),
+            F.col("Year").cast("int").alias("Year"), F.col("Value").cast("double").alias("Value"),
+            F.lit(shock_indicators[indicator][2]).alias("Adverse"), F.lit(0).alias("Priority")
+        ))
+
+    df_long = parts[0]
+    for part in parts[1:]:
+        df_long = df_long.unionByName(part)
+
+    # O valor da Gold prevalece sobre o do histórico no mesmo país/ano
+    return df_long.filter(F.col("Value").isNotNull()) \
+        .groupBy("Country_Code_Iso3", "Indicator", "Year") \
+        .agg(F.max_by("Value", "Priority").alias("Value"), F.first("Adverse").alias("Adverse"))
+
+
+@step(
+    inputs=sorted({t for t, _, _ in shock_indicators.values()} | {t for t, _ in shock_history.values()}),
+    outputs=[f"gold_lakehouse.{gold_schema}.Fact_Shock_Resilience"],
+    extra=code_fingerprint(shock_metrics) + code_fingerprint(shock_table) + repr(shock_windows) + repr(shock_indicators)
+)
+def gold_shock_resilience():
+    grouped = shock_series().groupBy("Country_Code_Iso3", "Indicator")
+
+    if hasattr(GroupedData, "applyInArrow"):
+        df_shock = grouped.applyInArrow(shock_table, shock_ddl)
+    else:
+        df_shock = grouped.applyInPandas(
+            lambda pdf: shock_table(pa.Table.from_pandas(pdf, preserve_index=False)).to_pandas(integer_object_nulls=True),
+            shock_ddl
+        )
+
+    df_shock.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Shock_Resilience")
+
+    print("✅ Fact_Shock_Resilience criada!")
+    spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Shock_Resilience") \
+        .groupBy("Indicator", "Shock") \
+        .agg(
+            F.count("Baseline").alias("Series"),
+            F.round(F.avg("Trough_Depth_Pct"), 2).alias("Mean_Trough_Depth_Pct"),
+            F.round(F.avg(F.col("Time_To_Recovery").isNotNull().cast("int")), 2).alias("Recovered_Share")
+        ).orderBy("Indicator", "Shock").show(truncate=False)
 
 # METADATA ********************
 
@@ -947,26 +1739,146 @@ display(df_final.select("intermediate_region_name", "intermediate_lat", "interme
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# # Aggregate Recomputation
+# Recomputes every benchmark aggregate (`WLD`, `SSF`, `HIC`, ...) from the country facts, using the members in `world_bank.aggregate_membership`. All indicators and both weightings are computed in one grouped pass: each country value is weighted by population (`Pop_Total_Count`) and by GDP (`GDP_per_Capita` × population). `Aggregate_Recomputed` keeps both values, the official World Bank value, the drift between them and the share of the aggregate members that have data (`Coverage_Pct` = `Member_Count` / `Member_Total`, where `Member_Total` counts every member in the membership table, with or without rows in the facts). The membership codes are World Bank `economy` codes, so they go through the `wb` scheme of **Country Code Crosswalk (NB)** before the join with the country facts. With `replace_benchmark_aggregates = True`, `Fact_Benchmarks` uses the recomputed value (preferred weighting in `aggregate_weighting`) wherever the coverage is at least `min_aggregate_coverage`.
+
 # CELL ********************
 
 from pyspark.sql import functions as F
 
-# 1. Carregar a tabela da camada Gold
-df_gold = spark.read.table("gold_lakehouse.dbo.fact_wealth_distribution")
+# Coluna da Fact_Benchmarks -> (tabela dos países, coluna nos países)
+aggregate_indicators = {
+    "School_Attendance": ("Fact_Social_Barriers", "School_Attendance"),
+    "Literacy_Rate": ("Fact_Social_Barriers", "Literacy_Rate"),
+    "Internet_Access": ("Fact_Social_Barriers", "Internet_Access"),
+    "Female_Account_Ownership": ("Fact_Social_Barriers", "Female_Account_Ownership"),
+    "Child_Mortality_Rate": ("Fact_Social_Barriers", "Child_Mortality_Rate"),
+    "Life_Expectancy": ("Fact_Social_Barriers", "Life_Expectancy"),
+    "GDP_per_Capita": ("Fact_Macro_Indicators", "GDP_per_Capita"),
+    "GDP_Annual_Growth_Pct": ("Fact_Macro_Indicators", "GDP_Annual_Growth_Pct"),
+    "Inflation_CPI_Pct": ("Fact_Macro_Indicators", "Inflation_CPI_Pct"),
+    "Unemployment_Rate": ("Fact_Macro_Indicators", "Unemployment_Total")
+}
 
-# 2. Diagnóstico: Ver exatamente o que existe para a Islândia
-print("Verificando dados da Islândia:")
-df_gold.filter(F.col("country_code_iso3") == "ISL") \
-       .select("country_code_iso3", "Year", "Monthly_Employee_Earnings") \
-       .orderBy("Year") \
-       .show()
+# Crescimento e inflação são ponderados pelo PIB, o resto pela população
+aggregate_weighting = {"GDP_Annual_Growth_Pct": "gdp", "Inflation_CPI_Pct": "gdp"}
+min_aggregate_coverage = 0.8
+
+aggregate_outputs = [f"gold_lakehouse.{gold_schema}.Aggregate_Recomputed"]
+if replace_benchmark_aggregates:
+    aggregate_outputs.append(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+
+
+def to_long(df, key_cols, value_cols):
+    """Formato largo -> longo (Indicator, Value) sem UDFs."""
+    return df.select(
+        *key_cols,
+        F.explode(F.array(*[
+            F.struct(F.lit(name).alias("Indicator"), F.col(col).cast("double").alias("Value"))
+            for name, col in value_cols.items()
+        ])).alias("cell")
+    ).select(*key_cols, "cell.Indicator", "cell.Value")
+
+
+@step(
+    inputs=[
+        f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers",
+        f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators",
+        f"gold_lakehouse.{gold_schema}.Fact_Benchmarks",
+        "bronze_lakehouse.world_bank.aggregate_membership"
+    ],
+    outputs=aggregate_outputs,
+    extra=repr(aggregate_indicators) + repr(aggregate_weighting) + repr(min_aggregate_coverage)
+)
+def recompute_benchmark_aggregates():
+    df_social = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Social_Barriers")
+    df_macro = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Macro_Indicators")
+    df_bench = spark.read.table(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
+    # Os membros vêm em códigos `economy` do Banco Mundial: passam pelo crosswalk para o ISO3 dos factos
+    df_members = spark.read.table("bronze_lakehouse.world_bank.aggregate_membership") \
+        .select("Aggregate_Code", code_map_expr("Country_Code", "wb", keep_unmapped=True).alias("Country_Code_Iso3")) \
+        .distinct()
+    # Total de membros de cada agregado (com e sem dados), denominador da cobertura
+    df_member_total = df_members.groupBy("Aggregate_Code").agg(F.count("*").alias("Member_Total"))
+
+    # 1. Valores dos países em formato longo, com os pesos (população e PIB) da Fact_Macro_Indicators
+    keys = ["Country_Code_Iso3", "Year"]
+    df_weights = df_macro.select(
+        *keys,
+        F.col("Pop_Total_Count").alias("Pop_Weight"),
+        (F.col("GDP_per_Capita") * F.col("Pop_Total_Count")).alias("GDP_Weight")
+    )
+
+    df_values = to_long(
+        df_social, keys, {k: c for k, (t, c) in aggregate_indicators.items() if t == "Fact_Social_Barriers"}
+    ).unionByName(to_long(
+        df_macro, keys, {k: c for k, (t, c) in aggregate_indicators.items() if t == "Fact_Macro_Indicators"}
+    ))
+
+    # 2. Uma única agregação por agregado/ano/indicador (a tabela de membros é pequena: broadcast)
+    has_value = F.col("Value").isNotNull()
+    df_recomputed = df_values.join(df_weights, keys, "left") \
+        .join(F.broadcast(df_members), "Country_Code_Iso3") \
+        .groupBy("Aggregate_Code", "Year", "Indicator") \
+        .agg(
+            (F.sum(F.when(has_value, F.col("Value") * F.col("Pop_Weight")))
+             / F.sum(F.when(has_value & F.col("Pop_Weight").isNotNull(), F.col("Pop_Weight")))).alias("Pop_Weighted"),
+            (F.sum(F.when(has_value, F.col("Value") * F.col("GDP_Weight")))
+             / F.sum(F.when(has_value & F.col("GDP_Weight").isNotNull(), F.col("GDP_Weight")))).alias("GDP_Weighted"),
+            F.count(F.when(has_value, 1)).alias("Member_Count")
+        ) \
+        .join(F.broadcast(df_member_total), "Aggregate_Code") \
+        .withColumn("Coverage_Pct", F.col("Member_Count") / F.col("Member_Total"))
+
+    gdp_weighted = list(k for k, w in aggregate_weighting.items() if w == "gdp")
+    df_recomputed = df_recomputed.withColumn(
+        "Recomputed_Value",
+        F.round(F.when(F.col("Indicator").isin(gdp_weighted), F.col("GDP_Weighted")).otherwise(F.col("Pop_Weighted")), 2)
+    )
+
+    # 3. Comparar com os valores oficiais do Banco Mundial
+    df_official = to_long(df_bench, keys, {k: k for k in aggregate_indicators if k in df_bench.columns}) \
+        .withColumnRenamed("Country_Code_Iso3", "Aggregate_Code") \
+        .withColumnRenamed("Value", "Official_Value")
+
+    df_drift = df_recomputed.join(df_official, ["Aggregate_Code", "Year", "Indicator"], "left") \
+        .withColumn("Drift", F.round(F.col("Recomputed_Value") - F.col("Official_Value"), 4)) \
+        .withColumn("Drift_Pct", F.round(F.col("Drift") / F.abs(F.col("Official_Value")) * 100, 2))
+
+    df_drift.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Aggregate_Recomputed")
+
+    print("📊 Desvio médio (|Drift_Pct|) por indicador:")
+    df_drift.groupBy("Indicator").agg(
+        F.round(F.avg(F.abs("Drift_Pct")), 2).alias("Mean_Abs_Drift_Pct"),
+        F.round(F.avg("Coverage_Pct"), 3).alias("Mean_Coverage")
+    ).orderBy("Indicator").show(truncate=False)
+
+    if not replace_benchmark_aggregates:
+        return
+
+    # 4. Substituir os valores oficiais pelos recalculados (só com cobertura suficiente)
+    indicators = [k for k in aggregate_indicators if k in df_bench.columns]
+    df_wide = df_recomputed.filter(F.col("Coverage_Pct") >= min_aggregate_coverage) \
+        .groupBy(F.col("Aggregate_Code").alias("Country_Code_Iso3"), "Year") \
+        .pivot("Indicator", indicators) \
+        .agg(F.first("Recomputed_Value"))
+    df_wide = df_wide.select(keys + [F.col(c).alias(f"_new_{c}") for c in indicators])
+
+    df_bench_final = df_bench.join(df_wide, keys, "left").select(
+        *[F.coalesce(F.col(f"_new_{c}"), F.col(c)).alias(c) if c in indicators else F.col(c) for c in df_bench.columns]
+    )
 
-# 3. Solução: Filtrar outliers ou valores que parecem ser anuais/moeda errada
-# O Luxemburgo (topo real) anda pelos 8.000, logo 15.000 é um limite seguro.
-df_gold_final = df_gold.filter((F.col("Monthly_Employee_Earnings") < 15000) | (F.col("Monthly_Employee_Earnings").isNull()))
+    df_bench_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"gold_lakehouse.{gold_schema}.Fact_Benchmarks")
 
-# 4. Gravar a tabela limpa ou usar este df_gold_final para o Power BI
-# df_gold_final.write.mode("overwrite").saveAsTable("fact_wealth_distribution_clean")
+    print(f"✅ Fact_Benchmarks: agregados recalculados com cobertura >= {min_aggregate_coverage:.0%}")
 
 # METADATA ********************
 
@@ -975,29 +1887,99 @@ df_gold_final = df_gold.filter((F.col("Monthly_Employee_Earnings") < 15000) | (F
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# # Lineage
+# The last step of each fact adds `Source_Mask`, `Imputed_Mask` and `Load_Id` (see **Data Lineage (NB)**). It runs after every other step that writes the fact, so the masks describe the final values.
+
 # CELL ********************
 
+import functools
+
 from pyspark.sql import functions as F
 
-# 1. Carregar a tabela (ajusta o nome se necessário)
-df_gold = spark.read.table("fact_wealth_distribution")
 
-# 2. Aplicar a correção: se o valor for > 15000, vira NULL
-df_gold_corrigido = df_gold.withColumn(
-    "Monthly_Employee_Earnings",
-    F.when(F.col("Monthly_Employee_Earnings") > 15000, F.lit(None))
-     .otherwise(F.col("Monthly_Employee_Earnings"))
-)
+def add_lineage(fact_table):
+    fact_name = fact_table.split(".")[-1]
+    df_fact = spark.read.table(fact_table)
+
+    df_fact = with_lineage(df_fact, fact_name, load_id)
 
-# 3. Dar OVERWRITE na tabela Gold
-# ATENÇÃO: Isto vai atualizar a tabela original
-df_gold_corrigido.write \
-    .format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("fact_wealth_distribution")
+    df_fact.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(fact_table)
 
-print("Sucesso: Valor da Islândia (2016) anulado e tabela Gold atualizada!")
+    print(f"✅ {fact_name}: Source_Mask, Imputed_Mask e Load_Id atualizados (load {load_id})")
+    df_fact.groupBy("Source_Mask").count().orderBy("Source_Mask").show()
+
+
+for fact_name in ["Fact_Social_Barriers", "Fact_Benchmarks", "Fact_Macro_Indicators", "Fact_Wealth_Distribution"]:
+    fact_table = f"gold_lakehouse.{gold_schema}.{fact_name}"
+    step(
+        inputs=[fact_table],
+        outputs=[fact_table],
+        name=f"lineage_{fact_name.lower()}",
+        extra=code_fingerprint(with_lineage) + code_fingerprint(source_mask_expr) + repr(fact_column_sources)
+    )(functools.partial(add_lineage, fact_table))
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # Run
+# Runs the registered steps. With `use_build_cache`, steps whose code and inputs did not change since their last build are skipped and keep their tables in `staging`. The run is recorded in `gold_lakehouse.lineage.load_runs` under the `Load_Id` written to the facts.
+
+# CELL ********************
+
+# Tabelas lidas fora da Gold (a versão Delta de cada uma fica registada no load)
+produced_tables = set().union(*(s.outputs for s in pipeline_steps))
+external_inputs = set().union(*(s.inputs for s in pipeline_steps)) - produced_tables
+
+load_id = start_load("Gold Cleaning Tables", gold_schema, external_inputs)
+
+describe_dag(pipeline_steps)
+try:
+    run_steps(pipeline_steps, cache=use_build_cache, scope=f"gold.{gold_schema}")
+except Exception:
+    finish_load(load_id, "failed")
+    raise
+finish_load(load_id)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # Publish
+# Promotes all staging tables to `dbo` as one release and reframes the Direct Lake model (see **Gold Publish (NB)**).
+
+# CELL ********************
+
+%run Gold Publish (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+if publish and gold_schema != published_schema:
+    publish_gold(gold_schema)
+else:
+    print("Publicação desligada: as tabelas ficam apenas em", gold_schema)
 
 # METADATA ********************
 
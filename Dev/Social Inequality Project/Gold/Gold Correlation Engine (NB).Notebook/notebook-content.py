@@ -0,0 +1,236 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Correlation and Lagged Regression Engine
+# Batch stage for the "causality" questions of the **Project Master Report** (does literacy reduce the Gini, does internet access reduce unemployment, which factor most hinders wage growth). Run it after the Gold publish.
+#
+# 1. The numeric columns of the published Gold facts are loaded **once** into a dense `float32` tensor `[country × year × indicator]` (`NaN` = no value) with the builder of **Indicator Tensor Store (NB)**. `Earnings_Growth_Pct` (year-on-year change of `Monthly_Employee_Earnings`) is added as a derived indicator.
+# 2. For every ordered pair (X, Y) and every lag `L` in 0..5 (X in year `t - L`, Y in year `t`), all pairs are solved together with matrix products over the masked tensor:
+#    - **Pearson_R:** pooled correlation over the country-years where both values exist;
+#    - **Spearman_Rho:** Pearson correlation of the ranks (each indicator ranked once per lag over all its values, not per pair, so it is an approximation when the two indicators cover different country-years);
+#    - **FE_Beta / FE_Std_Error / FE_T_Stat:** panel OLS `Y_it = β X_i(t-L) + α_i + ε_it` with country fixed effects (within estimator, demeaned per country over the pair's common years).
+# 3. The results go to `gold_lakehouse.analytics.indicator_correlations` (one row per pair and lag). `report_pairs` prints the pairs the report asks about.
+#
+# Correlation is not causation: the lags and the fixed effects only remove the reverse timing and the constant country differences.
+
+# CELL ********************
+
+%run Indicator Tensor Store (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+import numpy as np
+import pandas as pd
+
+max_lag = 5
+min_observations = 30
+correlations_table = "gold_lakehouse.analytics.indicator_correlations"
+
+# Perguntas do relatório: (X, Y)
+report_pairs = [
+    ("Literacy_Rate", "Gini_Index"),
+    ("Internet_Access", "Unemployment_Total"),
+    ("School_Attendance", "Earnings_Growth_Pct"),
+    ("Internet_Access", "Earnings_Growth_Pct"),
+    ("Inflation_CPI_Pct", "Earnings_Growth_Pct"),
+    ("Unemployment_Total", "Earnings_Growth_Pct")
+]
+
+
+def add_growth_indicator(tensor, indicators, source, name):
+    """Acrescenta a variação anual em % de um indicador como novo indicador."""
+    values = tensor[:, :, indicators.index(source)]
+    growth = np.full_like(values, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth[:, 1:] = (values[:, 1:] / values[:, :-1] - 1) * 100
+    growth[~np.isfinite(growth)] = np.nan
+    return np.concatenate([tensor, growth[:, :, None]], axis=2), indicators + [name]
+
+
+def lagged_slices(tensor, lag):
+    """X no ano t - lag e Y no ano t, alinhados: (X, Y) com forma [país × ano × indicador]."""
+    if lag == 0:
+        return tensor, tensor
+    return tensor[:, :-lag, :], tensor[:, lag:, :]
+
+
+def rank_columns(values):
+    """Ranks (1..n, média nos empates) de cada coluna de uma matriz [linhas × indicador], ignorando NaN."""
+    ranks = np.full(values.shape, np.nan)
+    for k in range(values.shape[1]):
+        col = values[:, k]
+        valid = np.isfinite(col)
+        if valid.sum() == 0:
+            continue
+        uniq, inverse, counts = np.unique(col[valid], return_inverse=True, return_counts=True)
+        average = np.cumsum(counts) - (counts - 1) / 2.0
+        ranks[valid, k] = average[inverse]
+    return ranks
+
+
+def pairwise_pearson(x, y):
+    """Pearson para todos os pares (X_k, Y_l) sobre as linhas onde os dois existem: matrizes [K × K]."""
+    mx, my = np.isfinite(x).astype(np.float64), np.isfinite(y).astype(np.float64)
+    x0, y0 = np.nan_to_num(x.astype(np.float64)), np.nan_to_num(y.astype(np.float64))
+
+    n = mx.T @ my
+    sx, sy = x0.T @ my, mx.T @ y0
+    sxx, syy = (x0 ** 2).T @ my, mx.T @ (y0 ** 2)
+    sxy = x0.T @ y0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+    return r, n
+
+
+def panel_fixed_effects(x, y):
+    """OLS com efeitos fixos de país (estimador within) para todos os pares. x, y: [país × ano × indicador]."""
+    mx, my = np.isfinite(x).astype(np.float64), np.isfinite(y).astype(np.float64)
+    x0, y0 = np.nan_to_num(x.astype(np.float64)), np.nan_to_num(y.astype(np.float64))
+
+    # Somas por país sobre os anos comuns a cada par: [país × K × K]
+    n_c = np.einsum("ctk,ctl->ckl", mx, my)
+    sx_c = np.einsum("ctk,ctl->ckl", x0, my)
+    sy_c = np.einsum("ctk,ctl->ckl", mx, y0)
+    sxx_c = np.einsum("ctk,ctl->ckl", x0 ** 2, my)
+    syy_c = np.einsum("ctk,ctl->ckl", mx, y0 ** 2)
+    sxy_c = np.einsum("ctk,ctl->ckl", x0, y0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        safe_n = np.where(n_c > 0, n_c, 1.0)
+        sxx_w = (sxx_c - sx_c ** 2 / safe_n).sum(axis=0)
+        syy_w = (syy_c - sy_c ** 2 / safe_n).sum(axis=0)
+        sxy_w = (sxy_c - sx_c * sy_c / safe_n).sum(axis=0)
+
+        n_obs = n_c.sum(axis=0)
+        n_countries = (n_c > 0).sum(axis=0)
+        beta = sxy_w / sxx_w
+        dof = n_obs - n_countries - 1
+        sigma2 = (syy_w - beta * sxy_w) / dof
+        std_error = np.sqrt(sigma2 / sxx_w)
+    return beta, std_error, n_obs, n_countries
+
+
+def correlation_results(tensor, indicators, max_lag=max_lag, min_observations=min_observations):
+    """Todas as métricas para todos os pares e lags numa tabela pandas (uma linha por par e lag)."""
+    k = len(indicators)
+    xi, yi = np.meshgrid(np.arange(k), np.arange(k), indexing="ij")
+    off_diagonal = (xi != yi).ravel()
+
+    parts = []
+    for lag in range(max_lag + 1):
+        x, y = lagged_slices(tensor, lag)
+        flat_x, flat_y = x.reshape(-1, k), y.reshape(-1, k)
+
+        pearson, n = pairwise_pearson(flat_x, flat_y)
+        spearman, _ = pairwise_pearson(rank_columns(flat_x), rank_columns(flat_y))
+        beta, std_error, _, n_countries = panel_fixed_effects(x, y)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_stat = beta / std_error
+
+        parts.append(pd.DataFrame({
+            "Indicator_X": np.array(indicators)[xi.ravel()],
+            "Indicator_Y": np.array(indicators)[yi.ravel()],
+            "Lag": lag,
+            "N_Obs": n.ravel().astype(np.int64),
+            "N_Countries": n_countries.ravel().astype(np.int64),
+            "Pearson_R": pearson.ravel(),
+            "Spearman_Rho": spearman.ravel(),
+            "FE_Beta": beta.ravel(),
+            "FE_Std_Error": std_error.ravel(),
+            "FE_T_Stat": t_stat.ravel()
+        })[off_diagonal])
+
+    results = pd.concat(parts, ignore_index=True)
+    results = results[results["N_Obs"] >= min_observations]
+    metric_cols = ["Pearson_R", "Spearman_Rho", "FE_Beta", "FE_Std_Error", "FE_T_Stat"]
+    results[metric_cols] = results[metric_cols].replace([np.inf, -np.inf], np.nan).round(6)
+    return results.reset_index(drop=True)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # (2) Run
+
+# CELL ********************
+
+import time
+
+start = time.perf_counter()
+tensor, countries, years, indicators = build_indicator_tensor(load_fact_frames())
+tensor, indicators = add_growth_indicator(tensor, indicators, "Monthly_Employee_Earnings", "Earnings_Growth_Pct")
+print(f"📊 Tensor {tensor.shape} ({len(countries)} países × {len(years)} anos × {len(indicators)} indicadores), "
+      f"{np.isfinite(tensor).mean():.0%} preenchido, {tensor.nbytes / 1024:.0f} KB")
+
+results = correlation_results(tensor, indicators)
+print(f"✅ {len(results)} pares × lags calculados em {time.perf_counter() - start:.1f} s")
+
+spark.sql("CREATE SCHEMA IF NOT EXISTS gold_lakehouse.analytics")
+spark.createDataFrame(results) \
+    .write.format("delta") \
+    .mode("overwrite") \
+    .option("overwriteSchema", "true") \
+    .saveAsTable(correlations_table)
+print(f"💾 Resultados gravados em {correlations_table}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+# Pares das perguntas do relatório, com o lag de maior |t| do efeito fixo
+report = results.merge(pd.DataFrame(report_pairs, columns=["Indicator_X", "Indicator_Y"]), on=["Indicator_X", "Indicator_Y"])
+best = report.assign(Abs_T=report["FE_T_Stat"].abs()) \
+    .sort_values("Abs_T", ascending=False) \
+    .drop_duplicates(["Indicator_X", "Indicator_Y"]) \
+    .drop(columns="Abs_T")
+display(best)
+
+# Fatores com o efeito mais negativo no crescimento dos salários (lag 1)
+display(results[(results["Indicator_Y"] == "Earnings_Growth_Pct") & (results["Lag"] == 1)].sort_values("FE_T_Stat").head(10))
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
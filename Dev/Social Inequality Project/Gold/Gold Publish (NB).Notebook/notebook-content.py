@@ -0,0 +1,245 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Gold Publish and Rollback
+# Shared functions used by **Gold Cleaning Tables** through `%run`. The Gold notebook builds every table in the `staging` schema of the Gold Lakehouse, and `publish_gold` promotes the whole set at once:
+# 1. **Validate:** every staging table must exist and have rows, otherwise nothing is published.
+# 2. **Copy:** each staging table is copied into `dbo` (one Delta commit per table). Tables whose staging version is the same as in the current release are not copied again. The tables in `gold_append_tables` (`Dim_Date`) only get the rows with new keys appended (`append_new_keys`), so Direct Lake does not reload them. Before each copy the `dbo` version of the table is recorded; if a copy fails, every table touched by the publish is restored to that version (tables the publish created are dropped), so nothing stays half-published, also on the first release.
+# 3. **Switch:** one append to the pointer table `gold_lakehouse.publish.releases` records the Delta version of every `dbo` table for the new release. This single commit is the switch.
+# 4. **Reframe:** the Direct Lake semantic model (`Gold_Semantic_Model`) is reframed once, so Power BI moves from the old set of tables to the new set in one step.
+#
+# `rollback_gold` restores every `dbo` table to the versions of an earlier release (by default the last good one: the `published` release before the one in effect, skipping the releases that a rollback moved away from, and following `Restored_From` when the release in effect is itself a rollback) (`RESTORE TABLE ... TO VERSION AS OF`), records it as a new release and reframes the model, without rerunning the Gold notebook. `read_published` reads a table at the version of the current release, for notebooks and exports that must not see a publish in progress.
+#
+# **Note:** automatic updates must be turned off in the semantic model settings (*Keep your Direct Lake data up to date*), otherwise Power BI reframes on every table commit. Rollback only works while the older Delta versions have not been removed by `VACUUM`.
+
+# CELL ********************
+
+from datetime import datetime, timezone
+
+from pyspark.sql import functions as F
+
+# Tabelas publicadas em conjunto (o mesmo nome em staging e em dbo)
+gold_published_tables = [
+    "Fact_Social_Barriers",
+    "Fact_Macro_Indicators",
+    "Fact_Benchmarks",
+    "fact_wealth_distribution",
+    "Dim_Geography",
+    "Dim_Date",
+    "Dim_Bloc_Membership",
+    "Mart_Bloc_Growth",
+    "Fact_Shock_Resilience"
+]
+
+# Tabelas publicadas por append das chaves novas (o Direct Lake só enquadra os ficheiros novos)
+gold_append_tables = {
+    "Dim_Date": ["Year"]
+}
+
+published_schema = "dbo"
+releases_table = "gold_lakehouse.publish.releases"
+gold_semantic_model = "Gold_Semantic_Model"
+
+
+def table_version(table_name):
+    return spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1").collect()[0]["version"]
+
+
+def list_releases():
+    """Histórico de releases (uma linha por tabela e release)."""
+    return spark.read.table(releases_table).orderBy(F.col("Created_At").desc(), "Table_Name")
+
+
+def release_versions(release_id=None):
+    """Versões Delta das tabelas dbo numa release (por defeito a atual, ou seja a última registada)."""
+    if not spark.catalog.tableExists(releases_table):
+        return None, {}
+
+    releases = spark.read.table(releases_table)
+    if release_id is None:
+        latest = releases.orderBy(F.col("Created_At").desc()).select("Release_Id").limit(1).collect()
+        if not latest:
+            return None, {}
+        release_id = latest[0]["Release_Id"]
+
+    rows = releases.filter(F.col("Release_Id") == release_id).collect()
+    return release_id, {row["Table_Name"]: row["Published_Version"] for row in rows}
+
+
+def release_staging_versions(release_id):
+    if release_id is None:
+        return {}
+    rows = spark.read.table(releases_table).filter(F.col("Release_Id") == release_id).collect()
+    return {row["Table_Name"]: row["Staging_Version"] for row in rows}
+
+
+def previous_good_release():
+    """Release publicada anterior à que está em vigor, sem contar as que já foram revertidas."""
+    history = spark.read.table(releases_table) \
+        .select("Release_Id", "Status", "Restored_From", "Created_At").distinct() \
+        .orderBy("Created_At").collect()
+
+    # Release em vigor depois de cada linha (um rollback põe em vigor a release Restored_From)
+    in_effect, rolled_back = None, set()
+    for row in history:
+        if row["Status"] == "rollback":
+            rolled_back.add(in_effect)
+            in_effect = row["Restored_From"]
+        else:
+            in_effect = row["Release_Id"]
+
+    published = [row["Release_Id"] for row in history if row["Status"] == "published"]
+    if in_effect not in published:
+        return None
+    candidates = [r for r in published[:published.index(in_effect)] if r not in rolled_back]
+    return candidates[-1] if candidates else None
+
+
+def restore_tables(versions):
+    for table, version in versions.items():
+        spark.sql(f"RESTORE TABLE gold_lakehouse.{published_schema}.{table} TO VERSION AS OF {version}")
+
+
+def reframe_semantic_model(dataset=gold_semantic_model):
+    """Reframe do modelo Direct Lake: o Power BI passa a ler as versões atuais das tabelas dbo."""
+    import sempy.fabric as fabric
+    fabric.refresh_dataset(dataset, refresh_type="full")
+    print(f"🔄 Modelo semântico '{dataset}' atualizado")
+
+
+def record_release(release_id, versions, status, staging_versions=None, restored_from=None):
+    # Uma única escrita (um único commit Delta) para todas as tabelas: é este o ponto de troca
+    spark.sql("CREATE SCHEMA IF NOT EXISTS gold_lakehouse.publish")
+    staging_versions = staging_versions or {}
+    spark.createDataFrame(
+        [(release_id, table, staging_versions.get(table), version, status, restored_from)
+         for table, version in versions.items()],
+        "Release_Id string, Table_Name string, Staging_Version long, Published_Version long, Status string, Restored_From string"
+    ).withColumn("Created_At", F.current_timestamp()) \
+        .write.format("delta").mode("append").saveAsTable(releases_table)
+
+
+def publish_gold(staging_schema="staging", tables=gold_published_tables, refresh_model=True):
+    """Publica todas as tabelas de staging em dbo como uma única release."""
+    release_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    # 1. Validar o staging antes de tocar em dbo
+    for table in tables:
+        staging_table = f"gold_lakehouse.{staging_schema}.{table}"
+        if not spark.catalog.tableExists(staging_table):
+            raise ValueError(f"Tabela em falta no staging: {staging_table}")
+        if spark.read.table(staging_table).limit(1).count() == 0:
+            raise ValueError(f"Tabela vazia no staging: {staging_table}")
+
+    current_id, current_versions = release_versions()
+    current_staging = release_staging_versions(current_id)
+    print(f"🚀 A publicar a release {release_id} (release atual: {current_id})")
+
+    # 2. Copiar para dbo; em caso de falha, repor as tabelas nas versões anteriores à cópia
+    staging_versions, published_versions, pre_copy_versions = {}, {}, {}
+    try:
+        for table in tables:
+            staging_table = f"gold_lakehouse.{staging_schema}.{table}"
+            published_table = f"gold_lakehouse.{published_schema}.{table}"
+            staging_versions[table] = table_version(staging_table)
+
+            # Tabela de staging sem alterações desde a release atual (ex.: passo ignorado pela cache): dbo não é reescrita
+            if (current_staging.get(table) == staging_versions[table]
+                    and current_versions.get(table) == table_version(published_table)):
+                published_versions[table] = current_versions[table]
+                print(f"💾 {table}: sem alterações (dbo v{published_versions[table]})")
+                continue
+
+            # Versão dbo antes da cópia (None: a tabela ainda não existe e é criada por esta release)
+            pre_copy_versions[table] = table_version(published_table) if spark.catalog.tableExists(published_table) else None
+            if table in gold_append_tables:
+                append_new_keys(spark.read.table(staging_table), published_table, gold_append_tables[table])
+            else:
+                spark.read.table(staging_table).write.format("delta") \
+                    .mode("overwrite") \
+                    .option("overwriteSchema", "true") \
+                    .saveAsTable(published_table)
+
+            published_versions[table] = table_version(published_table)
+            print(f"✅ {table}: staging v{staging_versions[table]} -> dbo v{published_versions[table]}")
+    except Exception:
+        for table, version in pre_copy_versions.items():
+            published_table = f"gold_lakehouse.{published_schema}.{table}"
+            if version is None:
+                spark.sql(f"DROP TABLE IF EXISTS {published_table}")
+            elif spark.catalog.tableExists(published_table) and table_version(published_table) != version:
+                restore_tables({table: version})
+        print(f"⚠️ Publicação falhou, {len(pre_copy_versions)} tabelas repostas nas versões anteriores à cópia")
+        raise
+
+    # 3. Troca: a release passa a ser a atual
+    record_release(release_id, published_versions, "published", staging_versions)
+
+    # 4. Reframe do modelo semântico
+    if refresh_model:
+        reframe_semantic_model()
+
+    print(f"✅ Release {release_id} publicada ({len(tables)} tabelas)")
+    return release_id
+
+
+def rollback_gold(release_id=None, refresh_model=True):
+    """Repõe as tabelas dbo numa release anterior (por defeito a última boa antes da que está em vigor)."""
+    if release_id is None:
+        release_id = previous_good_release()
+        if release_id is None:
+            raise ValueError("Não existe uma release anterior para onde voltar")
+
+    _, target_versions = release_versions(release_id)
+    if not target_versions:
+        raise ValueError(f"Release desconhecida: {release_id}")
+
+    print(f"⏪ A repor a release {release_id}...")
+    restore_tables(target_versions)
+
+    rollback_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    restored_versions = {t: table_version(f"gold_lakehouse.{published_schema}.{t}") for t in target_versions}
+    record_release(rollback_id, restored_versions, "rollback", restored_from=release_id)
+
+    if refresh_model:
+        reframe_semantic_model()
+
+    print(f"✅ Release {release_id} reposta como {rollback_id}")
+    return rollback_id
+
+
+def read_published(table, release_id=None):
+    """Lê uma tabela dbo na versão da release atual (ou da release indicada)."""
+    _, versions = release_versions(release_id)
+    published_table = f"gold_lakehouse.{published_schema}.{table}"
+    if table not in versions:
+        return spark.read.table(published_table)
+    return spark.sql(f"SELECT * FROM {published_table} VERSION AS OF {versions[table]}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,249 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Gold Table Diff
+# Compares two Delta versions (or timestamps) of a Gold table, to review what a run changed (for example the Iceland earnings set to null, the Kosovo removal or the empty benchmark rows dropped) without `.show()`.
+# - The two versions are read with `VERSION AS OF` / `TIMESTAMP AS OF`, the key (country code and `Year` by default) is checked to be unique in both, and they are joined **once** with a full outer join on it. The detail is persisted, so the summary, the display and the save all reuse that single join.
+# - Every cell is classified as `added` (new row), `removed` (row deleted), `changed` (both values present and different), `nulled` (value replaced by null) or `filled` (null replaced by a value).
+# - The result is a **summary per indicator** (counts per change type and the largest absolute change, in one `groupBy` with conditional aggregates) and a **detail table** with one row per changed cell. Both are Spark DataFrames and, with `save_diff`, Delta tables in `gold_lakehouse.audit`, so large diffs are never collected to the driver.
+#
+# Columns that only exist in one version are listed as schema changes. `Load_Id` is ignored by default because every Gold run rewrites it. A repeated key stops the diff (`assert_unique_key`), since it would multiply the joined rows into false `changed` cells.
+
+# PARAMETERS CELL ********************
+
+# Tabela a comparar e versões (None = as duas últimas versões da tabela)
+diff_table = "gold_lakehouse.dbo.Fact_Benchmarks"
+from_version = None
+to_version = None
+from_timestamp = None
+to_timestamp = None
+save_results = True
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+from pyspark import StorageLevel
+from pyspark.sql import functions as F
+from pyspark.sql.types import NumericType
+
+diff_summary_table = "gold_lakehouse.audit.table_diff_summary"
+diff_detail_table = "gold_lakehouse.audit.table_diff_detail"
+
+code_key_candidates = ["Country_Code_Iso3", "Aggregate_Code", "Country_Code"]
+change_types = ["added", "removed", "changed", "nulled", "filled"]
+
+
+def resolve_version(table_name, version=None, timestamp=None, offset=0):
+    """Versão Delta a comparar: a indicada, a última antes do timestamp, ou a última menos `offset`."""
+    if version is not None:
+        return int(version)
+
+    history = spark.sql(f"DESCRIBE HISTORY {table_name}").select("version", "timestamp")
+    if timestamp is not None:
+        row = history.filter(F.col("timestamp") <= F.lit(timestamp).cast("timestamp")) \
+            .agg(F.max("version").alias("version")).collect()[0]
+        if row["version"] is None:
+            raise ValueError(f"{table_name} não tem versões antes de {timestamp}")
+        return row["version"]
+
+    latest = history.agg(F.max("version")).collect()[0][0]
+    if latest - offset < 0:
+        raise ValueError(f"{table_name} não tem a versão {latest - offset}")
+    return latest - offset
+
+
+def read_version(table_name, version):
+    return spark.sql(f"SELECT * FROM {table_name} VERSION AS OF {version}")
+
+
+def default_keys(columns):
+    """Chave por defeito: o código do país/agregado e o ano, quando existem."""
+    lower = {c.lower(): c for c in columns}
+    keys = [lower[c.lower()] for c in code_key_candidates if c.lower() in lower][:1]
+    if "year" in lower:
+        keys.append(lower["year"])
+    if not keys:
+        raise ValueError(f"Não foi possível inferir a chave, indica key_columns: {columns}")
+    return keys
+
+
+def assert_unique_key(df, key_columns, label):
+    """Uma chave repetida multiplicava as linhas do join e gerava falsos "changed"."""
+    repeated = df.groupBy(*key_columns).count().filter(F.col("count") > 1).limit(5).collect()
+    if repeated:
+        raise ValueError(f"Chave {key_columns} repetida em {label}: {[tuple(r)[:-1] for r in repeated]}")
+
+
+def cell_change(old_col, new_col, row_added, row_removed):
+    return F.when(row_added, F.when(new_col.isNotNull(), F.lit("added"))) \
+        .when(row_removed, F.when(old_col.isNotNull(), F.lit("removed"))) \
+        .when(old_col.eqNullSafe(new_col), F.lit(None)) \
+        .when(new_col.isNull(), F.lit("nulled")) \
+        .when(old_col.isNull(), F.lit("filled")) \
+        .otherwise(F.lit("changed"))
+
+
+def diff_versions(table_name, from_version=None, to_version=None, from_timestamp=None, to_timestamp=None,
+                  key_columns=None, ignore_columns=("Load_Id",)):
+    """Diff célula a célula entre duas versões de uma tabela. Devolve (resumo, detalhe, info)."""
+    v_from = resolve_version(table_name, from_version, from_timestamp, offset=1)
+    v_to = resolve_version(table_name, to_version, to_timestamp, offset=0)
+
+    df_old = read_version(table_name, v_from)
+    df_new = read_version(table_name, v_to)
+
+    # Nomes em minúsculas dos dois lados (o Spark não distingue maiúsculas, as versões antigas às vezes sim)
+    old_cols = {c.lower(): c for c in df_old.columns}
+    new_cols = {c.lower(): c for c in df_new.columns}
+    keys = [k.lower() for k in (key_columns or default_keys(df_new.columns))]
+    missing = [k for k in keys if k not in old_cols or k not in new_cols]
+    if missing:
+        raise ValueError(f"Chave {missing} não existe nas duas versões de {table_name}")
+
+    ignored = {c.lower() for c in ignore_columns}
+    value_cols = [c for c in new_cols if c in old_cols and c not in keys and c not in ignored]
+    schema_changes = {
+        "added_columns": [new_cols[c] for c in new_cols if c not in old_cols],
+        "removed_columns": [old_cols[c] for c in old_cols if c not in new_cols]
+    }
+
+    numeric = {
+        c for c in value_cols
+        if isinstance(df_old.schema[old_cols[c]].dataType, NumericType)
+        and isinstance(df_new.schema[new_cols[c]].dataType, NumericType)
+    }
+
+    old = df_old.select(
+        *[F.col(old_cols[k]).alias(f"k_{k}") for k in keys],
+        F.lit(True).alias("_in_old"),
+        *[F.col(old_cols[c]).alias(f"o_{c}") for c in value_cols]
+    )
+    new = df_new.select(
+        *[F.col(new_cols[k]).alias(f"k_{k}") for k in keys],
+        F.lit(True).alias("_in_new"),
+        *[F.col(new_cols[c]).alias(f"n_{c}") for c in value_cols]
+    )
+
+    assert_unique_key(df_old, [old_cols[k] for k in keys], f"{table_name} v{v_from}")
+    assert_unique_key(df_new, [new_cols[k] for k in keys], f"{table_name} v{v_to}")
+
+    # Um único full outer join na chave
+    joined = old.join(new, [f"k_{k}" for k in keys], "full_outer")
+    row_added = F.col("_in_old").isNull()
+    row_removed = F.col("_in_new").isNull()
+
+    cells = []
+    for c in value_cols:
+        o, n = F.col(f"o_{c}"), F.col(f"n_{c}")
+        if c not in numeric:
+            o, n = o.cast("string"), n.cast("string")
+        cells.append(F.struct(
+            F.lit(new_cols[c]).alias("Indicator"),
+            cell_change(o, n, row_added, row_removed).alias("Change_Type"),
+            o.cast("string").alias("Old_Value"),
+            n.cast("string").alias("New_Value"),
+            ((n - o).cast("double") if c in numeric else F.lit(None).cast("double")).alias("Delta")
+        ))
+
+    detail = joined.select(
+        *[F.col(f"k_{k}").alias(new_cols[k]) for k in keys],
+        F.explode(F.array(*cells)).alias("cell")
+    ).select(*[new_cols[k] for k in keys], "cell.*") \
+        .filter(F.col("Change_Type").isNotNull()) \
+        .persist(StorageLevel.MEMORY_AND_DISK)
+
+    # O join corre uma vez: o resumo, a visualização e a gravação leem o detalhe persistido
+    changed = F.col("Change_Type") == "changed"
+    summary = detail.groupBy("Indicator").agg(
+        *[F.count(F.when(F.col("Change_Type") == t, 1)).alias(t) for t in change_types],
+        F.max(F.when(changed, F.abs("Delta"))).alias("Max_Abs_Delta"),
+        F.avg(F.when(changed, F.abs("Delta"))).alias("Mean_Abs_Delta")
+    ).orderBy("Indicator")
+
+    info = {"table": table_name, "from_version": v_from, "to_version": v_to, "keys": [new_cols[k] for k in keys], **schema_changes}
+    return summary, detail, info
+
+
+def save_diff(summary, detail, info):
+    """Acrescenta o diff às tabelas de auditoria (identificado pela tabela e pelas duas versões)."""
+    spark.sql("CREATE SCHEMA IF NOT EXISTS gold_lakehouse.audit")
+    tags = [
+        F.lit(info["table"]).alias("Table_Name"),
+        F.lit(info["from_version"]).cast("long").alias("From_Version"),
+        F.lit(info["to_version"]).cast("long").alias("To_Version"),
+        F.current_timestamp().alias("Diff_At")
+    ]
+    summary.select(*tags, "*").write.format("delta").mode("append").option("mergeSchema", "true") \
+        .saveAsTable(diff_summary_table)
+    # Chaves num texto JSON para que tabelas com chaves diferentes caibam no mesmo detalhe
+    detail.select(*tags, F.to_json(F.struct(*info["keys"])).alias("Key"),
+                  "Indicator", "Change_Type", "Old_Value", "New_Value", "Delta") \
+        .write.format("delta").mode("append").option("mergeSchema", "true") \
+        .saveAsTable(diff_detail_table)
+    print(f"💾 Diff guardado em {diff_summary_table} e {diff_detail_table}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # (2) Run
+
+# CELL ********************
+
+summary, detail, info = diff_versions(
+    diff_table,
+    from_version=from_version,
+    to_version=to_version,
+    from_timestamp=from_timestamp,
+    to_timestamp=to_timestamp
+)
+
+print(f"📊 {info['table']}: v{info['from_version']} -> v{info['to_version']} (chave {info['keys']})")
+if info["added_columns"] or info["removed_columns"]:
+    print(f"⚠️ Colunas novas: {info['added_columns']} | Colunas removidas: {info['removed_columns']}")
+
+display(summary)
+display(detail.orderBy(*info["keys"], "Indicator").limit(100))
+
+if save_results:
+    save_diff(summary, detail, info)
+detail.unpersist()
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,154 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Inequality Metrics from Income Shares
+# Shared functions used by **Gold Cleaning Tables** through `%run`. The WID files only give four points of the income distribution (bottom 50%, middle 40%, top 10% and top 1%), so the metrics below are computed from those groups:
+# - **Palma_Ratio:** top 10% share / bottom 40% share. The bottom 40% is read from the Lorenz curve by linear interpolation inside the bottom 50%, so it is a slight overestimate and the ratio a slight underestimate.
+# - **Top10_Bottom50_Ratio:** top 10% share / bottom 50% share.
+# - **Gini_Approx:** `1 - Σ (p_k - p_{k-1}) (L_k + L_{k-1})` over the Lorenz points (0, 0), (0.5, B50), (0.9, 1 - T10), (0.99, 1 - T1), (1, 1). With only four groups this is the lower bound of the Gini (no inequality inside each group).
+# - **Theil_Index:** between-group Theil T, `Σ s_g ln(s_g / n_g)` over the four groups (bottom 50%, middle 40%, percentiles 90-99, top 1%).
+#
+# The shares are normalized to sum to 100% before computing, because the WID values are rounded. Rows with a missing share get nulls.
+#
+# `inequality_metrics` works on NumPy arrays (whole columns at once), so it can also be used locally on the Gold snapshot. `add_inequality_metrics` applies it to a Spark DataFrame batch by batch with `mapInArrow`, with no per-row Python code.
+#
+# The last cell runs `metrics_self_test()` (known cases plus a timed run on synthetic shares), so every `%run` of this notebook checks the metrics before they are used; it takes a few milliseconds and touches no table.
+
+# CELL ********************
+
+import time
+
+import numpy as np
+import pyarrow as pa
+from pyspark.sql.types import StructField, DoubleType
+
+share_columns = {
+    "bottom_50": "Share_Bottom_50_pct",
+    "middle_40": "Share_Middle_40_pct",
+    "top_10": "Share_Top_10_pct",
+    "top_1": "Share_Top_1_pct"
+}
+metric_columns = ["Palma_Ratio", "Top10_Bottom50_Ratio", "Gini_Approx", "Theil_Index"]
+
+# Percentis de população de cada grupo (50%, 40%, 9%, 1%)
+group_population = np.array([0.5, 0.4, 0.09, 0.01])
+
+
+def inequality_metrics(bottom_50, middle_40, top_10, top_1):
+    """Métricas de desigualdade para colunas inteiras de partilhas (em %). Devolve {coluna: array}."""
+    groups = np.stack([
+        np.asarray(bottom_50, dtype=np.float64),
+        np.asarray(middle_40, dtype=np.float64),
+        np.asarray(top_10, dtype=np.float64) - np.asarray(top_1, dtype=np.float64),
+        np.asarray(top_1, dtype=np.float64)
+    ], axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = groups.sum(axis=1, keepdims=True)
+        valid = np.isfinite(total[:, 0]) & (total[:, 0] > 0) & (groups >= 0).all(axis=1)
+        shares = groups / total
+
+        # Curva de Lorenz nos pontos p = 0, 0.5, 0.9, 0.99, 1
+        lorenz = np.concatenate([np.zeros((len(shares), 1)), np.cumsum(shares, axis=1)], axis=1)
+        gini = 1.0 - (group_population * (lorenz[:, 1:] + lorenz[:, :-1])).sum(axis=1)
+
+        top_10_share = shares[:, 2] + shares[:, 3]
+        bottom_40_share = shares[:, 0] * (0.4 / 0.5)
+        palma = top_10_share / bottom_40_share
+        top10_bottom50 = top_10_share / shares[:, 0]
+
+        # Grupos sem rendimento não contribuem para o Theil (s ln s -> 0)
+        theil = np.where(shares > 0, shares * np.log(shares / group_population), 0.0).sum(axis=1)
+
+    metrics = {
+        "Palma_Ratio": palma,
+        "Top10_Bottom50_Ratio": top10_bottom50,
+        "Gini_Approx": gini,
+        "Theil_Index": theil
+    }
+    return {name: np.where(valid & np.isfinite(values), np.round(values, 4), np.nan) for name, values in metrics.items()}
+
+
+def metrics_batch(batch):
+    """RecordBatch Arrow -> o mesmo batch com as colunas de métricas acrescentadas."""
+    columns = {
+        key: batch.column(batch.schema.get_field_index(name)).to_numpy(zero_copy_only=False)
+        for key, name in share_columns.items()
+    }
+    metrics = inequality_metrics(**columns)
+
+    arrays = list(batch.columns)
+    names = list(batch.schema.names)
+    for name in metric_columns:
+        values = metrics[name]
+        arrays.append(pa.array(values, type=pa.float64(), mask=np.isnan(values)))
+        names.append(name)
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def add_inequality_metrics(df):
+    """Acrescenta as métricas a um DataFrame Spark com as colunas de share_columns (mapInArrow)."""
+    base = df.drop(*[c for c in metric_columns if c in df.columns])
+    for name in share_columns.values():
+        base = base.withColumn(name, base[name].cast("double"))
+
+    schema = base.schema
+    for name in metric_columns:
+        schema = schema.add(StructField(name, DoubleType(), True))
+
+    def compute(batches):
+        for batch in batches:
+            yield metrics_batch(batch)
+
+    return base.mapInArrow(compute, schema)
+
+
+def metrics_self_test(rows=6000, seed=7):
+    """Casos conhecidos (igualdade perfeita) e tempo de um recálculo completo com dados sintéticos."""
+    equal = inequality_metrics([50.0], [40.0], [10.0], [1.0])
+    assert abs(equal["Gini_Approx"][0]) < 1e-9 and abs(equal["Theil_Index"][0]) < 1e-9
+    assert abs(equal["Palma_Ratio"][0] - 0.25) < 1e-9
+
+    rng = np.random.default_rng(seed)
+    bottom_50 = rng.uniform(5, 25, rows)
+    top_10 = rng.uniform(25, 65, rows)
+    top_1 = top_10 * rng.uniform(0.2, 0.5, rows)
+    middle_40 = 100 - bottom_50 - top_10
+
+    start = time.perf_counter()
+    metrics = inequality_metrics(bottom_50, middle_40, top_10, top_1)
+    elapsed = time.perf_counter() - start
+
+    gini = metrics["Gini_Approx"]
+    assert ((gini > 0) & (gini < 1)).all()
+    print(f"✅ {rows} linhas em {elapsed * 1000:.2f} ms (Gini entre {gini.min():.3f} e {gini.max():.3f})")
+    return elapsed
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+# Verificação das métricas (igualdade perfeita e dados sintéticos) sempre que o notebook é carregado
+metrics_self_test()
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,152 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Columnar Snapshot of the Gold Layer for Offline Analysis
+# Exports every Gold fact and dimension as a versioned snapshot under `Files/Exports/Gold_Snapshots/<version>/`:
+# - **`<table>.parquet`:** ZSTD-compressed, dictionary-encoded `Country_Code_Iso3`, sorted by `(Country_Code_Iso3, Year)`. This is the compact copy to download.
+# - **`<table>.arrow`:** Uncompressed Arrow IPC file with the same content, so the reader can memory-map it and load it with zero copies.
+# - **`manifest.json`:** Row counts, columns and the Delta version each table was exported from.
+#
+# The `LATEST` file at the root always points to the most recent version. Use the **Gold Snapshot Reader (NB)** to load a snapshot in pandas or Polars.
+
+# CELL ********************
+
+import json
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 1. Tabelas a exportar (nome no snapshot -> tabela Gold)
+gold_tables = {
+    "Fact_Social_Barriers": "gold_lakehouse.dbo.Fact_Social_Barriers",
+    "Fact_Macro_Indicators": "gold_lakehouse.dbo.Fact_Macro_Indicators",
+    "Fact_Benchmarks": "gold_lakehouse.dbo.Fact_Benchmarks",
+    "Fact_Wealth_Distribution": "gold_lakehouse.dbo.fact_wealth_distribution",
+    "Dim_Geography": "gold_lakehouse.dbo.Dim_Geography",
+    "Dim_Date": "gold_lakehouse.dbo.Dim_Date"
+}
+
+# As tabelas Gold usam nomes diferentes para o código do país,
+# no snapshot ficam todas com o mesmo nome para se poderem juntar localmente
+key_aliases = ["country_code_iso3", "aggregate_code"]
+key_column = "Country_Code_Iso3"
+
+# 2. Destino (montagem local do Lakehouse por defeito)
+snapshot_root = "/lakehouse/default/Files/Exports/Gold_Snapshots"
+snapshot_version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+snapshot_path = os.path.join(snapshot_root, snapshot_version)
+os.makedirs(snapshot_path, exist_ok=True)
+
+# O Arrow evita a serialização linha a linha na recolha para o driver
+spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+def to_snapshot_table(df_spark):
+    """Converte uma tabela Gold numa tabela Arrow normalizada, ordenada e com o país codificado em dicionário."""
+    for c in df_spark.columns:
+        if c.lower() in key_aliases and c != key_column:
+            df_spark = df_spark.withColumnRenamed(c, key_column)
+
+    table = pa.Table.from_pandas(df_spark.toPandas(), preserve_index=False)
+
+    sort_keys = [(c, "ascending") for c in (key_column, "Year") if c in table.column_names]
+    if sort_keys:
+        table = table.sort_by(sort_keys)
+
+    if "Year" in table.column_names:
+        table = table.set_column(
+            table.column_names.index("Year"), "Year", pc.cast(table["Year"], pa.int16())
+        )
+
+    if key_column in table.column_names:
+        table = table.set_column(
+            table.column_names.index(key_column), key_column, pc.dictionary_encode(table[key_column])
+        )
+
+    return table
+
+
+def delta_version(table_name):
+    return spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1").collect()[0]["version"]
+
+
+manifest = {
+    "version": snapshot_version,
+    "created_at": datetime.now(timezone.utc).isoformat(),
+    "sort_keys": [key_column, "Year"],
+    "tables": {}
+}
+
+for name, table_name in gold_tables.items():
+    print(f"🚀 A exportar {table_name}...")
+    table = to_snapshot_table(spark.read.table(table_name))
+
+    # Parquet compacto (ZSTD + dicionário no código do país)
+    pq.write_table(
+        table,
+        os.path.join(snapshot_path, f"{name}.parquet"),
+        compression="zstd",
+        use_dictionary=[key_column] if key_column in table.column_names else False
+    )
+
+    # Arrow IPC sem compressão para permitir memory-map (zero-copy) na leitura
+    with pa.OSFile(os.path.join(snapshot_path, f"{name}.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    manifest["tables"][name] = {
+        "source_table": table_name,
+        "delta_version": delta_version(table_name),
+        "rows": table.num_rows,
+        "columns": table.column_names
+    }
+
+with open(os.path.join(snapshot_path, "manifest.json"), "w") as f:
+    json.dump(manifest, f, indent=2)
+
+# O ponteiro só é atualizado no fim, para nunca apontar para um snapshot incompleto
+with open(os.path.join(snapshot_root, "LATEST"), "w") as f:
+    f.write(snapshot_version)
+
+print(f"✅ Snapshot {snapshot_version} criado em Files/Exports/Gold_Snapshots/{snapshot_version}")
+for name, info in manifest["tables"].items():
+    print(f"📊 {name}: {info['rows']} linhas (Delta v{info['delta_version']})")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,447 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Local Query Backend for the Gold Layer (DuckDB)
+# Registers the Gold tables in an embedded, in-memory DuckDB catalog and ships the analytical questions from `Reports/` as parameterized SQL. Nothing here needs a Spark session, so the same cells run in a local Jupyter session or in tests.
+#
+# Two sources are supported:
+# - **`snapshot`:** The Parquet files written by **Gold Columnar Snapshot Export (NB)** (default, works offline).
+# - **`delta`:** The Gold Delta tables read directly with the DuckDB `delta` extension (`/lakehouse/default/Tables/dbo` inside Fabric).
+
+# CELL ********************
+
+%pip install duckdb
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (1.1) Catalog
+
+# CELL ********************
+
+import os
+
+import duckdb
+
+snapshot_root = "/lakehouse/default/Files/Exports/Gold_Snapshots"
+tables_root = "/lakehouse/default/Tables/dbo"
+
+# Nome no catálogo DuckDB -> (ficheiro no snapshot, pasta da tabela Delta)
+gold_catalog = {
+    "Fact_Macro_Indicators": ("Fact_Macro_Indicators", "Fact_Macro_Indicators"),
+    "Fact_Social_Barriers": ("Fact_Social_Barriers", "Fact_Social_Barriers"),
+    "Fact_Benchmarks": ("Fact_Benchmarks", "Fact_Benchmarks"),
+    "fact_wealth_distribution": ("Fact_Wealth_Distribution", "Fact_Wealth_Distribution"),
+    "Dim_Geography": ("Dim_Geography", "Dim_Geography"),
+    "Dim_Date": ("Dim_Date", "Dim_Date")
+}
+
+
+def connect(source="snapshot", version=None, snapshot_root=snapshot_root, tables_root=tables_root):
+    """Cria uma ligação DuckDB em memória com as tabelas Gold registadas como views."""
+    con = duckdb.connect()
+
+    if source == "snapshot":
+        if version is None:
+            with open(os.path.join(snapshot_root, "LATEST")) as f:
+                version = f.read().strip()
+        for view_name, (file_name, _) in gold_catalog.items():
+            path = os.path.join(snapshot_root, version, f"{file_name}.parquet").replace("'", "''")
+            con.execute(f"CREATE VIEW {view_name} AS SELECT * FROM read_parquet('{path}')")
+    elif source == "delta":
+        con.execute("INSTALL delta")
+        con.execute("LOAD delta")
+        for view_name, (_, folder_name) in gold_catalog.items():
+            path = os.path.join(tables_root, folder_name).replace("'", "''")
+            con.execute(f"CREATE VIEW {view_name} AS SELECT * FROM delta_scan('{path}')")
+    else:
+        raise ValueError(f"Fonte desconhecida: {source}")
+
+    return con
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (1.2) Report Questions as Parameterized SQL
+# Each entry maps to a question from **Important Datasets** or **Project Master Report**. Parameters use DuckDB named parameters (`$name`); the defaults live in `report_defaults` and can be overridden per call.
+
+# CELL ********************
+
+report_queries = {
+    # Economia (1): crescimento do PIB e volatilidade (desvio padrão do crescimento) por país/bloco
+    "gdp_growth_volatility": """
+        SELECT Country_Code_Iso3,
+               AVG(GDP_Annual_Growth_Pct) AS Avg_GDP_Growth_Pct,
+               STDDEV_SAMP(GDP_Annual_Growth_Pct) AS GDP_Growth_Volatility,
+               arg_min(GDP_per_Capita, Year) FILTER (WHERE GDP_per_Capita IS NOT NULL) AS First_GDP_per_Capita,
+               arg_max(GDP_per_Capita, Year) FILTER (WHERE GDP_per_Capita IS NOT NULL) AS Last_GDP_per_Capita
+        FROM Fact_Macro_Indicators
+        WHERE list_contains($codes, Country_Code_Iso3)
+          AND Year BETWEEN $start_year AND $end_year
+        GROUP BY Country_Code_Iso3
+        ORDER BY Avg_GDP_Growth_Pct DESC
+    """,
+
+    # Economia (1): as economias emergentes convergem para a referência em PIB per capita?
+    "gdp_per_capita_convergence": """
+        WITH ref AS (
+            SELECT Year, GDP_per_Capita AS Reference_GDP_per_Capita
+            FROM Fact_Macro_Indicators
+            WHERE Country_Code_Iso3 = $reference
+        )
+        SELECT m.Country_Code_Iso3, m.Year, m.GDP_per_Capita,
+               m.GDP_per_Capita / ref.Reference_GDP_per_Capita AS Ratio_To_Reference
+        FROM Fact_Macro_Indicators m
+        JOIN ref ON m.Year = ref.Year
+        WHERE list_contains($codes, m.Country_Code_Iso3)
+          AND m.Year BETWEEN $start_year AND $end_year
+        ORDER BY m.Country_Code_Iso3, m.Year
+    """,
+
+    # Economia (4): as economias que crescem mais reduzem a desigualdade mais depressa?
+    "growth_vs_gini_change": """
+        SELECT m.Country_Code_Iso3, g.country_or_area,
+               AVG(m.GDP_Annual_Growth_Pct) AS Avg_GDP_Growth_Pct,
+               arg_max(m.Gini_Index, m.Year) FILTER (WHERE m.Gini_Index IS NOT NULL)
+                 - arg_min(m.Gini_Index, m.Year) FILTER (WHERE m.Gini_Index IS NOT NULL) AS Gini_Change
+        FROM Fact_Macro_Indicators m
+        JOIN Dim_Geography g ON m.Country_Code_Iso3 = g.Country_Code_Iso3
+        WHERE m.Year BETWEEN $start_year AND $end_year
+        GROUP BY m.Country_Code_Iso3, g.country_or_area
+        HAVING COUNT(m.Gini_Index) >= 2
+        ORDER BY Avg_GDP_Growth_Pct DESC
+    """,
+
+    # Economia (5) / Demografia: desemprego médio por contexto económico e região
+    "unemployment_by_economic_context": """
+        SELECT d.Economic_Context, g.region_name,
+               AVG(m.Unemployment_Total) AS Avg_Unemployment_Pct,
+               AVG(m.GDP_Annual_Growth_Pct) AS Avg_GDP_Growth_Pct
+        FROM Fact_Macro_Indicators m
+        JOIN Dim_Date d ON m.Year = d.Year
+        JOIN Dim_Geography g ON m.Country_Code_Iso3 = g.Country_Code_Iso3
+        GROUP BY d.Economic_Context, g.region_name
+        ORDER BY g.region_name, MIN(m.Year)
+    """,
+
+    # Demografia (1): evolução da população total de um grupo de países
+    "population_trend_by_group": """
+        SELECT Year, SUM(Pop_Total_Count) AS Pop_Total_Count, COUNT(Pop_Total_Count) AS Countries_Reporting
+        FROM Fact_Macro_Indicators
+        WHERE list_contains($codes, Country_Code_Iso3)
+          AND Year BETWEEN $start_year AND $end_year
+        GROUP BY Year
+        ORDER BY Year
+    """,
+
+    # Demografia (1): países com maior e menor crescimento populacional
+    "population_growth_extremes": """
+        WITH growth AS (
+            SELECT m.Country_Code_Iso3, g.country_or_area,
+                   POWER(
+                       arg_max(m.Pop_Total_Count, m.Year) FILTER (WHERE m.Pop_Total_Count IS NOT NULL)
+                         / arg_min(m.Pop_Total_Count, m.Year) FILTER (WHERE m.Pop_Total_Count IS NOT NULL),
+                       1.0 / NULLIF(MAX(m.Year) FILTER (WHERE m.Pop_Total_Count IS NOT NULL)
+                                    - MIN(m.Year) FILTER (WHERE m.Pop_Total_Count IS NOT NULL), 0)
+                   ) - 1 AS Pop_Growth_Rate_Annual
+            FROM Fact_Macro_Indicators m
+            JOIN Dim_Geography g ON m.Country_Code_Iso3 = g.Country_Code_Iso3
+            WHERE m.Year BETWEEN $start_year AND $end_year
+            GROUP BY m.Country_Code_Iso3, g.country_or_area
+        ),
+        ranked AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (ORDER BY Pop_Growth_Rate_Annual DESC) AS Rank_Highest,
+                   ROW_NUMBER() OVER (ORDER BY Pop_Growth_Rate_Annual ASC) AS Rank_Lowest
+            FROM growth
+            WHERE Pop_Growth_Rate_Annual IS NOT NULL
+        )
+        SELECT * FROM ranked
+        WHERE Rank_Highest <= $top_n OR Rank_Lowest <= $top_n
+        ORDER BY Pop_Growth_Rate_Annual DESC
+    """,
+
+    # Nível 1: variação do Gini e do IDH entre regiões
+    "gini_hdi_by_region": """
+        SELECT g.region_name, m.Year,
+               AVG(m.Gini_Index) AS Avg_Gini_Index,
+               AVG(m.HDI) AS Avg_HDI,
+               COUNT(m.Gini_Index) AS Countries_With_Gini
+        FROM Fact_Macro_Indicators m
+        JOIN Dim_Geography g ON m.Country_Code_Iso3 = g.Country_Code_Iso3
+        WHERE m.Year >= $start_year
+        GROUP BY g.region_name, m.Year
+        ORDER BY g.region_name, m.Year
+    """,
+
+    # Nível 1: os 10 países com maior concentração no top 1% e o seu salário médio
+    "top_1_pct_extremes": """
+        WITH latest AS (
+            SELECT Country_Code_Iso3,
+                   MAX(Year) AS Year,
+                   arg_max(Share_Top_1_pct, Year) AS Share_Top_1_pct,
+                   AVG(Monthly_Employee_Earnings) AS Avg_Monthly_Employee_Earnings
+            FROM fact_wealth_distribution
+            WHERE Year <= $year AND Share_Top_1_pct IS NOT NULL
+            GROUP BY Country_Code_Iso3
+        )
+        SELECT l.*, g.country_or_area,
+               AVG(l.Share_Top_1_pct) OVER () AS Global_Avg_Share_Top_1_pct
+        FROM latest l
+        JOIN Dim_Geography g ON l.Country_Code_Iso3 = g.Country_Code_Iso3
+        ORDER BY l.Share_Top_1_pct DESC
+        LIMIT $top_n
+    """,
+
+    # Nível 1: nos países com IDH a subir, a riqueza chega aos 50% mais pobres?
+    "hdi_inclusion_gap": """
+        WITH hdi AS (
+            SELECT Country_Code_Iso3,
+                   arg_max(HDI, Year) FILTER (WHERE HDI IS NOT NULL)
+                     - arg_min(HDI, Year) FILTER (WHERE HDI IS NOT NULL) AS HDI_Change
+            FROM Fact_Macro_Indicators
+            WHERE Year BETWEEN $start_year AND $end_year
+            GROUP BY Country_Code_Iso3
+        ),
+        bottom AS (
+            SELECT Country_Code_Iso3,
+                   arg_max(Share_Bottom_50_pct, Year) FILTER (WHERE Share_Bottom_50_pct IS NOT NULL)
+                     - arg_min(Share_Bottom_50_pct, Year) FILTER (WHERE Share_Bottom_50_pct IS NOT NULL) AS Bottom_50_Share_Change
+            FROM fact_wealth_distribution
+            WHERE Year BETWEEN $start_year AND $end_year
+            GROUP BY Country_Code_Iso3
+        )
+        SELECT hdi.Country_Code_Iso3, hdi.HDI_Change, bottom.Bottom_50_Share_Change
+        FROM hdi
+        JOIN bottom ON hdi.Country_Code_Iso3 = bottom.Country_Code_Iso3
+        WHERE hdi.HDI_Change > 0
+        ORDER BY hdi.HDI_Change DESC
+    """,
+
+    # Nível 2: a literacia está associada a um Gini mais baixo? (por região + total)
+    "literacy_vs_gini": """
+        SELECT COALESCE(g.region_name, 'All') AS region_name,
+               CORR(s.Literacy_Rate, m.Gini_Index) AS Pearson_Literacy_Gini,
+               COUNT(*) FILTER (WHERE s.Literacy_Rate IS NOT NULL AND m.Gini_Index IS NOT NULL) AS Observations
+        FROM Fact_Social_Barriers s
+        JOIN Fact_Macro_Indicators m ON s.Country_Code_Iso3 = m.Country_Code_Iso3 AND s.Year = m.Year
+        JOIN Dim_Geography g ON s.Country_Code_Iso3 = g.Country_Code_Iso3
+        WHERE s.Year BETWEEN $start_year AND $end_year
+        GROUP BY ROLLUP (g.region_name)
+        ORDER BY region_name
+    """,
+
+    # Nível 2: o acesso à internet reduz o desemprego?
+    "internet_vs_unemployment": """
+        SELECT COALESCE(g.region_name, 'All') AS region_name,
+               CORR(s.Internet_Access, m.Unemployment_Total) AS Pearson_Internet_Unemployment,
+               COUNT(*) FILTER (WHERE s.Internet_Access IS NOT NULL AND m.Unemployment_Total IS NOT NULL) AS Observations
+        FROM Fact_Social_Barriers s
+        JOIN Fact_Macro_Indicators m ON s.Country_Code_Iso3 = m.Country_Code_Iso3 AND s.Year = m.Year
+        JOIN Dim_Geography g ON s.Country_Code_Iso3 = g.Country_Code_Iso3
+        WHERE s.Year BETWEEN $start_year AND $end_year
+        GROUP BY ROLLUP (g.region_name)
+        ORDER BY region_name
+    """,
+
+    # Nível 2: o gap digital entre países da mesma região ao longo do tempo
+    "digital_gap_by_region": """
+        SELECT g.region_name, s.Year,
+               AVG(s.Internet_Access) AS Avg_Internet_Access,
+               MIN(s.Internet_Access) AS Min_Internet_Access,
+               MAX(s.Internet_Access) AS Max_Internet_Access,
+               MAX(s.Internet_Access) - MIN(s.Internet_Access) AS Internet_Access_Gap
+        FROM Fact_Social_Barriers s
+        JOIN Dim_Geography g ON s.Country_Code_Iso3 = g.Country_Code_Iso3
+        WHERE s.Year BETWEEN $start_year AND $end_year
+        GROUP BY g.region_name, s.Year
+        ORDER BY g.region_name, s.Year
+    """,
+
+    # Nível 2: inclusão financeira feminina vs salário médio
+    "female_inclusion_vs_wages": """
+        WITH per_country AS (
+            SELECT s.Country_Code_Iso3,
+                   AVG(s.Female_Account_Ownership) AS Avg_Female_Account_Ownership,
+                   AVG(w.Monthly_Employee_Earnings) AS Avg_Monthly_Employee_Earnings
+            FROM Fact_Social_Barriers s
+            JOIN fact_wealth_distribution w ON s.Country_Code_Iso3 = w.Country_Code_Iso3 AND s.Year = w.Year
+            WHERE s.Year BETWEEN $start_year AND $end_year
+            GROUP BY s.Country_Code_Iso3
+        )
+        SELECT *, CORR(Avg_Female_Account_Ownership, Avg_Monthly_Employee_Earnings) OVER () AS Pearson_Across_Countries
+        FROM per_country
+        WHERE Avg_Female_Account_Ownership IS NOT NULL AND Avg_Monthly_Employee_Earnings IS NOT NULL
+        ORDER BY Avg_Female_Account_Ownership DESC
+    """,
+
+    # Nível 2: exclusão financeira das mulheres vs pobreza multidimensional
+    "female_inclusion_vs_poverty": """
+        WITH per_country AS (
+            SELECT Country_Code_Iso3,
+                   AVG(Female_Account_Ownership) AS Avg_Female_Account_Ownership,
+                   AVG(MPI) AS Avg_MPI
+            FROM Fact_Social_Barriers
+            WHERE Year BETWEEN $start_year AND $end_year
+            GROUP BY Country_Code_Iso3
+        )
+        SELECT *, CORR(Avg_Female_Account_Ownership, Avg_MPI) OVER () AS Pearson_Across_Countries
+        FROM per_country
+        WHERE Avg_Female_Account_Ownership IS NOT NULL AND Avg_MPI IS NOT NULL
+        ORDER BY Avg_MPI DESC
+    """,
+
+    # Nível 3: a crise concentrou a riqueza de forma permanente? (top 1% antes vs depois)
+    "crisis_wealth_concentration": """
+        SELECT Country_Code_Iso3,
+               MAX(Share_Top_1_pct) FILTER (WHERE Year = $crisis_year - 1) AS Share_Top_1_pct_Before,
+               MAX(Share_Top_1_pct) FILTER (WHERE Year = $crisis_year + $years_after) AS Share_Top_1_pct_After,
+               Share_Top_1_pct_After - Share_Top_1_pct_Before AS Share_Top_1_pct_Change
+        FROM fact_wealth_distribution
+        GROUP BY Country_Code_Iso3
+        HAVING Share_Top_1_pct_Change IS NOT NULL
+        ORDER BY Share_Top_1_pct_Change DESC
+    """,
+
+    # Nível 3: países com melhor saúde foram mais resilientes ao choque no desemprego?
+    "health_vs_unemployment_shock": """
+        SELECT m.Country_Code_Iso3,
+               MAX(m.Unemployment_Total) FILTER (WHERE m.Year = $shock_year - 1) AS Unemployment_Before,
+               MAX(m.Unemployment_Total) FILTER (WHERE m.Year BETWEEN $shock_year AND $shock_year + 1) AS Unemployment_Peak,
+               Unemployment_Peak - Unemployment_Before AS Unemployment_Shock,
+               MAX(s.Life_Expectancy) FILTER (WHERE s.Year = $shock_year - 1) AS Life_Expectancy_Before,
+               MAX(s.Child_Mortality_Rate) FILTER (WHERE s.Year = $shock_year - 1) AS Child_Mortality_Before
+        FROM Fact_Macro_Indicators m
+        JOIN Fact_Social_Barriers s ON m.Country_Code_Iso3 = s.Country_Code_Iso3 AND m.Year = s.Year
+        GROUP BY m.Country_Code_Iso3
+        HAVING Unemployment_Shock IS NOT NULL
+        ORDER BY Unemployment_Shock
+    """,
+
+    # Nível 3: que fator trava mais o crescimento salarial (iliteracia, MPI ou saúde)?
+    "wage_growth_factors": """
+        WITH per_country AS (
+            SELECT w.Country_Code_Iso3,
+                   (arg_max(w.Monthly_Employee_Earnings, w.Year) FILTER (WHERE w.Monthly_Employee_Earnings IS NOT NULL)
+                     / arg_min(w.Monthly_Employee_Earnings, w.Year) FILTER (WHERE w.Monthly_Employee_Earnings IS NOT NULL)) - 1 AS Wage_Growth,
+                   100 - AVG(s.Literacy_Rate) AS Avg_Illiteracy_Rate,
+                   AVG(s.MPI) AS Avg_MPI,
+                   AVG(s.Child_Mortality_Rate) AS Avg_Child_Mortality_Rate
+            FROM fact_wealth_distribution w
+            JOIN Fact_Social_Barriers s ON w.Country_Code_Iso3 = s.Country_Code_Iso3 AND w.Year = s.Year
+            WHERE w.Year BETWEEN $start_year AND $end_year
+            GROUP BY w.Country_Code_Iso3
+            HAVING COUNT(w.Monthly_Employee_Earnings) >= 2
+        )
+        SELECT CORR(Wage_Growth, Avg_Illiteracy_Rate) AS Pearson_Illiteracy,
+               CORR(Wage_Growth, Avg_MPI) AS Pearson_MPI,
+               CORR(Wage_Growth, Avg_Child_Mortality_Rate) AS Pearson_Child_Mortality,
+               COUNT(*) AS Countries
+        FROM per_country
+    """,
+
+    # Benchmarks: um país vs um agregado (ex.: WLD) nos indicadores sociais
+    "country_vs_benchmark": """
+        SELECT s.Year,
+               s.Internet_Access, b.Internet_Access AS Benchmark_Internet_Access,
+               s.Literacy_Rate, b.Literacy_Rate AS Benchmark_Literacy_Rate,
+               s.Life_Expectancy, b.Life_Expectancy AS Benchmark_Life_Expectancy,
+               s.Child_Mortality_Rate, b.Child_Mortality_Rate AS Benchmark_Child_Mortality_Rate
+        FROM Fact_Social_Barriers s
+        LEFT JOIN Fact_Benchmarks b ON b.Country_Code_Iso3 = $benchmark AND s.Year = b.Year
+        WHERE s.Country_Code_Iso3 = $country
+        ORDER BY s.Year
+    """
+}
+
+brics = ["BRA", "RUS", "IND", "CHN", "ZAF"]
+
+report_defaults = {
+    "gdp_growth_volatility": {"codes": brics + ["EUU", "USA"], "start_year": 2010, "end_year": 2024},
+    "gdp_per_capita_convergence": {"codes": brics + ["EUU"], "reference": "USA", "start_year": 2010, "end_year": 2024},
+    "growth_vs_gini_change": {"start_year": 2010, "end_year": 2024},
+    "unemployment_by_economic_context": {},
+    "population_trend_by_group": {"codes": brics, "start_year": 2010, "end_year": 2024},
+    "population_growth_extremes": {"start_year": 2010, "end_year": 2024, "top_n": 10},
+    "gini_hdi_by_region": {"start_year": 2010},
+    "top_1_pct_extremes": {"year": 2024, "top_n": 10},
+    "hdi_inclusion_gap": {"start_year": 2010, "end_year": 2024},
+    "literacy_vs_gini": {"start_year": 2014, "end_year": 2024},
+    "internet_vs_unemployment": {"start_year": 2010, "end_year": 2024},
+    "digital_gap_by_region": {"start_year": 2010, "end_year": 2024},
+    "female_inclusion_vs_wages": {"start_year": 2010, "end_year": 2024},
+    "female_inclusion_vs_poverty": {"start_year": 2010, "end_year": 2024},
+    "crisis_wealth_concentration": {"crisis_year": 2020, "years_after": 3},
+    "health_vs_unemployment_shock": {"shock_year": 2020},
+    "wage_growth_factors": {"start_year": 2010, "end_year": 2024},
+    "country_vs_benchmark": {"country": "PRT", "benchmark": "WLD"}
+}
+
+
+def run_report(con, name, **params):
+    """Executa uma pergunta do relatório; os parâmetros passados substituem os valores por defeito."""
+    return con.execute(report_queries[name], {**report_defaults[name], **params}).df()
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (1.3) Example
+
+# CELL ********************
+
+import time
+
+con = connect(source="snapshot")
+
+for name in report_queries:
+    start = time.perf_counter()
+    df = run_report(con, name)
+    print(f"📊 {name}: {len(df)} linhas em {(time.perf_counter() - start) * 1000:.1f} ms")
+
+run_report(con, "gdp_growth_volatility", start_year=2015)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,88 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Gold Snapshot Reader
+# Loads a snapshot written by **Gold Columnar Snapshot Export (NB)** without Spark. The cells below only need `pyarrow` (and `pandas` or `polars`), so they can be copied into a local Jupyter session after downloading `Files/Exports/Gold_Snapshots` with the OneLake file explorer.
+#
+# The `.arrow` files are memory-mapped, so loading the whole model only maps the files and does not copy the columns. Set `snapshot_root` to the local folder when running outside Fabric.
+
+# CELL ********************
+
+import json
+import os
+import time
+
+import pyarrow as pa
+
+snapshot_root = "/lakehouse/default/Files/Exports/Gold_Snapshots"
+
+
+def latest_version(root=snapshot_root):
+    with open(os.path.join(root, "LATEST")) as f:
+        return f.read().strip()
+
+
+def read_manifest(version=None, root=snapshot_root):
+    version = version or latest_version(root)
+    with open(os.path.join(root, version, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_table(name, version=None, root=snapshot_root, engine="arrow"):
+    """Lê uma tabela do snapshot por memory-map do ficheiro Arrow IPC (engine: 'arrow', 'pandas' ou 'polars')."""
+    version = version or latest_version(root)
+    source = pa.memory_map(os.path.join(root, version, f"{name}.arrow"), "r")
+    table = pa.ipc.open_file(source).read_all()
+
+    if engine == "arrow":
+        return table
+    if engine == "pandas":
+        # Colunas dicionário passam a Categorical, sem expandir as strings
+        return table.to_pandas(split_blocks=True)
+    if engine == "polars":
+        import polars as pl
+        return pl.from_arrow(table)
+    raise ValueError(f"Engine desconhecido: {engine}")
+
+
+def load_model(version=None, root=snapshot_root, engine="arrow"):
+    """Carrega todas as tabelas do snapshot num dicionário {nome: tabela}."""
+    manifest = read_manifest(version, root)
+    return {
+        name: load_table(name, manifest["version"], root, engine)
+        for name in manifest["tables"]
+    }
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+start = time.perf_counter()
+model = load_model(engine="pandas")
+elapsed = time.perf_counter() - start
+
+print(f"✅ Snapshot {latest_version()} carregado em {elapsed * 1000:.1f} ms")
+for name, df in model.items():
+    print(f"📊 {name}: {len(df)} linhas, {len(df.columns)} colunas")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,293 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "7fe29a9b-1866-4fd9-8776-20c3ac61a624",
+# META       "default_lakehouse_name": "Gold_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "7fe29a9b-1866-4fd9-8776-20c3ac61a624"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Indicator Tensor Store
+# All numeric indicators of the published Gold facts in one dense array, so local analyses do not join the facts again on `(country, year)`. Also used by **Gold Correlation Engine (NB)** through `%run`.
+#
+# A store version is written to `Files/Exports/Indicator_Tensor/<version>/`:
+# - **`values.npy`:** `float32` array `[country × year × indicator]`, `NaN` where there is no value;
+# - **`valid.npy`:** validity bitmask, the same shape packed 8 indicators per byte (`np.packbits` on the last axis), so the missing cells can be found without reading `values.npy`;
+# - **`index.json`:** the ISO3 codes, years and indicator names of each axis (the year axis has every year from the first to the last, so neighbouring indices are consecutive years for lags and growth rates; a repeated `(country, year)` in a fact stops the build), the source table of each indicator and the regions of each country from `Dim_Geography` (`region_name`, `sub-region_name`, `intermediate_region_name`).
+#
+# `LATEST` at the root points to the most recent version. The cells in section (2) only need `numpy` and can be copied into a local Jupyter session: `open_store` memory-maps the arrays (nothing is read until a cell is used) and `IndicatorTensor` gives O(1) cell access and slices by region, year range and indicator.
+
+# CELL ********************
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+tensor_root = "/lakehouse/default/Files/Exports/Indicator_Tensor"
+
+# Factos Gold publicados (tabela -> colunas a ignorar além das chaves)
+tensor_sources = {
+    "gold_lakehouse.dbo.Fact_Social_Barriers": [],
+    "gold_lakehouse.dbo.Fact_Macro_Indicators": [],
+    "gold_lakehouse.dbo.fact_wealth_distribution": ["ID"]
+}
+non_indicator_columns = {"country_code_iso3", "year", "source_mask", "imputed_mask", "load_id"}
+region_columns = ["region_name", "sub-region_name", "intermediate_region_name"]
+
+
+def load_fact_frames(sources=tensor_sources):
+    """Colunas numéricas de cada facto (com Country_Code_Iso3 e Year) em pandas, via Arrow."""
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    frames = []
+    for table, skip in sources.items():
+        df = spark.read.table(table)
+        numeric = [
+            f.name for f in df.schema.fields
+            if f.dataType.typeName() in ("double", "float", "integer", "long", "decimal")
+            and f.name.lower() not in non_indicator_columns and f.name not in skip
+        ]
+        key = [c for c in df.columns if c.lower() == "country_code_iso3"][0]
+        frame = df.select(
+            df[key].alias("Country_Code_Iso3"),
+            df["Year"].cast("int").alias("Year"),
+            *[df[c].cast("double").alias(c) for c in numeric]
+        ).toPandas()
+        frame.attrs["source"] = table
+        frames.append(frame)
+    return frames
+
+
+def build_indicator_tensor(frames):
+    """Tensor denso float32 [país × ano × indicador] (NaN sem valor) e os índices de cada eixo.
+
+    O eixo dos anos é contínuo (min..max, anos sem dados ficam a NaN), por isso índices vizinhos são anos seguidos.
+    """
+    for f in frames:
+        duplicated = f.duplicated(["Country_Code_Iso3", "Year"], keep=False)
+        if duplicated.any():
+            keys = f.loc[duplicated, ["Country_Code_Iso3", "Year"]].drop_duplicates().head(5).to_records(index=False).tolist()
+            columns = [c for c in f.columns if c not in ("Country_Code_Iso3", "Year")]
+            raise ValueError(f"Chaves (país, ano) repetidas ({', '.join(columns)}): {keys}")
+
+    countries = np.unique(np.concatenate([f["Country_Code_Iso3"].to_numpy(dtype=str) for f in frames]))
+    all_years = np.concatenate([f["Year"].to_numpy() for f in frames]).astype(np.int64)
+    years = np.arange(all_years.min(), all_years.max() + 1)
+    indicators = [c for f in frames for c in f.columns if c not in ("Country_Code_Iso3", "Year")]
+
+    tensor = np.full((len(countries), len(years), len(indicators)), np.nan, dtype=np.float32)
+    k = 0
+    for f in frames:
+        ci = np.searchsorted(countries, f["Country_Code_Iso3"].to_numpy(dtype=str))
+        yi = np.searchsorted(years, f["Year"].to_numpy())
+        cols = [c for c in f.columns if c not in ("Country_Code_Iso3", "Year")]
+        tensor[ci, yi, k:k + len(cols)] = f[cols].to_numpy(dtype=np.float32)
+        k += len(cols)
+    return tensor, countries, years, indicators
+
+
+def load_regions(countries, table="gold_lakehouse.dbo.Dim_Geography"):
+    """{nome da região: [ISO3]} para os três níveis de região do Dim_Geography."""
+    geo = spark.read.table(table).select("Country_Code_Iso3", *[f"`{c}`" for c in region_columns]).toPandas()
+    geo = geo[geo["Country_Code_Iso3"].isin(set(countries))]
+    regions = {}
+    for column in region_columns:
+        for name, group in geo.groupby(column):
+            if name:
+                regions.setdefault(name, set()).update(group["Country_Code_Iso3"])
+    return {name: sorted(codes) for name, codes in sorted(regions.items())}
+
+
+def write_store(tensor, countries, years, indicators, sources=None, regions=None, root=tensor_root):
+    """Grava uma versão do store (values.npy, valid.npy, index.json) e atualiza LATEST."""
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(root, version)
+    os.makedirs(path, exist_ok=True)
+
+    np.save(os.path.join(path, "values.npy"), tensor.astype(np.float32, copy=False))
+    np.save(os.path.join(path, "valid.npy"), np.packbits(np.isfinite(tensor), axis=-1))
+
+    with open(os.path.join(path, "index.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "shape": list(tensor.shape),
+            "countries": [str(c) for c in countries],
+            "years": [int(y) for y in years],
+            "indicators": list(indicators),
+            "sources": sources or {},
+            "regions": regions or {}
+        }, f, indent=2)
+
+    with open(os.path.join(root, "LATEST"), "w") as f:
+        f.write(version)
+    return version
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # (2) Query API
+
+# CELL ********************
+
+import json
+import os
+
+import numpy as np
+
+
+class IndicatorTensor:
+    """Store denso [país × ano × indicador] com índices por ISO3, ano e nome do indicador."""
+
+    def __init__(self, values, valid, countries, years, indicators, regions=None, sources=None):
+        self.values = values
+        self.valid_bits = valid
+        self.countries = list(countries)
+        self.years = [int(y) for y in years]
+        self.indicators = list(indicators)
+        self.regions = regions or {}
+        self.sources = sources or {}
+        self.country_index = {c: i for i, c in enumerate(self.countries)}
+        self.year_index = {y: i for i, y in enumerate(self.years)}
+        self.indicator_index = {name: i for i, name in enumerate(self.indicators)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def valid(self):
+        """Máscara booleana completa (desempacotada do bitmask)."""
+        return np.unpackbits(self.valid_bits, axis=-1, count=len(self.indicators)).astype(bool)
+
+    def is_valid(self, country, year, indicator):
+        k = self.indicator_index[indicator]
+        byte = self.valid_bits[self.country_index[country], self.year_index[year], k // 8]
+        return bool((byte >> (7 - k % 8)) & 1)
+
+    def cell(self, country, year, indicator):
+        """Valor de uma célula (None sem valor), por acesso direto aos índices."""
+        if not self.is_valid(country, year, indicator):
+            return None
+        return float(self.values[self.country_index[country], self.year_index[year], self.indicator_index[indicator]])
+
+    def series(self, country, indicator):
+        """(anos, valores) de um indicador num país."""
+        return np.array(self.years), np.asarray(self.values[self.country_index[country], :, self.indicator_index[indicator]])
+
+    def select(self, countries=None, region=None, years=None, indicators=None):
+        """Fatia do tensor. countries: lista ISO3; region: nome do Dim_Geography; years: (início, fim) inclusivo;
+        indicators: lista de nomes. Devolve um novo IndicatorTensor com os eixos filtrados."""
+        codes = self.countries if countries is None else list(countries)
+        if region is not None:
+            if region not in self.regions:
+                raise KeyError(f"Região desconhecida: {region}")
+            members = set(self.regions[region])
+            codes = [c for c in codes if c in members]
+        ci = np.array([self.country_index[c] for c in codes], dtype=np.intp)
+
+        start, end = years if years is not None else (self.years[0], self.years[-1])
+        yi = np.array([i for y, i in self.year_index.items() if start <= y <= end], dtype=np.intp)
+
+        names = self.indicators if indicators is None else list(indicators)
+        ki = np.array([self.indicator_index[n] for n in names], dtype=np.intp)
+
+        values = np.asarray(self.values)[np.ix_(ci, yi, ki)]
+        return IndicatorTensor(
+            values,
+            np.packbits(np.isfinite(values), axis=-1),
+            [self.countries[i] for i in ci],
+            [self.years[i] for i in yi],
+            names,
+            {r: [c for c in m if c in set(codes)] for r, m in self.regions.items()},
+            {n: self.sources.get(n) for n in names}
+        )
+
+    def to_frame(self):
+        """Formato longo (Country_Code_Iso3, Year, indicadores) em pandas, só com as linhas com algum valor."""
+        import pandas as pd
+        c, y = np.meshgrid(np.arange(len(self.countries)), np.arange(len(self.years)), indexing="ij")
+        frame = pd.DataFrame(np.asarray(self.values).reshape(-1, len(self.indicators)), columns=self.indicators)
+        frame.insert(0, "Year", np.array(self.years)[y.ravel()])
+        frame.insert(0, "Country_Code_Iso3", np.array(self.countries)[c.ravel()])
+        return frame.dropna(how="all", subset=self.indicators).reset_index(drop=True)
+
+
+def open_store(version=None, root="/lakehouse/default/Files/Exports/Indicator_Tensor"):
+    """Abre uma versão do store com os arrays em memory-map (por defeito a indicada em LATEST)."""
+    if version is None:
+        with open(os.path.join(root, "LATEST")) as f:
+            version = f.read().strip()
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "index.json")) as f:
+        index = json.load(f)
+    return IndicatorTensor(
+        np.load(os.path.join(path, "values.npy"), mmap_mode="r"),
+        np.load(os.path.join(path, "valid.npy"), mmap_mode="r"),
+        index["countries"], index["years"], index["indicators"],
+        index["regions"], index["sources"]
+    )
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # (3) Build
+# Set `build_store = True` to write a new version from the published Gold tables. Notebooks that only `%run` this one to reuse the functions keep it `False`.
+
+# PARAMETERS CELL ********************
+
+build_store = False
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+if build_store:
+    frames = load_fact_frames()
+    tensor, countries, years, indicators = build_indicator_tensor(frames)
+    sources = {c: f.attrs["source"] for f in frames for c in f.columns if c not in ("Country_Code_Iso3", "Year")}
+    version = write_store(tensor, countries, years, indicators, sources, load_regions(countries))
+
+    store = open_store(version)
+    print(f"✅ Store {version}: {store.shape} ({tensor.nbytes / 1024:.0f} KB), {np.isfinite(tensor).mean():.0%} preenchido")
+    print(f"📊 PRT 2020 Gini: {store.cell('PRT', 2020, 'Gini_Index')}")
+    europe = store.select(region="Europe", years=(2015, 2020), indicators=["GDP_per_Capita", "Internet_Access"])
+    print(f"📊 Europa 2015-2020: {europe.shape}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,235 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Row Lineage for the Gold Facts
+# Shared functions used through `%run` by **World Bank Data Transformation Bronze to Silver (NB)** and **Gold Cleaning Tables**. Every Gold fact gets three extra columns:
+# - **Source_Mask** (int): one bit per source that filled at least one value of the row (see `source_bits`). For example, a `Fact_Benchmarks` row with `Source_Mask = 37` (1 + 4 + 32) has social indicators from `Social_Barriers`, macro values from `Fact_Macro_Indicators` and an unemployment rate from `unemployment_rate`.
+# - **Imputed_Mask** (int): one bit per column whose value was forward-filled from an earlier year in Silver (see `imputed_bits`). `Imputed_Mask & 1 <> 0` means the `Literacy_Rate` of the row is not a reported value.
+# - **Load_Id** (long): the Gold run that wrote the row, a key into `gold_lakehouse.lineage.load_runs` (start time, notebook, status and the Delta versions of the Silver/Bronze inputs).
+#
+# The bit meanings are also written to `gold_lakehouse.lineage.source_bits`, so the masks can be filtered and decoded in the SQL endpoint without this notebook:
+#
+# `SELECT * FROM dbo.Fact_Benchmarks WHERE Source_Mask & 32 <> 0 AND Imputed_Mask & 1 = 0`
+
+# CELL ********************
+
+import json
+import threading
+from datetime import datetime, timezone
+from functools import reduce
+
+from pyspark.sql import functions as F
+
+lineage_schema = "gold_lakehouse.lineage"
+load_runs_table = f"{lineage_schema}.load_runs"
+source_bits_table = f"{lineage_schema}.source_bits"
+
+# Bit de cada fonte no Source_Mask: nome -> (bit, tabela de origem)
+source_bits = {
+    "Social_Barriers": (1, "silver_lakehouse.dbo.Social_Barriers"),
+    "MPI": (2, "silver_lakehouse.dbo.MPI"),
+    "Fact_Macro_Indicators": (4, "silver_lakehouse.dbo.economic_indicators"),
+    "Gini_Index": (8, "silver_lakehouse.dbo.un_gini_index"),
+    "HDI": (16, "silver_lakehouse.dbo.hdi"),
+    "Unemployment_Rate": (32, "silver_lakehouse.dbo.unemployment_rate"),
+    "Population": (64, "bronze_lakehouse.world_bank.population_migration"),
+    "Income_Share": (128, "silver_lakehouse.dbo.income_share"),
+    "Monthly_Employee_Earnings": (256, "silver_lakehouse.dbo.un_monthly_employee_earnings")
+}
+
+# Bit de cada coluna no Imputed_Mask (colunas preenchidas com o valor do ano anterior na Silver)
+imputed_bits = {
+    "Literacy_Rate": 1,
+    "School_Attendance": 2,
+    "Female_Account_Ownership": 4
+}
+
+social_columns = [
+    "School_Attendance", "Literacy_Rate", "Internet_Access",
+    "Female_Account_Ownership", "Child_Mortality_Rate", "Life_Expectancy"
+]
+macro_columns = ["GDP_per_Capita", "GDP_Annual_Growth_Pct", "Inflation_CPI_Pct"]
+
+# Colunas de cada facto Gold por fonte (uma fonte conta se pelo menos uma das colunas não for nula)
+fact_column_sources = {
+    "fact_social_barriers": {
+        "Social_Barriers": social_columns,
+        "MPI": ["MPI"]
+    },
+    "fact_benchmarks": {
+        "Social_Barriers": social_columns,
+        "Fact_Macro_Indicators": macro_columns,
+        "Unemployment_Rate": ["Unemployment_Rate"],
+        "Population": ["Pop_Total_Count"]
+    },
+    "fact_macro_indicators": {
+        "Fact_Macro_Indicators": macro_columns,
+        "Gini_Index": ["Gini_Index"],
+        "HDI": ["HDI"],
+        "Unemployment_Rate": ["Unemployment_Total"],
+        "Population": ["Pop_Total_Count"]
+    },
+    "fact_wealth_distribution": {
+        "Income_Share": ["Share_Top_10_pct", "Share_Top_1_pct", "Share_Middle_40_pct", "Share_Bottom_50_pct"],
+        "Monthly_Employee_Earnings": ["Monthly_Employee_Earnings", "Monthly_Earnings_PPP"]
+    }
+}
+
+lineage_columns = ["Source_Mask", "Imputed_Mask", "Load_Id"]
+
+
+def bit_or(exprs):
+    """OR bit a bit de uma lista de expressões inteiras."""
+    return reduce(lambda a, b: a.bitwiseOR(b), exprs, F.lit(0))
+
+
+def forward_fill_with_mask(df, columns, window_spec):
+    """Forward fill das colunas na janela, marcando no Imputed_Mask as que foram preenchidas.
+
+    O passo da Silver reescreve a própria tabela, por isso os bits já gravados numa execução anterior são mantidos.
+    """
+    previous = F.coalesce(F.col("Imputed_Mask"), F.lit(0)) if "Imputed_Mask" in df.columns else F.lit(0)
+
+    filled = df
+    for c in columns:
+        filled = filled.withColumn(f"_{c}_filled", F.last(c, ignorenulls=True).over(window_spec))
+
+    flags = [
+        F.when(F.col(c).isNull() & F.col(f"_{c}_filled").isNotNull(), F.lit(imputed_bits[c])).otherwise(F.lit(0))
+        for c in columns
+    ]
+    filled = filled.withColumn("Imputed_Mask", bit_or([previous] + flags).cast("int"))
+
+    for c in columns:
+        filled = filled.withColumn(c, F.col(f"_{c}_filled")).drop(f"_{c}_filled")
+    return filled
+
+
+def source_mask_expr(fact_name, columns):
+    """Source_Mask de um facto a partir das colunas não nulas de cada fonte."""
+    present = {c.lower(): c for c in columns}
+    flags = []
+    for source, source_cols in fact_column_sources[fact_name.lower()].items():
+        cols = [present[c.lower()] for c in source_cols if c.lower() in present]
+        if cols:
+            has_value = reduce(lambda a, b: a | b, [F.col(c).isNotNull() for c in cols])
+            flags.append(F.when(has_value, F.lit(source_bits[source][0])).otherwise(F.lit(0)))
+    return bit_or(flags).cast("int")
+
+
+def with_lineage(df, fact_name, load_id):
+    """Acrescenta Source_Mask, Imputed_Mask e Load_Id a um facto Gold (substitui os valores anteriores)."""
+    imputed = F.coalesce(F.col("Imputed_Mask"), F.lit(0)) if "Imputed_Mask" in df.columns else F.lit(0)
+
+    return df.withColumn("Source_Mask", source_mask_expr(fact_name, df.columns)) \
+        .withColumn("Imputed_Mask", imputed.cast("int")) \
+        .withColumn("Load_Id", F.lit(load_id).cast("long"))
+
+
+def from_source(df, source):
+    """Filtra as linhas com pelo menos um valor vindo da fonte."""
+    return df.filter(F.col("Source_Mask").bitwiseAND(source_bits[source][0]) != 0)
+
+
+def imputed(df, column):
+    """Filtra as linhas em que a coluna foi preenchida com o valor de um ano anterior."""
+    return df.filter(F.col("Imputed_Mask").bitwiseAND(imputed_bits[column]) != 0)
+
+
+def decode_mask(mask, bits=None):
+    """Nomes das fontes (ou colunas, com bits=imputed_bits) presentes numa máscara."""
+    bits = bits or {name: bit for name, (bit, _) in source_bits.items()}
+    return [name for name, bit in bits.items() if mask & bit]
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# # (2) Load Runs
+# `start_load` creates the `Load_Id` of a run (UTC start time as `yyMMddHHmmss` followed by the microseconds, 18 digits so it still fits a `long`) and records the Delta version of every input table; `finish_load` sets the final status. Loads started by parallel steps in the same second get different ids, and inside one session the ids are also strictly increasing (`load_id_lock`), so two loads never share lineage rows. The same call also refreshes `source_bits`.
+
+# CELL ********************
+
+# Último Load_Id criado nesta sessão (passos em paralelo chamam start_load em threads)
+load_id_lock = threading.Lock()
+last_load_id = 0
+
+
+def write_source_bits():
+    rows = [
+        (bit, name, table, "Source_Mask") for name, (bit, table) in source_bits.items()
+    ] + [
+        (bit, name, None, "Imputed_Mask") for name, bit in imputed_bits.items()
+    ]
+
+    spark.createDataFrame(rows, "Bit int, Name string, Source_Table string, Mask_Column string") \
+        .write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(source_bits_table)
+
+
+def input_versions(tables):
+    versions = {}
+    for table_name in sorted(set(t.lower() for t in tables)):
+        try:
+            versions[table_name] = spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1").collect()[0]["version"]
+        except Exception:
+            versions[table_name] = None
+    return versions
+
+
+def start_load(notebook_name, target_schema, inputs=()):
+    """Regista o início de uma execução Gold e devolve o Load_Id."""
+    spark.sql(f"CREATE SCHEMA IF NOT EXISTS {lineage_schema}")
+    write_source_bits()
+
+    global last_load_id
+    with load_id_lock:
+        started_at = datetime.now(timezone.utc)
+        load_id = max(int(started_at.strftime("%y%m%d%H%M%S%f")), last_load_id + 1)
+        last_load_id = load_id
+
+    spark.createDataFrame(
+        [(load_id, notebook_name, target_schema, "running", json.dumps(input_versions(inputs)))],
+        "Load_Id long, Notebook string, Target_Schema string, Status string, Input_Versions string"
+    ).withColumn("Started_At", F.current_timestamp()) \
+        .withColumn("Finished_At", F.lit(None).cast("timestamp")) \
+        .write.format("delta") \
+        .mode("append") \
+        .option("mergeSchema", "true") \
+        .saveAsTable(load_runs_table)
+
+    print(f"🚀 Load {load_id} iniciado ({notebook_name} -> {target_schema})")
+    return load_id
+
+
+def finish_load(load_id, status="succeeded"):
+    spark.sql(f"""
+        UPDATE {load_runs_table}
+        SET Status = '{status}', Finished_At = current_timestamp()
+        WHERE Load_Id = {int(load_id)}
+    """)
+    print(f"✅ Load {load_id}: {status}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
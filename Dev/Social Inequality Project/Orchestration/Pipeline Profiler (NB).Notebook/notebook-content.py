@@ -0,0 +1,213 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Table I/O Profiler
+# Shared functions used by **Pipeline Scheduler (NB)** through `%run`, so every notebook that runs steps is profiled with no change to its cells. `install_profiler` wraps `DataFrameReader.table` (`spark.read.table`) and `DataFrameWriter.saveAsTable` once per session and records one row per call:
+# - **Step_Name:** the pipeline step that made the call (the Spark job group set by `run_step`), or null outside a step;
+# - **Operation / Table_Name / Delta_Version:** `read` or `write`, the table and the Delta version read or created (for a read, the version reported by `DESCRIBE DETAIL`, null on runtimes whose `DESCRIBE DETAIL` has no `version` column);
+# - **Bytes / Files / Rows:** for a write, `numOutputBytes`, `numFiles` and `numOutputRows` of the Delta commit. For a read they are the **snapshot size**: total size and number of files of the table from one `DESCRIBE DETAIL` call, not what the read scans after partition pruning and data skipping. Reads are lazy, so the rows actually read are not known when `read.table` returns and `Rows` stays null;
+# - **Wall_Time_S:** time spent inside the call (for a read, only the analysis, the scan itself runs in the write that uses it);
+# - **Plan_Hash:** SHA-256 of the optimized plan of the DataFrame, with the expression ids (`#123`) removed, so the same transformation gets the same hash in every run and a plan change shows up as a new hash.
+#
+# Other checks can run on the DataFrame of every write through `write_hooks` (see **Plan Linter (NB)**). The rows are kept in memory and `run_steps` appends them to `bronze_lakehouse.pipeline.pipeline_metrics` at the end of the run (`save_pipeline_metrics`). `slow_steps` compares the last run of every step with its history.
+
+# CELL ********************
+
+import functools
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from pyspark.sql import DataFrameReader, DataFrameWriter
+from pyspark.sql import functions as F
+
+pipeline_metrics_table = "bronze_lakehouse.pipeline.pipeline_metrics"
+pipeline_metrics_schema = (
+    "Run_Id string, Run_Name string, Step_Name string, Operation string, Table_Name string, Delta_Version long, "
+    "Bytes long, Files long, Rows long, Wall_Time_S double, Plan_Hash string, Recorded_At double"
+)
+
+# Funções chamadas com (df, tabela) antes de cada saveAsTable (ex.: o linter de Plan Linter (NB))
+write_hooks = []
+
+# Linhas ainda não gravadas (os passos correm em threads, por isso com lock)
+profiler_records = []
+profiler_lock = threading.Lock()
+profiler_run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def plan_hash(df):
+    """Hash do plano otimizado sem os ids das expressões (estável entre execuções)."""
+    try:
+        plan = df._jdf.queryExecution().optimizedPlan().toString()
+    except Exception:
+        return None
+    return hashlib.sha256(re.sub(r"#\d+L?", "", plan).encode()).hexdigest()[:16]
+
+
+def current_step():
+    return spark.sparkContext.getLocalProperty("spark.jobGroup.id")
+
+
+def last_commit(table_name):
+    """(versão, métricas da operação) do último commit Delta da tabela."""
+    row = spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1").collect()[0]
+    return row["version"], row["operationMetrics"] or {}
+
+
+def record_call(operation, table_name, version, size, files, rows, elapsed, df_plan):
+    with profiler_lock:
+        profiler_records.append((
+            profiler_run_id, None, current_step(), operation, table_name.lower(),
+            version, size, files, rows, round(elapsed, 3), df_plan, time.time()
+        ))
+
+
+def profiled_read_table(original):
+    @functools.wraps(original)
+    def table(self, tableName):
+        start = time.perf_counter()
+        df = original(self, tableName)
+        elapsed = time.perf_counter() - start
+        try:
+            # Uma única consulta de metadados por leitura: tamanho e ficheiros do snapshot (não o que a leitura varre)
+            detail = spark.sql(f"DESCRIBE DETAIL {tableName}").collect()[0].asDict()
+            record_call(
+                "read", tableName, detail.get("version"), detail["sizeInBytes"], detail["numFiles"], None,
+                elapsed, plan_hash(df)
+            )
+        except Exception:
+            # Tabelas que não são Delta (ou vistas): fica só o tempo
+            record_call("read", tableName, None, None, None, None, elapsed, plan_hash(df))
+        return df
+    return table
+
+
+def profiled_save_as_table(original):
+    @functools.wraps(original)
+    def saveAsTable(self, name, *args, **kwargs):
+        df_plan = plan_hash(self._df) if hasattr(self, "_df") else None
+        if hasattr(self, "_df") and name.lower() != pipeline_metrics_table:
+            for hook in write_hooks:
+                hook(self._df, name)
+        start = time.perf_counter()
+        result = original(self, name, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if name.lower() != pipeline_metrics_table:
+            try:
+                version, metrics = last_commit(name)
+                record_call(
+                    "write", name, version,
+                    int(metrics.get("numOutputBytes", 0)) or None,
+                    int(metrics.get("numFiles", metrics.get("numAddedFiles", 0))) or None,
+                    int(metrics["numOutputRows"]) if "numOutputRows" in metrics else None,
+                    elapsed, df_plan
+                )
+            except Exception:
+                record_call("write", name, None, None, None, None, elapsed, df_plan)
+        return result
+    return saveAsTable
+
+
+def install_profiler():
+    """Liga o profiler (uma vez por sessão: voltar a correr a célula não volta a envolver os métodos)."""
+    if not hasattr(DataFrameReader.table, "__wrapped__"):
+        DataFrameReader.table = profiled_read_table(DataFrameReader.table)
+    if not hasattr(DataFrameWriter.saveAsTable, "__wrapped__"):
+        DataFrameWriter.saveAsTable = profiled_save_as_table(DataFrameWriter.saveAsTable)
+    print(f"⏱️ Profiler ativo (run {profiler_run_id})")
+
+
+def uninstall_profiler():
+    for cls, method in ((DataFrameReader, "table"), (DataFrameWriter, "saveAsTable")):
+        wrapped = getattr(cls, method)
+        if hasattr(wrapped, "__wrapped__"):
+            setattr(cls, method, wrapped.__wrapped__)
+
+
+def save_pipeline_metrics(run_name):
+    """Acrescenta as chamadas registadas à tabela pipeline_metrics e limpa o buffer."""
+    with profiler_lock:
+        rows, profiler_records[:] = list(profiler_records), []
+    if not rows:
+        return 0
+    spark.sql("CREATE SCHEMA IF NOT EXISTS bronze_lakehouse.pipeline")
+    spark.createDataFrame([(r[0], run_name) + r[2:] for r in rows], pipeline_metrics_schema) \
+        .withColumn("Recorded_At", F.col("Recorded_At").cast("timestamp")) \
+        .write.format("delta").mode("append").saveAsTable(pipeline_metrics_table)
+    print(f"⏱️ {len(rows)} chamadas gravadas em {pipeline_metrics_table}")
+    return len(rows)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (2) Reports
+# - `top_calls`: the slowest calls of a run (by default the current one).
+# - `slow_steps`: wall time of every step in the last run of a `Run_Name` (the sum of its read and write calls) against the median of its previous runs, with the bytes its writes produced (`Bytes_Written`; read sizes are snapshot sizes and are left out). Steps above `factor` × median are flagged, and a changed `Plan_Hash` in the same step usually explains why.
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+
+def top_calls(run_id=None, limit=20):
+    metrics = spark.read.table(pipeline_metrics_table)
+    return metrics.filter(F.col("Run_Id") == (run_id or profiler_run_id)) \
+        .orderBy(F.col("Wall_Time_S").desc()) \
+        .limit(limit)
+
+
+def slow_steps(run_name, factor=2.0, history_runs=10):
+    """Passos da última execução mais lentos do que factor × a mediana das execuções anteriores."""
+    per_step = spark.read.table(pipeline_metrics_table) \
+        .filter((F.col("Run_Name") == run_name) & F.col("Step_Name").isNotNull()) \
+        .groupBy("Run_Id", "Step_Name") \
+        .agg(
+            F.sum("Wall_Time_S").alias("Wall_Time_S"),
+            F.sum(F.when(F.col("Operation") == "write", F.col("Bytes"))).alias("Bytes_Written"),
+            F.sort_array(F.collect_set("Plan_Hash")).alias("Plan_Hashes")
+        )
+
+    by_step = Window.partitionBy("Step_Name").orderBy(F.col("Run_Id").desc())
+    ranked = per_step.withColumn("Run_Rank", F.row_number().over(by_step))
+
+    history = ranked.filter((F.col("Run_Rank") > 1) & (F.col("Run_Rank") <= history_runs + 1)) \
+        .groupBy("Step_Name") \
+        .agg(
+            F.percentile_approx("Wall_Time_S", 0.5).alias("Median_Wall_Time_S"),
+            F.collect_set("Plan_Hashes").alias("Previous_Plans")
+        )
+
+    return ranked.filter(F.col("Run_Rank") == 1) \
+        .join(history, "Step_Name", "left") \
+        .select(
+            "Step_Name", "Run_Id", "Wall_Time_S", "Median_Wall_Time_S", "Bytes_Written",
+            (F.col("Wall_Time_S") > F.col("Median_Wall_Time_S") * factor).alias("Is_Slow"),
+            (~F.array_contains(F.col("Previous_Plans"), F.col("Plan_Hashes"))).alias("Plan_Changed")
+        ).orderBy(F.col("Wall_Time_S").desc())
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
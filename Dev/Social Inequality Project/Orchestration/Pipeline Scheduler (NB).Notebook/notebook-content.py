@@ -0,0 +1,437 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Dependency-Aware Step Scheduler
+# Shared functions used through `%run` by the transformation notebooks. Instead of running cells top to bottom, a notebook declares each transformation as a **step** with the tables it reads and writes:
+#
+# ```python
+# @step(inputs=["bronze_lakehouse.world_bank.economic_indicators"], outputs=["silver_lakehouse.dbo.economic_indicators"])
+# def economic_indicators_silver():
+#     ...
+#
+# run_steps(pipeline_steps)
+# ```
+#
+# - **Dependencies are inferred** from the declared tables. A step waits for an earlier step when it reads a table that step writes, writes a table that step reads, or writes the same table. Steps that share no tables have no edge between them.
+# - **Independent steps run at the same time.** Each step runs in its own thread, and its Spark jobs are submitted to its own FAIR scheduler pool (`spark.scheduler.pool`), so a long step does not hold back a short one.
+# - **Critical path:** after the run, the longest chain of dependent steps (by measured duration) is printed next to the wall time. With enough executors the wall time is close to the critical path.
+# - If a step fails, the steps that depend on it are skipped, the independent ones still finish, and `run_steps` raises at the end so the pipeline activity fails.
+
+# CELL ********************
+
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+pipeline_steps = []
+
+
+class Step:
+    def __init__(self, name, func, inputs=(), outputs=(), pool=None, files=(), extra=None):
+        self.name = name
+        self.func = func
+        self.inputs = {t.lower() for t in inputs}
+        self.outputs = {t.lower() for t in outputs}
+        self.pool = pool or name
+        self.files = list(files)
+        self.extra = extra
+
+    def __repr__(self):
+        return f"Step({self.name})"
+
+
+def step(inputs=(), outputs=(), pool=None, registry=None, files=(), extra=None, name=None):
+    """Regista a função como um passo do pipeline com as tabelas (e ficheiros) que lê e as tabelas que escreve."""
+    def decorator(func):
+        steps = pipeline_steps if registry is None else registry
+        step_name = name or func.__name__
+        # Voltar a correr a célula substitui o passo em vez de o duplicar
+        steps[:] = [s for s in steps if s.name != step_name]
+        steps.append(Step(step_name, func, inputs, outputs, pool, files, extra))
+        return func
+    return decorator
+
+
+def build_dag(steps):
+    """Dependências inferidas pela ordem de registo e pelas tabelas lidas/escritas: {passo: {passos anteriores}}."""
+    deps = {s.name: set() for s in steps}
+    for j, later in enumerate(steps):
+        for earlier in steps[:j]:
+            if (earlier.outputs & later.inputs) or (earlier.outputs & later.outputs) or (earlier.inputs & later.outputs):
+                deps[later.name].add(earlier.name)
+    return deps
+
+
+def critical_path(deps, durations):
+    """Cadeia de dependências mais longa (em segundos) e o seu comprimento."""
+    finish, previous = {}, {}
+    for name in deps:  # a ordem de registo já é uma ordem topológica
+        before = max(deps[name], key=lambda d: finish[d], default=None)
+        finish[name] = durations.get(name, 0.0) + (finish[before] if before else 0.0)
+        previous[name] = before
+
+    if not finish:
+        return [], 0.0
+
+    node = max(finish, key=finish.get)
+    length = finish[node]
+    path = []
+    while node:
+        path.append(node)
+        node = previous[node]
+    return path[::-1], length
+
+
+def describe_dag(steps):
+    """Mostra os passos por nível: os passos do mesmo nível podem correr em paralelo."""
+    deps = build_dag(steps)
+    level = {}
+    for s in steps:
+        level[s.name] = 1 + max((level[d] for d in deps[s.name]), default=-1)
+
+    for lvl in range(max(level.values(), default=-1) + 1):
+        names = [n for n in level if level[n] == lvl]
+        print(f"Nível {lvl}: {', '.join(names)}")
+        for n in names:
+            if deps[n]:
+                print(f"    {n} <- {', '.join(sorted(deps[n]))}")
+    return deps
+
+
+def run_step(s):
+    # Cada thread usa o seu pool FAIR (a propriedade local é por thread)
+    spark.sparkContext.setLocalProperty("spark.scheduler.pool", s.pool)
+    spark.sparkContext.setJobGroup(s.name, f"Pipeline step {s.name}")
+    start = time.perf_counter()
+    try:
+        s.func()
+        return time.perf_counter() - start, None
+    except Exception:
+        return time.perf_counter() - start, traceback.format_exc()
+    finally:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+
+
+def run_steps(steps, max_workers=4, cache=False, scope="default"):
+    """Executa os passos respeitando as dependências; os passos independentes correm em paralelo.
+
+    Com cache=True, os passos cuja impressão digital não mudou são ignorados (ver secção (2))."""
+    deps = build_dag(steps)
+    plan = plan_build(steps, scope) if cache else {}
+    by_name = {s.name: s for s in steps}
+    results = {}
+    # Impressão digital gravada por cada passo que correu (depois de reescrever as suas tabelas)
+    built = {}
+    pending = dict(deps)
+    running = {}
+    run_start = time.perf_counter()
+
+    if spark.sparkContext.getConf().get("spark.scheduler.mode", "FIFO") != "FAIR":
+        print("⚠️ spark.scheduler.mode não é FAIR: os passos correm em paralelo mas os jobs são servidos por ordem de chegada")
+    print(f"🚀 {len(steps)} passos, até {max_workers} em paralelo")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Passos cujas dependências falharam ou foram ignoradas também são ignorados
+            for name in [n for n, d in pending.items() if any(results.get(x, {}).get("status") in ("failed", "skipped") for x in d)]:
+                results[name] = {"status": "skipped", "start": None, "duration": 0.0}
+                del pending[name]
+                print(f"⏭️ {name} ignorado (dependência falhou)")
+
+            for name in [n for n, d in pending.items() if all(results.get(x, {}).get("status") in ("ok", "cached") for x in d)]:
+                del pending[name]
+                if name in plan and not plan[name]["run"]:
+                    results[name] = {"status": "cached", "start": None, "duration": 0.0}
+                    print(f"💾 {name} sem alterações, mantém a saída anterior")
+                    continue
+                running[executor.submit(run_step, by_name[name])] = (name, time.perf_counter() - run_start)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                duration, error = future.result()
+                results[name] = {"status": "failed" if error else "ok", "start": started, "duration": duration}
+                if error:
+                    print(f"❌ {name} falhou após {duration:.1f}s\n{error}")
+                else:
+                    print(f"✅ {name} ({duration:.1f}s)")
+                    if cache:
+                        # Os consumidores guardam a impressão digital pós-execução dos produtores, a mesma que
+                        # plan_build calcula na próxima execução (um produtor pode reler e reescrever a sua tabela)
+                        upstream = {t: built.get(p, plan[p]["fingerprint"]) for t, p in plan[name]["producers"].items()}
+                        built[name] = record_build(scope, by_name[name], upstream)
+
+    wall_time = time.perf_counter() - run_start
+    path, path_length = critical_path(deps, {n: r["duration"] for n, r in results.items()})
+
+    print(f"\n📊 Tempo total: {wall_time:.1f}s | soma dos passos: {sum(r['duration'] for r in results.values()):.1f}s | caminho crítico: {path_length:.1f}s")
+    print(f"⭐ Caminho crítico: {' -> '.join(path)}")
+    for name, r in sorted(results.items(), key=lambda kv: (kv[1]["start"] is None, kv[1]["start"] or 0)):
+        marker = "⭐" if name in path else "  "
+        start = f"{r['start']:6.1f}s" if r["start"] is not None else "     -"
+        print(f"{marker} {name:<40} início {start}  duração {r['duration']:6.1f}s  {r['status']}")
+
+    # Chamadas de read.table/saveAsTable registadas pelo profiler e avisos do linter (secção (4))
+    save_pipeline_metrics(scope)
+    report_plan_lint(scope)
+
+    failed = [n for n, r in results.items() if r["status"] not in ("ok", "cached")]
+    if failed:
+        raise RuntimeError(f"Passos sem sucesso: {', '.join(failed)}")
+    return results
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (2) Build Cache
+# With `run_steps(..., cache=True, scope=...)`, a step is skipped when its **fingerprint** is the same as in its last successful build, and its tables keep the previous output. The fingerprint is a hash of:
+# - the step code (`inspect.getsource`), plus the `extra=` values for constants defined outside the function;
+# - for each input table written by an earlier step in the same run, that step's fingerprint;
+# - for each other input table, its Delta table id and version;
+# - for each input file (`files=`), a SHA-256 of its content (size and modification time when the file is not mounted locally).
+#
+# Some steps rewrite a table that another step produced (for example the coordinate cells over `dim_geography`). If one of these steps must run, the earlier writers of that table run again and so do the later ones, so the table never ends up half rebuilt. Fingerprints are stored in `bronze_lakehouse.pipeline.build_cache`.
+
+# CELL ********************
+
+import fnmatch
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+from pyspark.sql import functions as F
+
+build_cache_table = "bronze_lakehouse.pipeline.build_cache"
+
+
+def code_fingerprint(func):
+    if isinstance(func, functools.partial):
+        return code_fingerprint(func.func) + repr(func.args) + repr(sorted(func.keywords.items()))
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = func.__code__.co_code.hex() + repr(func.__code__.co_consts)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def table_fingerprint(table_name):
+    if not spark.catalog.tableExists(table_name):
+        return "missing"
+    table_id = spark.sql(f"DESCRIBE DETAIL {table_name}").collect()[0]["id"]
+    version = spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1").collect()[0]["version"]
+    return f"{table_id}:{version}"
+
+
+def list_files(path):
+    """Ficheiros de um caminho (ficheiro, pasta ou padrão com '*')."""
+    if "*" in path:
+        folder, pattern = path.rsplit("/", 1)
+        return [f for f in mssparkutils.fs.ls(folder) if fnmatch.fnmatch(f.name, pattern)]
+    files = []
+    for f in mssparkutils.fs.ls(path):
+        files.extend(list_files(f.path) if f.isDir else [f])
+    return files
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    for f in sorted(list_files(path), key=lambda f: f.path):
+        # Os ficheiros do Lakehouse por defeito estão montados localmente em /lakehouse/default
+        relative = f.path.split("/Files/", 1)[-1] if "/Files/" in f.path else None
+        local_path = f"/lakehouse/default/Files/{relative}" if relative else None
+        if local_path and os.path.isfile(local_path):
+            with open(local_path, "rb") as fh:
+                for block in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            digest.update(f"{f.path}:{f.size}:{getattr(f, 'modifyTime', '')}".encode())
+        digest.update(f.name.encode())
+    return digest.hexdigest()
+
+
+def step_fingerprint(s, upstream):
+    """Impressão digital do passo: código, tabelas de entrada (ou o passo que as produziu) e ficheiros."""
+    parts = {"code": code_fingerprint(s.func), "extra": repr(s.extra)}
+    for table in sorted(s.inputs):
+        parts[table] = upstream.get(table) or table_fingerprint(table)
+    for path in s.files:
+        parts[path] = file_fingerprint(path)
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def stored_fingerprints(scope):
+    if not spark.catalog.tableExists(build_cache_table):
+        return {}
+    rows = spark.read.table(build_cache_table) \
+        .filter(F.col("Scope") == scope) \
+        .groupBy("Step_Name") \
+        .agg(F.max_by("Fingerprint", "Built_At").alias("Fingerprint")) \
+        .collect()
+    return {row["Step_Name"]: row["Fingerprint"] for row in rows}
+
+
+def plan_build(steps, scope):
+    """Decide que passos têm de correr: {passo: {fingerprint, upstream, run}}."""
+    stored = stored_fingerprints(scope)
+    writers = {}
+    plan = {}
+    for s in steps:
+        producers = {t: writers[t] for t in s.inputs if t in writers}
+        upstream = {t: plan[p]["fingerprint"] for t, p in producers.items()}
+        fingerprint = step_fingerprint(s, upstream)
+        outputs_exist = all(spark.catalog.tableExists(t) for t in s.outputs)
+        plan[s.name] = {
+            "fingerprint": fingerprint,
+            "upstream": upstream,
+            "producers": producers,
+            "run": stored.get(s.name) != fingerprint or not outputs_exist
+        }
+        for t in s.outputs:
+            writers[t] = s.name
+
+    # Tabelas reescritas por vários passos: para reconstruir uma delas, a cadeia de escritores corre toda
+    writers_of = {}
+    for s in steps:
+        for t in s.outputs:
+            writers_of.setdefault(t, []).append(s.name)
+
+    changed = True
+    while changed:
+        changed = False
+        for s in steps:
+            if not plan[s.name]["run"]:
+                continue
+            # O produtor de uma entrada já não é o último a escrever a tabela: tem de a voltar a escrever
+            chained = [p for t, p in plan[s.name]["producers"].items() if writers_of[t][-1] != p]
+            # Os passos seguintes que reescrevem as mesmas tabelas também têm de correr
+            for t in s.outputs:
+                chained += writers_of[t][writers_of[t].index(s.name) + 1:]
+            for name in chained:
+                if not plan[name]["run"]:
+                    plan[name]["run"] = True
+                    changed = True
+
+    to_run = sum(1 for p in plan.values() if p["run"])
+    print(f"💾 Cache '{scope}': {to_run} de {len(steps)} passos a reconstruir")
+    return plan
+
+
+def record_build(scope, s, upstream):
+    """Grava e devolve a impressão digital do passo depois da execução."""
+    # Recalculada depois da execução: as tabelas que o passo reescreve no mesmo sítio ficam com a nova versão
+    fingerprint = step_fingerprint(s, upstream)
+    spark.sql("CREATE SCHEMA IF NOT EXISTS bronze_lakehouse.pipeline")
+    spark.createDataFrame(
+        [(scope, s.name, fingerprint, ",".join(sorted(s.outputs)))],
+        "Scope string, Step_Name string, Fingerprint string, Outputs string"
+    ).withColumn("Built_At", F.current_timestamp()) \
+        .write.format("delta").mode("append").saveAsTable(build_cache_table)
+    return fingerprint
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (3) Append-Only Writes
+# `append_new_keys` writes a small dimension by **appending only the rows with new keys** (for example the new years of `Dim_Date`). A Direct Lake model only frames the new Parquet files of an append, so it does not reload the whole table. The table is rewritten only when the rows already there would change (new column, new label for an existing key), which is the case where a full reload is needed anyway.
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+
+
+def append_new_keys(df, table_name, keys):
+    """Acrescenta à tabela as linhas de df com chaves novas. Devolve "append", "overwrite" ou None (sem alterações)."""
+    if spark.catalog.tableExists(table_name):
+        current = spark.read.table(table_name)
+        same_schema = [(f.name.lower(), f.dataType) for f in current.schema.fields] == \
+            [(f.name.lower(), f.dataType) for f in df.schema.fields]
+        # As linhas existentes têm de continuar iguais em df, senão a tabela é reescrita
+        if same_schema and current.select(*df.columns).exceptAll(df).limit(1).count() == 0:
+            df_new = df.join(current.select(*keys), keys, "left_anti")
+            new_rows = df_new.count()
+            if new_rows == 0:
+                print(f"💾 {table_name}: sem chaves novas")
+                return None
+            df_new.write.format("delta").mode("append").saveAsTable(table_name)
+            print(f"➕ {table_name}: {new_rows} linhas acrescentadas")
+            return "append"
+
+    df.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(table_name)
+    print(f"🔄 {table_name}: tabela reescrita")
+    return "overwrite"
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (4) Profiler
+# Every `spark.read.table` and `saveAsTable` call of the session is recorded by **Pipeline Profiler (NB)** and saved to `bronze_lakehouse.pipeline.pipeline_metrics` at the end of `run_steps`. The plan of every write is checked by **Plan Linter (NB)**, and the warnings are printed per step at the end of the run.
+
+# CELL ********************
+
+%run Pipeline Profiler (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+%run Plan Linter (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+install_profiler()
+install_plan_linter()
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,218 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Query Plan Linter
+# Shared functions used by **Pipeline Scheduler (NB)** through `%run`. Before every `saveAsTable` (through the write hook of **Pipeline Profiler (NB)**) the plan of the DataFrame being written is inspected with `df._jdf.queryExecution()`, and the patterns that make a step slow without failing it are reported:
+#
+# | Rule | Plan | Typical fix |
+# |---|---|---|
+# | `cartesian_join` | `CartesianProduct`, or a join with no condition | add the join keys |
+# | `non_equi_join` | `BroadcastNestedLoopJoin` (no equality in the condition) | join on equal keys, then filter |
+# | `function_join_key` | join condition with `upper`, `lower`, `trim`, `substring`, … on the keys (not `cast`, which Spark adds by itself for type coercion) | normalize the keys once before the join (Bronze) |
+# | `expression_depth` | an expression nested deeper than `lint_max_expression_depth` | a lookup table or `create_map` instead of nested `when` |
+# | `case_branches` | a `CASE` with more than `lint_max_case_branches` branches | the same |
+# | `missing_broadcast` | a shuffle join (`SortMergeJoin`, `ShuffledHashJoin`) with a side estimated above the automatic broadcast limit but under `lint_small_side_bytes`, and no broadcast hint. Each physical join is checked against its own logical join (`logicalLink`), so a broadcast join is never flagged because another join of the plan shuffles | `F.broadcast` on the small side |
+# | `repeated_scan` | the same table read more than once in the plan | read once and reuse, or `cache` |
+# | `distinct_union` | `distinct()` over a `Union`, or `subtract` (`Except` on every column), read from the analyzed plan because the optimizer rewrites both | `dropDuplicates` on the key, `left_anti` join |
+#
+# The findings are grouped by step (one step per cell), printed at the end of `run_steps` and appended to `bronze_lakehouse.pipeline.plan_lint`. The linter only reads the plan: nothing is executed and the write is never blocked.
+
+# CELL ********************
+
+import re
+import threading
+import time
+
+from pyspark.sql import functions as F
+
+plan_lint_table = "bronze_lakehouse.pipeline.plan_lint"
+lint_max_expression_depth = 30
+lint_max_case_branches = 50
+lint_small_side_bytes = 64 * 1024 * 1024
+
+# Sem cast: o Spark acrescenta casts sozinho (coerção de tipos) em chaves que já vêm bem tipadas
+key_functions = re.compile(r"\b(upper|lower|trim|ltrim|rtrim|concat|substring|regexp_replace)\(", re.IGNORECASE)
+
+lint_findings = []
+lint_lock = threading.Lock()
+
+
+def seq(scala_seq):
+    """Lista Python de uma Seq do Scala (py4j)."""
+    return [scala_seq.apply(i) for i in range(scala_seq.size())]
+
+
+def plan_nodes(plan):
+    """Todos os nós de um plano (lógico ou físico), em pré-ordem."""
+    nodes, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(reversed(seq(node.children())))
+    return nodes
+
+
+def expression_depth(expression, limit):
+    """Profundidade da árvore de uma expressão (pára ao passar do limite)."""
+    deepest, stack = 0, [(expression, 1)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if deepest > limit:
+            break
+        stack.extend((child, depth + 1) for child in seq(node.children()))
+    return deepest
+
+
+def relation_name(node):
+    try:
+        table = node.catalogTable()
+        if table.isDefined():
+            return table.get().identifier().unquotedString().lower()
+    except Exception:
+        pass
+    return re.sub(r"#\d+L?", "", node.simpleString(25))[:120]
+
+
+def size_in_bytes(node):
+    try:
+        return int(node.stats().sizeInBytes().toString())
+    except Exception:
+        return None
+
+
+def lint_plan(df):
+    """Lista de (regra, detalhe) para o plano de um DataFrame."""
+    execution = df._jdf.queryExecution()
+    analyzed = plan_nodes(execution.analyzed())
+    logical = plan_nodes(execution.optimizedPlan())
+    physical_nodes = plan_nodes(execution.sparkPlan())
+    physical = [node.nodeName() for node in physical_nodes]
+    auto_broadcast = spark._jsparkSession.sessionState().conf().autoBroadcastJoinThreshold()
+    findings = []
+
+    if "CartesianProduct" in physical:
+        findings.append(("cartesian_join", "CartesianProduct no plano físico"))
+    if "BroadcastNestedLoopJoin" in physical:
+        findings.append(("non_equi_join", "BroadcastNestedLoopJoin: a condição do join não tem igualdades"))
+
+    # O otimizador reescreve distinct/subtract (Aggregate, anti join), por isso estas regras usam o plano analisado
+    for node in analyzed:
+        name = node.nodeName()
+        if name in ("Distinct", "Deduplicate") and any(c.nodeName() == "Union" for c in seq(node.children())):
+            findings.append(("distinct_union", f"{name} sobre Union (distinct de uma união)"))
+        elif name == "Except":
+            findings.append(("distinct_union", "Except (subtract) sobre todas as colunas"))
+
+    # Cada join físico por shuffle é comparado com o seu próprio join lógico (logicalLink), não com o plano todo
+    for node in physical_nodes:
+        if node.nodeName() not in ("SortMergeJoin", "ShuffledHashJoin"):
+            continue
+        link = node.logicalLink()
+        if not link.isDefined() or link.get().nodeName() != "Join":
+            continue
+        join = link.get()
+
+        # Abaixo do limite automático o Spark já faz broadcast; acima de lint_small_side_bytes não vale a pena
+        sides = [size_in_bytes(child) for child in seq(join.children())]
+        small = [s for s in sides if s is not None and auto_broadcast < s < lint_small_side_bytes]
+        if small and "BROADCAST" not in join.hint().toString().upper():
+            findings.append((
+                "missing_broadcast",
+                f"{node.nodeName()} {join.joinType().toString()} com um lado de ~{min(small) / 1024 / 1024:.1f} MB sem broadcast"
+            ))
+
+    scans = {}
+    for node in logical:
+        name = node.nodeName()
+
+        if name == "Join":
+            condition = node.condition()
+            join_type = node.joinType().toString()
+            if not condition.isDefined() and join_type != "Cross" and "CartesianProduct" not in physical:
+                findings.append(("cartesian_join", f"Join {join_type} sem condição"))
+            elif condition.isDefined() and key_functions.search(condition.get().toString()):
+                findings.append(("function_join_key", re.sub(r"#\d+L?", "", condition.get().toString())[:200]))
+
+        elif name in ("LogicalRelation", "HiveTableRelation", "DataSourceV2Relation", "DataSourceV2ScanRelation"):
+            table = relation_name(node)
+            scans[table] = scans.get(table, 0) + 1
+
+        for expression in seq(node.expressions()):
+            depth = expression_depth(expression, lint_max_expression_depth)
+            if depth > lint_max_expression_depth:
+                findings.append(("expression_depth", f"{name}: expressão com profundidade > {lint_max_expression_depth}"))
+                break
+            branches = expression.toString().count(" WHEN ")
+            if branches > lint_max_case_branches:
+                findings.append(("case_branches", f"{name}: CASE com ~{branches} ramos"))
+                break
+
+    for table, count in scans.items():
+        if count > 1:
+            findings.append(("repeated_scan", f"{table} lida {count} vezes"))
+
+    # A mesma regra e detalhe só uma vez por escrita
+    return list(dict.fromkeys(findings))
+
+
+def lint_write(df, table_name):
+    """Hook de escrita: regista as regras violadas pelo plano a gravar."""
+    if table_name.lower() == plan_lint_table:
+        return
+    try:
+        findings = lint_plan(df)
+    except Exception as e:
+        findings = [("lint_error", str(e)[:200])]
+    step_name = spark.sparkContext.getLocalProperty("spark.jobGroup.id")
+    with lint_lock:
+        lint_findings.extend((step_name, table_name.lower(), rule, detail, time.time()) for rule, detail in findings)
+
+
+def install_plan_linter():
+    """Liga o linter às escritas do profiler (uma vez por sessão)."""
+    if not any(getattr(hook, "__name__", "") == "lint_write" for hook in write_hooks):
+        write_hooks.append(lint_write)
+
+
+def report_plan_lint(run_name):
+    """Mostra as regras violadas por passo e acrescenta-as à tabela plan_lint."""
+    with lint_lock:
+        rows, lint_findings[:] = list(lint_findings), []
+    if not rows:
+        print("🧹 Plan linter: sem avisos")
+        return 0
+
+    by_step = {}
+    for step_name, table_name, rule, detail, _ in rows:
+        by_step.setdefault(step_name or table_name, []).append((table_name, rule, detail))
+    print(f"🧹 Plan linter: {len(rows)} avisos em {len(by_step)} passos")
+    for step_name, findings in sorted(by_step.items()):
+        print(f"⚠️ {step_name}")
+        for table_name, rule, detail in findings:
+            print(f"    [{rule}] {table_name}: {detail}")
+
+    spark.sql("CREATE SCHEMA IF NOT EXISTS bronze_lakehouse.pipeline")
+    spark.createDataFrame(
+        [(run_name,) + row for row in rows],
+        "Run_Name string, Step_Name string, Table_Name string, Rule string, Detail string, Recorded_At double"
+    ).withColumn("Recorded_At", F.col("Recorded_At").cast("timestamp")) \
+        .write.format("delta").mode("append").saveAsTable(plan_lint_table)
+    return len(rows)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,205 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) Country Code Crosswalk
+# Shared functions used through `%run` by **Dimension Data Create Delta Tables Bronze Layer (NB)**, **UN Census Create Delta Tables Bronze Layer (NB)**, **World Bank Ingestion Engine (NB)**, **World Bank Data Transformation Bronze to Silver (NB)**, **Transformations For Tables from the UN Census and Other Sources Silver (NB)** and **Gold Cleaning Tables**.
+#
+# Every source identifies countries in its own way: the UN files use the M49 numeric code or the country name, OWID uses ISO3 plus its own `OWID_*` codes, the World Bank uses its `economy` codes, and some older files use codes that no longer exist (`ROM`, `ZAR`, `TMP`). `bronze_lakehouse.reference_database.country_code_crosswalk` maps all of them to ISO3, with one row per `(Scheme, Code)`:
+# - **Scheme:** `iso3`, `iso2`, `m49`, `wb`, `owid` or `name`;
+# - **Code:** the code as written by `normalize_code` (upper case and trimmed, M49 without leading zeros);
+# - **Country_Code_Iso3:** the ISO3 code used in every Silver and Gold table;
+# - **Code_Type:** `standard` (from the UN M49 file or `extra_countries`), `alias` (another spelling in use) or `historical` (a code that was replaced).
+#
+# `code_map_expr` turns the table into a literal `map` expression (`create_map`): no UDF and no join, Spark evaluates it inside the scan, and the same expression can be used in any `select`. For joins `crosswalk_frame` returns the broadcast version of the table. The sources are mapped **once at Bronze**, so Silver and Gold join on plain `Country_Code_Iso3 = Country_Code_Iso3` predicates.
+#
+# Countries missing from the UN M49 file (Taiwan, numeric 158) are listed in `extra_countries` and added to `geography_dimension` at Bronze by `with_extra_countries`.
+
+# CELL ********************
+
+from pyspark.sql import functions as F
+from pyspark.sql.types import StructType, StructField, StringType
+
+crosswalk_table = "bronze_lakehouse.reference_database.country_code_crosswalk"
+crosswalk_schemes = ["iso3", "iso2", "m49", "wb", "owid", "name"]
+
+# Países que não estão no ficheiro M49 da ONU (nomes das colunas da Bronze)
+extra_countries = [
+    {
+        "region_code": 142, "region_name": "Asia",
+        "sub-region_code": 30, "sub-region_name": "Eastern Asia",
+        "intermediate_region_name": "Eastern Asia",
+        "country_or_area": "Taiwan", "m49_code": 158,
+        "iso-alpha2_code": "TW", "iso-alpha3_code": "TWN"
+    }
+]
+
+# Nomes das colunas de códigos na Silver (o Dataflow renomeia as colunas da Bronze)
+silver_geography_names = {
+    "m49_code": "Country_Code_Numeric",
+    "iso-alpha2_code": "Country_Code_Iso2",
+    "iso-alpha3_code": "Country_Code_Iso3"
+}
+
+# Outros códigos em uso: (Scheme, Code, Country_Code_Iso3, Code_Type)
+code_aliases = [
+    ("wb", "ROM", "ROU", "historical"),
+    ("wb", "ZAR", "COD", "historical"),
+    ("wb", "TMP", "TLS", "historical"),
+    ("wb", "ADO", "AND", "historical"),
+    ("wb", "WBG", "PSE", "historical"),
+    ("iso3", "ROM", "ROU", "historical"),
+    ("iso3", "ZAR", "COD", "historical"),
+    ("iso3", "TMP", "TLS", "historical"),
+    ("iso2", "UK", "GBR", "alias"),
+    ("iso2", "EL", "GRC", "alias"),
+    ("name", "United Kingdom", "GBR", "alias"),
+    ("name", "United States", "USA", "alias"),
+    ("name", "Russia", "RUS", "alias"),
+    ("name", "Turkey", "TUR", "alias"),
+    ("name", "Iran", "IRN", "alias"),
+    ("name", "Korea, Republic of", "KOR", "alias"),
+    ("name", "South Korea", "KOR", "alias"),
+    ("name", "Moldova, Republic of", "MDA", "alias"),
+    ("name", "Tanzania, United Republic of", "TZA", "alias"),
+    ("name", "Bolivia", "BOL", "alias"),
+    ("name", "Venezuela", "VEN", "alias"),
+    ("name", "Vietnam", "VNM", "alias"),
+    ("name", "Czech Republic", "CZE", "alias"),
+    ("name", "Taiwan, China", "TWN", "alias"),
+    ("name", "Hong Kong, China", "HKG", "alias"),
+    ("name", "Macau, China", "MAC", "alias")
+]
+
+# Mapas já carregados nesta sessão (Scheme -> {Code: ISO3})
+crosswalk_mappings = {}
+
+
+def normalize_code(column, scheme):
+    """Forma canónica de um código: M49 como inteiro sem zeros à esquerda, o resto em maiúsculas e sem espaços."""
+    if scheme == "m49":
+        return column.cast("int").cast("string")
+    return F.upper(F.trim(column.cast("string")))
+
+
+def with_extra_countries(df_geo, column_names=None):
+    """Acrescenta à geografia os países de extra_countries que ainda não existem (por ISO3).
+
+    column_names: nome de cada coluna da Bronze em df_geo (por defeito os mesmos nomes, ver silver_geography_names).
+    """
+    names = {c: (column_names or {}).get(c, c) for c in extra_countries[0]}
+    iso3 = names["iso-alpha3_code"]
+    present = {row[0] for row in df_geo.select(F.col(f"`{iso3}`")).collect()}
+    rows = [country for country in extra_countries if country["iso-alpha3_code"] not in present]
+    if not rows:
+        return df_geo
+
+    bronze_names = {names[c]: c for c in names}
+    values = [
+        tuple(None if c not in bronze_names or country.get(bronze_names[c]) is None else str(country[bronze_names[c]])
+              for c in df_geo.columns)
+        for country in rows
+    ]
+    df_extra = spark.createDataFrame(values, StructType([StructField(c, StringType(), True) for c in df_geo.columns]))
+    df_extra = df_extra.select(*[F.col(f"`{f.name}`").cast(f.dataType).alias(f.name) for f in df_geo.schema.fields])
+    return df_geo.unionByName(df_extra)
+
+
+def build_crosswalk(df_geo):
+    """Tabela de correspondência (Scheme, Code, Country_Code_Iso3, Country_Or_Area, Code_Type) a partir do geography_dimension da Bronze."""
+    df_geo = with_extra_countries(df_geo).filter(F.col("`iso-alpha3_code`").isNotNull())
+    iso3 = normalize_code(F.col("`iso-alpha3_code`"), "iso3")
+
+    standard_codes = {
+        "iso3": F.col("`iso-alpha3_code`"),
+        "iso2": F.col("`iso-alpha2_code`"),
+        "m49": F.col("m49_code"),
+        # O Banco Mundial e o OWID usam o ISO3 para os países
+        "wb": F.col("`iso-alpha3_code`"),
+        "owid": F.col("`iso-alpha3_code`"),
+        "name": F.col("country_or_area")
+    }
+    df_standard = None
+    for scheme, code in standard_codes.items():
+        part = df_geo.select(
+            F.lit(scheme).alias("Scheme"),
+            normalize_code(code, scheme).alias("Code"),
+            iso3.alias("Country_Code_Iso3"),
+            F.col("country_or_area").alias("Country_Or_Area"),
+            F.lit("standard").alias("Code_Type")
+        )
+        df_standard = part if df_standard is None else df_standard.unionByName(part)
+
+    names = df_geo.select(iso3.alias("Country_Code_Iso3"), F.col("country_or_area").alias("Country_Or_Area"))
+    df_aliases = spark.createDataFrame(code_aliases, "Scheme string, Code string, Country_Code_Iso3 string, Code_Type string") \
+        .withColumn("Code", F.when(F.col("Scheme") == "m49", F.col("Code").cast("int").cast("string"))
+                    .otherwise(F.upper(F.trim(F.col("Code"))))) \
+        .join(names, "Country_Code_Iso3", "left") \
+        .select("Scheme", "Code", "Country_Code_Iso3", "Country_Or_Area", "Code_Type")
+
+    # Os códigos standard têm prioridade sobre um alias com o mesmo código
+    df_standard = df_standard.filter(F.col("Code").isNotNull()).dropDuplicates(["Scheme", "Code", "Country_Code_Iso3"])
+    df_aliases = df_aliases.join(df_standard.select("Scheme", "Code"), ["Scheme", "Code"], "left_anti")
+    crosswalk = df_standard.unionByName(df_aliases)
+
+    # Um código não pode apontar para dois países
+    conflicts = crosswalk.groupBy("Scheme", "Code").agg(F.collect_set("Country_Code_Iso3").alias("Targets")) \
+        .filter(F.size("Targets") > 1).collect()
+    if conflicts:
+        raise ValueError(f"Códigos com mais de um país no crosswalk: {[(r['Scheme'], r['Code'], r['Targets']) for r in conflicts]}")
+
+    # Os aliases cujo país não existe na geografia ficam de fora
+    return crosswalk.filter(F.col("Country_Or_Area").isNotNull() | (F.col("Code_Type") == "standard"))
+
+
+def load_crosswalk(scheme, table_name=crosswalk_table):
+    """{Code: ISO3} de um esquema, lido uma vez por sessão ({} se o crosswalk ainda não existir)."""
+    if scheme not in crosswalk_schemes:
+        raise ValueError(f"Esquema desconhecido: {scheme} (esperado um de {crosswalk_schemes})")
+    if scheme not in crosswalk_mappings:
+        if not spark.catalog.tableExists(table_name):
+            print(f"⚠️ {table_name} não existe, os códigos '{scheme}' só são normalizados")
+            return {}
+        rows = spark.read.table(table_name).filter(F.col("Scheme") == scheme) \
+            .select("Code", "Country_Code_Iso3").collect()
+        crosswalk_mappings[scheme] = {row["Code"]: row["Country_Code_Iso3"] for row in rows}
+    return crosswalk_mappings[scheme]
+
+
+def code_map_expr(column, scheme, mapping=None, keep_unmapped=False):
+    """Expressão (sem UDF) que converte uma coluna de códigos do esquema para ISO3.
+
+    Os códigos sem correspondência ficam nulos, ou normalizados com keep_unmapped=True (agregados do Banco Mundial, OWID_*).
+    """
+    column = F.col(column) if isinstance(column, str) else column
+    mapping = load_crosswalk(scheme) if mapping is None else mapping
+    key = normalize_code(column, scheme)
+    fallback = key if keep_unmapped else F.lit(None).cast("string")
+    if not mapping:
+        return fallback
+
+    lookup = F.create_map(*[F.lit(value) for pair in sorted(mapping.items()) for value in pair])
+    return F.coalesce(lookup[key], fallback)
+
+
+def crosswalk_frame(scheme, table_name=crosswalk_table):
+    """(Code, Country_Code_Iso3) de um esquema, marcado para broadcast nos joins."""
+    return F.broadcast(
+        spark.read.table(table_name).filter(F.col("Scheme") == scheme).select("Code", "Country_Code_Iso3")
+    )
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -30,6 +30,28 @@
 
 # CELL ********************
 
+%run Pipeline Scheduler (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+%run Country Code Crosswalk (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
 ## -------------------------------------------------------------------------------------
 ## Standard Country or Area Codes for Statistical Use
 ## -------------------------------------------------------------------------------------
@@ -41,36 +63,92 @@ from pyspark.sql.functions import col
 # Define the folder path
 folder_path = "Files/Reference Data/Standard Country or Area Codes.csv"
 
-# Load your data
-# Updated Load Step
-df_countries = (spark.read
-                .format("csv")
-                .option("header", "true")
-                .option("sep", ";")        # This is the key fix
-                .option("inferSchema", "true")
-                .load(folder_path))
-
 schema = "Reference_Database"
-spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+target_table_name = "geography_dimension"
 
 # Function to clean column names
 def clean_column_name(name):
     # Replace invalid characters with underscores and lowercase it
     return re.sub(r'[ ,;{}()\n\t=]+', '_', name).strip('_').lower()
 
-# Apply the cleaning to all columns
-df_cleaned = df_countries.toDF(*[clean_column_name(c) for c in df_countries.columns])
 
-# 3. Save to a Delta Table
-target_table_name = "geography_dimension"
+# The step is skipped when the CSV and this code are unchanged since the last build
+@step(
+    files=[folder_path],
+    outputs=[f"{schema}.{target_table_name}"],
+    extra=code_fingerprint(clean_column_name) + code_fingerprint(with_extra_countries) + repr(extra_countries)
+)
+def reference_geography_dimension():
+    # Load your data
+    # Updated Load Step
+    df_countries = (spark.read
+                    .format("csv")
+                    .option("header", "true")
+                    .option("sep", ";")        # This is the key fix
+                    .option("inferSchema", "true")
+                    .load(folder_path))
+
+    spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+
+    # Apply the cleaning to all columns
+    df_cleaned = df_countries.toDF(*[clean_column_name(c) for c in df_countries.columns])
+
+    # Países que faltam no ficheiro M49 (Taiwan, 158) entram já aqui, com os mesmos códigos que os restantes
+    df_cleaned = with_extra_countries(df_cleaned)
+
+    # 3. Save to a Delta Table
+    # Added overwriteSchema to force the new, multi-column structure
+    df_cleaned.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(f"{schema}.{target_table_name}")
 
-# Added overwriteSchema to force the new, multi-column structure
-df_cleaned.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(f"{schema}.{target_table_name}")
+    print(f"file saved into table: {target_table_name}")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (1.2) Country Code Crosswalk
+# One row per code of every scheme (ISO3, ISO2, M49, World Bank, OWID, country name), with the alias and historical codes of `code_aliases`. See **Country Code Crosswalk (NB)**.
+
+# CELL ********************
+
+crosswalk_aliases = repr(code_aliases) + repr(extra_countries)
+
+
+@step(
+    inputs=[f"{schema}.{target_table_name}"],
+    outputs=[crosswalk_table],
+    extra=code_fingerprint(build_crosswalk) + code_fingerprint(normalize_code) + crosswalk_aliases
+)
+def reference_country_code_crosswalk():
+    df_crosswalk = build_crosswalk(spark.read.table(f"{schema}.{target_table_name}"))
+
+    df_crosswalk.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(crosswalk_table)
+
+    crosswalk_mappings.clear()
+    print(f"✅ {crosswalk_table} gravada")
+    display(df_crosswalk.groupBy("Scheme").pivot("Code_Type", ["standard", "alias", "historical"]).count().orderBy("Scheme"))
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
 
-print(f"file saved into table: {target_table_name}")
+run_steps(pipeline_steps, cache=True, scope="reference_data")
 
 # METADATA ********************
 
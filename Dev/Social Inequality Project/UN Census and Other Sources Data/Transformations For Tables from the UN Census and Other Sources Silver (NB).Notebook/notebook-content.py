@@ -14,6 +14,9 @@
 # META       "known_lakehouses": [
 # META         {
 # META           "id": "7a701f3d-b29e-4934-b58e-93cb5cd89308"
+# META         },
+# META         {
+# META           "id": "83e7b47e-7c74-45e9-a96b-b66ae0bf51aa"
 # META         }
 # META       ]
 # META     }
@@ -48,12 +51,23 @@ df_geo_fixed = df_geo.withColumn(
            F.col("`sub-region_name`")).otherwise(F.col("intermediate_region_name"))
 )
 
-df_geo_fixed.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.geography")
+# Só grava se houver regiões por preencher: uma reescrita sem alterações mudaria a versão Delta
+# e invalidaria a cache de build dos passos que leem a geografia
+missing_regions = df_geo.filter(
+    F.col("region_name").isNull() | (F.col("region_name") == "") |
+    F.col("`sub-region_name`").isNull() | (F.col("`sub-region_name`") == "") |
+    F.col("intermediate_region_name").isNull() | (F.col("intermediate_region_name") == "")
+).limit(1).count()
+
+if missing_regions:
+    df_geo_fixed.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.geography")
 
-print("✅ Dados gravados. A atualizar esquema para visualização...")
+    print("✅ Dados gravados. A atualizar esquema para visualização...")
+else:
+    print("✅ Geografia já preenchida, nada a gravar.")
 
 
 spark.catalog.refreshTable("silver_lakehouse.dbo.geography")
@@ -69,3 +83,229 @@ df_final.select("country_or_area", "region_name", "`sub-region_name`", "intermed
 # META   "language": "python",
 # META   "language_group": "synapse_pyspark"
 # META }
+
+# MARKDOWN ********************
+
+# # (2) UN Census Normalization
+# The UN Census and ILOSTAT tables in `bronze_lakehouse.un_census` are long tables: one row per country, year, sex, age (or currency) and data source, often with several sources or currencies for the same country-year. Reading them with a bare `Value` column mixes series and units (for example two earnings surveys for Iceland in the same year). This section writes one **unique-key** Silver table per dataset, configured in `un_census_series`:
+# 1. The country is mapped to ISO3 with **Country Code Crosswalk (NB)** (ILOSTAT only gives the country name, the UN files the M49 code).
+# 2. Every row gets a `Series_Rank` from the `priority` list (source type, currency, reliability, most recent source year). Per key (country, year and the extra `keys`) only the best series is kept, chosen on the `primary` breakdown (the total) when it exists, so the sex/age columns of a row always come from the same survey and currency.
+# 3. The sex/age breakdowns are turned into typed columns (`<prefix>_<breakdown>`) in a single `groupBy().pivot()` with explicit pivot values. Breakdowns that are not listed are dropped.
+#
+# The chosen series is kept in the descriptive columns (`Currency`, `Source`, ...), so the units of every row are known downstream. Earnings are kept in nominal U.S. dollars when the source has them, the same unit the Gold fact used until now.
+
+# CELL ********************
+
+%run Pipeline Scheduler (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+%run Country Code Crosswalk (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+import functools
+
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+ilostat_total_15plus = "Age (Youth, adults): 15+"
+ilostat_youth = "Age (Youth, adults): 15-24"
+
+# Uma entrada por tabela da Bronze. priority: (coluna, valores preferidos por ordem, como prefixo; None = nulo)
+# ou (coluna, "desc"/"asc") para ordenar pelo próprio valor
+un_census_series = {
+    "monthly_employee_earnings": {
+        "source": "bronze_lakehouse.un_census.monthly_employee_earnings",
+        "target": "silver_lakehouse.dbo.un_monthly_employee_earnings",
+        "country": ("ref_area.label", "name"),
+        "year": "time",
+        "value": "obs_value",
+        "prefix": "Monthly_Employee_Earnings",
+        "breakdown": (["sex.label"], {("Total",): "Total", ("Male",): "Male", ("Female",): "Female"}),
+        "primary": "Total",
+        "series": {"classif1.label": "Currency", "source.label": "Source"},
+        "priority": [
+            ("classif1.label", ["Currency: U.S. dollars", "Currency: Local currency", "Currency: 2021 PPP $"]),
+            ("source.label", ["LFS", "ES", "HIES", "HS", "Admin"])
+        ]
+    },
+    "unemployment_rate": {
+        "source": "bronze_lakehouse.un_census.unemployment_rate",
+        "target": "silver_lakehouse.dbo.un_unemployment_rate",
+        "country": ("ref_area.label", "name"),
+        "year": "time",
+        "value": "obs_value",
+        "prefix": "Unemployment_Rate",
+        "breakdown": (["sex.label", "classif1.label"], {
+            ("Total", ilostat_total_15plus): "Total_15plus",
+            ("Male", ilostat_total_15plus): "Male_15plus",
+            ("Female", ilostat_total_15plus): "Female_15plus",
+            ("Total", ilostat_youth): "Total_15_24",
+            ("Male", ilostat_youth): "Male_15_24",
+            ("Female", ilostat_youth): "Female_15_24"
+        }),
+        "primary": "Total_15plus",
+        "series": {"source.label": "Source"},
+        "priority": [("source.label", ["LFS", "HIES", "HS", "PC", "Admin"])]
+    },
+    "gini_index": {
+        "source": "bronze_lakehouse.un_census.gini_index",
+        "target": "silver_lakehouse.dbo.un_gini_index",
+        "country": ("Country_or_Area_Code", "iso3"),
+        "year": "Year",
+        "value": "Value",
+        "prefix": "Gini_Index",
+        "series": {"Value_Footnotes": "Footnote"},
+        "priority": [("Value_Footnotes", [None])]
+    },
+    "attainment_15plus": {
+        "source": "bronze_lakehouse.un_census.attainment_15plus",
+        "target": "silver_lakehouse.dbo.un_attainment_15plus",
+        "country": ("Country_or_Area_Code", "m49"),
+        "year": "Year",
+        "value": "Value",
+        "prefix": "Population",
+        "keys": {"Educational_attainment": "Educational_Attainment"},
+        "filters": {"Area": ["Total"]},
+        "breakdown": (["Sex"], {("Both Sexes",): "Total", ("Male",): "Male", ("Female",): "Female"}),
+        "primary": "Total",
+        "series": {"Age": "Age", "Record_Type": "Record_Type", "Source_Year": "Source_Year"},
+        "priority": [
+            ("Age", ["Total", "15 +"]),
+            ("Reliability", ["Final figure, complete", "Final figure, incomplete", "Provisional figure"]),
+            ("Record_Type", ["Census - de jure - complete tabulation", "Census - de facto - complete tabulation",
+                             "Census - de jure", "Census - de facto", "Sample survey"]),
+            ("Source_Year", "desc")
+        ]
+    }
+}
+
+
+def source_column(name):
+    return F.col(f"`{name}`")
+
+
+def priority_rank(column, preferred):
+    """Posição do valor da coluna na lista de preferência (os valores fora da lista ficam no fim)."""
+    value = source_column(column)
+    if preferred in ("asc", "desc"):
+        number = value.cast("double")
+        return F.coalesce(-number if preferred == "desc" else number, F.lit(float("inf")))
+
+    rank = F.lit(len(preferred))
+    for position, label in reversed(list(enumerate(preferred))):
+        match = value.isNull() if label is None else value.cast("string").startswith(label)
+        rank = F.when(match, F.lit(position)).otherwise(rank)
+    return rank
+
+
+def breakdown_expr(columns, values):
+    """Nome da coluna de destino de cada combinação (sexo, idade, ...) listada; nulo para as restantes."""
+    lookup = F.create_map(*[F.lit(item) for labels, name in values.items() for item in ("|".join(labels), name)])
+    return lookup[F.concat_ws("|", *[source_column(c).cast("string") for c in columns])]
+
+
+def normalize_un_series(name, config=None):
+    """Série preferida por chave e breakdowns em colunas: uma linha por país/ano (e keys)."""
+    config = config or un_census_series[name]
+    df = spark.read.table(config["source"])
+    for column, allowed in config.get("filters", {}).items():
+        df = df.filter(source_column(column).isin(allowed))
+
+    country_column, scheme = config["country"]
+    extra_keys = config.get("keys", {})
+    series = config.get("series", {})
+    keys = ["Country_Code_Iso3", "Year"] + list(extra_keys.values())
+    breakdown_columns, breakdown_values = config.get("breakdown") or ([], {})
+
+    # 1. Chaves, série e breakdown de cada linha
+    rank_fields = [priority_rank(c, p).alias(f"p{i}") for i, (c, p) in enumerate(config.get("priority", []))]
+    rank_fields += [source_column(c).cast("string").alias(f"s{i}") for i, c in enumerate(series)]
+    df_long = df.select(
+        code_map_expr(source_column(country_column), scheme).alias("Country_Code_Iso3"),
+        source_column(config["year"]).cast("int").alias("Year"),
+        *[source_column(c).alias(alias) for c, alias in extra_keys.items()],
+        *[source_column(c).cast("string").alias(alias) for c, alias in series.items()],
+        (breakdown_expr(breakdown_columns, breakdown_values) if breakdown_columns else F.lit("")).alias("Breakdown"),
+        F.struct(*rank_fields).alias("Series_Rank"),
+        source_column(config["value"]).cast("double").alias("Value")
+    ).filter(
+        F.col("Country_Code_Iso3").isNotNull() & F.col("Year").isNotNull()
+        & F.col("Value").isNotNull() & F.col("Breakdown").isNotNull()
+    )
+
+    # 2. Melhor série por chave (decidida no breakdown principal quando existe)
+    by_key = Window.partitionBy(*keys)
+    primary = config.get("primary")
+    best = F.min("Series_Rank").over(by_key)
+    if primary:
+        best = F.coalesce(F.min(F.when(F.col("Breakdown") == primary, F.col("Series_Rank"))).over(by_key), best)
+    df_best = df_long.withColumn("Best_Rank", best) \
+        .filter(F.col("Series_Rank").eqNullSafe(F.col("Best_Rank"))) \
+        .drop("Series_Rank", "Best_Rank")
+
+    # 3. Breakdowns em colunas numa só passagem (valores do pivot explícitos)
+    prefix = config["prefix"]
+    if breakdown_columns:
+        columns = list(dict.fromkeys(breakdown_values.values()))
+        df_wide = df_best.groupBy(*keys, *series.values()).pivot("Breakdown", columns).agg(F.max("Value"))
+        return df_wide.select(*keys, *series.values(), *[F.col(c).cast("double").alias(f"{prefix}_{c}") for c in columns])
+    return df_best.groupBy(*keys, *series.values()).agg(F.max("Value").cast("double").alias(prefix))
+
+
+def write_un_series(name):
+    config = un_census_series[name]
+    df_silver = normalize_un_series(name)
+
+    df_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(config["target"])
+
+    print(f"✅ {config['target']}: {spark.read.table(config['target']).count()} linhas (uma por chave)")
+
+
+for name, config in un_census_series.items():
+    if not spark.catalog.tableExists(config["source"]):
+        print(f"⚠️ {config['source']} não existe, {config['target']} não é gerada")
+        continue
+    step(
+        inputs=[config["source"], crosswalk_table],
+        outputs=[config["target"]],
+        name=config["target"],
+        extra=code_fingerprint(normalize_un_series) + code_fingerprint(priority_rank) + repr(config)
+    )(functools.partial(write_un_series, name))
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+describe_dag(pipeline_steps)
+run_steps(pipeline_steps, cache=True, scope="un_census_silver")
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -44,86 +44,9 @@
 # META   "language_group": "synapse_pyspark"
 # META }
 
-# MARKDOWN ********************
-
-# ## (1.2) Development Data
-# The indicators you've listed fall into two primary categories: Socio-economic Development and Infrastructure Performance.
-# Specifically, these are used by organizations like the World Bank and the UN to measure a country's energy profile. Here is the breakdown of how they are classified:
-
-# MARKDOWN ********************
-
-# ## (1.3) Demographic Data
-# ### 1. Component Breakdown
-# #### The Population Pillars (Static Counts)
-# - **Total Population:** The baseline count of all residents. This serves as the "denominator" for nearly every social and economic KPI (Key Performance Indicator).
-# - **Gender Distribution (Male/Female):** Essential for identifying demographic imbalances. In data analysis, this is used to calculate gender-specific literacy, employment, and health outcomes.
-# 
-# #### The Migration Dynamics (Movement & Stock)
-# International Migrant Stock: Represents the total number of people living in a country who were born elsewhere. This is a measure of a country's diversity and attractiveness as a destination.
-# - **Net Migration:** The "Pulse" of a country's borders. It calculates (In-migration - Out-migration).
-# - **Positive Net Migration:** Indicates a "Pull" factor (economic opportunity, safety).
-# - **Negative Net Migration:** Indicates a "Push" factor (economic hardship, brain drain).
-
-
 # CELL ********************
 
-import wbgapi as wb
-import pandas as pd
-
-# 1. Target all countries
-countries = 'all'
-
-# 2. Demographic indicators mapping
-# SP.POP.TOTL: Population, total
-# SP.POP.TOTL.MA.IN: Population, male
-# SP.POP.TOTL.FE.IN: Population, female
-# SM.POP.TOTL: International migrant stock, total
-# SM.MET.NETM: Net migration
-demo_indicators = {
-    'SP.POP.TOTL': 'Pop_Total_Count',
-    'SP.POP.TOTL.MA.IN': 'Pop_Male_Count',
-    'SP.POP.TOTL.FE.IN': 'Pop_Female_Count',
-    'SM.POP.TOTL': 'Migrant_Stock_Total_Count',
-    'SM.MET.NETM': 'Net_Migration_Flow'
-}
-
-# 3. Fetch the data
-# mrv=40 to capture historical migration trends (often reported in 5-year gaps)
-df_demo = wb.data.DataFrame(
-    list(demo_indicators.keys()), 
-    economy='all', 
-    time=range(2010, 2026), 
-    columns='series'
-).reset_index()
-
-# 4. Cleaning and Formatting
-df_demo = df_demo.rename(columns=demo_indicators).reset_index()
-
-# Clean Year column (World Bank API returns 'YR2020', we want 2020)
-df_demo['time'] = df_demo['time'].str.replace('YR', '').astype(int)
-
-df_demo = (
-    df_demo
-    .rename(columns={'economy': 'Country_Code', 'time': 'Year'})
-    .sort_values(['Country_Code', 'Year'])
-    .reset_index(drop=True)
-)
-
-# 5. Save to Spark Delta Table
-schema = "world_bank"
-table_name = "population_migration"
-
-# Create Spark DataFrame
-df_spark = spark.createDataFrame(df_demo)
-
-# Write to Delta
-df_spark.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .option("description", "Global population counts and migration flows sourced from World Bank API") \
-    .saveAsTable(f"{schema}.{table_name}")
-
-print(f"Demographic data successfully saved to {schema}.{table_name}")
+%run World Bank Ingestion Engine (NB)
 
 # METADATA ********************
 
@@ -132,62 +55,37 @@ print(f"Demographic data successfully saved to {schema}.{table_name}")
 # META   "language_group": "synapse_pyspark"
 # META }
 
-# MARKDOWN ********************
-
-# ### (1.3.1) Fertility
-
 # CELL ********************
 
-import wbgapi as wb
-import pandas as pd
+%run World Bank Source Registry (NB)
 
-# 1. Target all countries
-countries = 'all'
-
-# 2. Fertility indicator mapping
-# SP.DYN.TFRT.IN: Fertility rate, total (births per woman)
-fertility_indicators = {
-    'SP.DYN.TFRT.IN': 'Fertility_Rate_Births_Per_Woman'
-}
-
-# 3. Fetch the data
-# mrv=40 is great for seeing long-term demographic transitions
-df_fertility = wb.data.DataFrame(
-    list(fertility_indicators.keys()), 
-    economy='all', 
-    time=range(2010, 2026), 
-    columns='series'
-).reset_index()
+# METADATA ********************
 
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-# 4. Cleaning and Formatting
-df_fertility = df_fertility.rename(columns=fertility_indicators).reset_index()
+# PARAMETERS CELL ********************
 
-# Extract Year as integer
-df_fertility['time'] = df_fertility['time'].str.replace('YR', '').astype(int)
+# Backfill do histórico longo (desligado por defeito, ver secção (2) no fim do notebook)
+run_backfill = False
+backfill_start_year = 1960
 
-df_fertility = (
-    df_fertility
-    .rename(columns={'economy': 'Country_Code', 'time': 'Year'})
-    .sort_values(['Country_Code', 'Year'])
-    .reset_index(drop=True)
-)
+# Reescreve as tabelas do registo mesmo dentro da cadência (ver secção (1.5))
+force_refresh = False
 
-# 5. Save to Spark Delta Table
-schema = "world_bank"
-table_name = "fertility_rates"
+# METADATA ********************
 
-# Create Spark DataFrame
-df_spark = spark.createDataFrame(df_fertility)
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-# Write to Delta
-df_spark.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .option("description", "Total fertility rate (births per woman) sourced from World Bank API") \
-    .saveAsTable(f"{schema}.{table_name}")
+# CELL ********************
 
-print(f"Fertility data successfully saved to {schema}.{table_name}")
+# Verificação do transporte HTTP (retries, circuit breaker e half-open) contra o servidor local, antes de chamar a API
+transport_smoke_test()
 
 # METADATA ********************
 
@@ -198,138 +96,69 @@ print(f"Fertility data successfully saved to {schema}.{table_name}")
 
 # MARKDOWN ********************
 
-# ## (1.4) Economic Data
-
-# MARKDOWN ********************
-
-# ### (1.4.1) Economic Indicators
+# ## (1.2) Development Data
+# The indicators you've listed fall into two primary categories: Socio-economic Development and Infrastructure Performance.
+# Specifically, these are used by organizations like the World Bank and the UN to measure a country's energy profile. Here is the breakdown of how they are classified:
 
 # MARKDOWN ********************
 
-# ### (1.4.2) Employment Indicators
-
-# CELL ********************
+# ## (1.3) Demographic Data
+# ### 1. Component Breakdown
+# #### The Population Pillars (Static Counts)
+# - **Total Population:** The baseline count of all residents. This serves as the "denominator" for nearly every social and economic KPI (Key Performance Indicator).
+# - **Gender Distribution (Male/Female):** Essential for identifying demographic imbalances. In data analysis, this is used to calculate gender-specific literacy, employment, and health outcomes.
+# 
+# #### The Migration Dynamics (Movement & Stock)
+# International Migrant Stock: Represents the total number of people living in a country who were born elsewhere. This is a measure of a country's diversity and attractiveness as a destination.
+# - **Net Migration:** The "Pulse" of a country's borders. It calculates (In-migration - Out-migration).
+# - **Positive Net Migration:** Indicates a "Pull" factor (economic opportunity, safety).
+# - **Negative Net Migration:** Indicates a "Push" factor (economic hardship, brain drain).
+# 
+# Loaded from the source registry (section (1.5)) into `world_bank.population_migration`: total, male and female population, international migrant stock and net migration, 2010–2025.
 
-import wbgapi as wb
-import pandas as pd
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType
-
-# 1. Configuração
-employment_indicators = {
-    'SL.UEM.TOTL.ZS': 'Unemployment_Total',
-    'SL.UEM.TOTL.FE.ZS': 'Unemployment_Female',
-    'SL.UEM.TOTL.MA.ZS': 'Unemployment_Male'
-}
-
-print("1. A descarregar dados brutos da API para a Bronze...")
-df_employment = wb.data.DataFrame(
-    list(employment_indicators.keys()), 
-    economy='all', 
-    time=range(2010, 2026), 
-    columns='series'
-).reset_index()
-
-# 2. Renomeação básica e cast de tempo (necessário para a estrutura de tabela)
-df_employment = df_employment.rename(columns=employment_indicators)
-df_employment['time'] = df_employment['time'].str.replace('YR', '').astype(int)
-df_employment = df_employment.rename(columns={'economy': 'country_code_iso3', 'time': 'Year'})
-
-# 3. Schema para garantir integridade na Bronze
-schema_bronze = StructType([
-    StructField("country_code_iso3", StringType(), True),
-    StructField("Year", IntegerType(), True),
-    StructField("Unemployment_Total", DoubleType(), True),
-    StructField("Unemployment_Female", DoubleType(), True),
-    StructField("Unemployment_Male", DoubleType(), True)
-])
-
-# 4. Gravação na Bronze
-# Definimos o schema (world_bank) e o nome da tabela
-schema_name = "world_bank"
-table_name = "Unemployment"
-full_table_path = f"{schema_name}.{table_name}"
-
-print(f"2. A garantir que o schema '{schema_name}' existe...")
-# Criamos o schema world_bank caso ele não exista
-spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
-
-# Criar o DataFrame Spark com o schema_bronze definido anteriormente
-df_spark = spark.createDataFrame(df_employment, schema=schema_bronze)
-
-print(f"3. A gravar tabela '{full_table_path}' no formato Delta...")
-
-df_spark.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(full_table_path)
-
-print(f"✓ SUCESSO! Dados brutos guardados em: {full_table_path}")
 
-# METADATA ********************
+# MARKDOWN ********************
 
-# META {
-# META   "language": "python",
-# META   "language_group": "synapse_pyspark"
-# META }
+# ### (1.3.1) Fertility
+# Total fertility rate (births per woman), 2010–2025, in `world_bank.fertility_rates`.
 
 # MARKDOWN ********************
 
-# # Tabelas para as perguntas nivel 2
+# ## (1.4) Economic Data
 
-# CELL ********************
+# MARKDOWN ********************
 
-import wbgapi as wb
-import pandas as pd
+# ### (1.4.1) Economic Indicators
+# GDP per capita (PPP), CPI inflation and annual GDP growth, 2010–2024, in `world_bank.Economic_Indicators`.
 
-# 1. Configuração dos indicadores
-# Ajustei os nomes para serem compatíveis com SQL/Delta (sem espaços ou símbolos)
-nivel_2_WB = {
-    'SE.XPD.TOTL.GD.ZS' : 'Gov_Education_Exp_Pct_GDP',
-    'SE.SEC.NENR' : 'School_Enrollment_Secondary_Net_Pct',
-    'IT.NET.USER.ZS' : 'Internet_Usage_Pct_Pop',
-    'SI.POV.DDAY' : 'Poverty_Headcount_Ratio_2_15_Day',
-    'FX.OWN.TOTL.FE.ZS' : 'Account_Ownership_Female_Pct',
-    'WP_time_01.2' : 'Digital_Payments_Past_Year_Female_Pct',
-    'SL.TLF.CACT.FE.ZS' : 'Labor_Force_Participation_Female_Pct'
-}
+# MARKDOWN ********************
 
-countries = 'all'
+# ### (1.4.2) Employment Indicators
+# Total, female and male unemployment rates, 2010–2025, in `world_bank.Unemployment` (key `country_code_iso3`).
 
-# 2. Recolha de Dados
-print("A descarregar indicadores de desenvolvimento (mrv=40)...")
-df_social = wb.data.DataFrame(list(nivel_2_WB.keys()), countries, mrv=40, columns='series')
+# MARKDOWN ********************
 
-# 3. Limpeza e Formatação
-df_social = df_social.rename(columns=nivel_2_WB).reset_index()
+# # Tabelas para as perguntas nivel 2
+# - `world_bank.social_development_indicators`: education spending, secondary enrollment, internet use, poverty, female account ownership, digital payments and female labor force participation, from 1985.
+# - `world_bank.Fact_Social_Barriers`: school attendance, literacy, internet access, female account ownership, child mortality and life expectancy, 2010–2024. Internet use and account ownership are the same series as in `social_development_indicators`, fetched once and written under the names this table already used (`Internet_Access`, `Female_Account_Ownership`).
 
-# Transformar o ano em Inteiro
-df_social['time'] = df_social['time'].str.replace('YR', '').astype(int)
+# MARKDOWN ********************
 
-df_social = (
-    df_social
-    .rename(columns={'economy': 'Country_Code', 'time': 'Year'})
-    .sort_values(['Country_Code', 'Year'])
-    .reset_index(drop=True)
-)
+# ### (1.4.3) Conversion Factors
+# Reference table used by the Gold layer to convert `Monthly_Employee_Earnings` to constant PPP dollars: the PPP conversion factors (local currency per international dollar, for GDP and for private consumption) and the official exchange rate (local currency per U.S. dollar), one row per country and year.
+# Written to `reference_database.conversion_factors` (key `Country_Code_Iso3`).
 
-# 4. Configuração de Destino no Fabric
-schema = "world_bank"
-table_name = "social_development_indicators"
+# MARKDOWN ********************
 
-# Garantir que o esquema existe
-spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+# ### (1.5) Source Registry Ingestion
+# Every table of sections (1.3) and (1.4) is listed in **World Bank Source Registry (NB)**, one line per series with its column, unit, table, years and refresh cadence. `ingest_registry` fetches each series once and writes all the tables that are due; the others are skipped until their cadence has passed (`force_refresh = True` rewrites them all). The resolved registry is also saved to `reference_database.source_registry`.
 
-# 5. Criar Spark DataFrame e Gravar
-print(f"A gravar a tabela {schema}.{table_name} no Lakehouse...")
-df_spark = spark.createDataFrame(df_social)
+# CELL ********************
 
-df_spark.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .option("description", "Social and education indicators (Gini, Poverty, Education) sourced from World Bank") \
-    .saveAsTable(f"{schema}.{table_name}")
+save_source_registry()
 
-print(f"Dados sociais guardados com sucesso em {schema}.{table_name}")
+registry_tables = ingest_registry(force=force_refresh)
+print(f"✅ {len(registry_tables)} tabelas do registo atualizadas")
 
 # METADATA ********************
 
@@ -338,50 +167,15 @@ print(f"Dados sociais guardados com sucesso em {schema}.{table_name}")
 # META   "language_group": "synapse_pyspark"
 # META }
 
-# CELL ********************
-
-import wbgapi as wb
-import pandas as pd
-from pyspark.sql import functions as F
-
-spark.sql("DROP TABLE IF EXISTS bronze_lakehouse.world_bank.Fact_Social_Barriers")
-
-# 1. Seleção Específica de Indicadores para Barreiras Sociais
-indicadores_social = {
-    'SE.PRM.TENR': 'School_Attendance',      # Adjusted to Primary Adjusted Net Attendance/Enrollment
-    'SE.ADT.LITR.ZS': 'Literacy_Rate',
-    'IT.NET.USER.ZS': 'Internet_Access',
-    'FX.OWN.TOTL.FE.ZS': 'Female_Account_Ownership',
-    'SH.DYN.MORT': 'Child_Mortality_Rate',  
-    'SP.DYN.LE00.IN': 'Life_Expectancy'
-}
-
-# 2. Configurações de recolha (Apenas 2010 a 2024 conforme pedido)
-anos_range = range(2010, 2025)
-
-print("🚀 A recolher dados para Fact_Social_Barriers...")
-
-# 3. Extração via API
-df_raw = wb.data.DataFrame(list(indicadores_social.keys()), 'all', time=anos_range, columns='series')
-
-# 4. Transformação (Data Engineering)
-df_clean = df_raw.rename(columns=indicadores_social).reset_index()
-
-# Limpeza do Ano e Renomeação
-df_clean['time'] = df_clean['time'].str.replace('YR', '').astype(int)
-df_clean = df_clean.rename(columns={'economy': 'Country_Code', 'time': 'Year'})
-
-# 5. Conversão para Spark e Gravação
-df_spark = spark.createDataFrame(df_clean)
+# MARKDOWN ********************
 
-table_name = "bronze_lakehouse.world_bank.Fact_Social_Barriers"
+# ### (1.6) Aggregate Membership
+# Member countries of every World Bank aggregate (`WLD`, regions, income and lending groups), used in the Gold layer to recompute the benchmark aggregates from our own country data.
 
-df_spark.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(table_name)
+# CELL ********************
 
-print(f"✅ Sucesso! A tabela '{table_name}' foi criada com os 6 indicadores de 2010-2024.")
+spark.sql("CREATE SCHEMA IF NOT EXISTS world_bank")
+ingest_aggregate_membership("bronze_lakehouse.world_bank.aggregate_membership")
 
 # METADATA ********************
 
@@ -390,37 +184,33 @@ print(f"✅ Sucesso! A tabela '{table_name}' foi criada com os 6 indicadores de
 # META   "language_group": "synapse_pyspark"
 # META }
 
-# CELL ********************
-
-import wbgapi as wb
-import pandas as pd
-from pyspark.sql import functions as F
-
-# --- PASSO 1: Ingestão para a Bronze ---
-indicators = {
-    'NY.GDP.PCAP.PP.CD': 'GDP_Per_Capita',
-    'FP.CPI.TOTL.ZG': 'Inflation_CPI_Pct',
-    'NY.GDP.MKTP.KD.ZG': 'GDP_Growth_Annual_Pct'
-}
-
-print("A descarregar dados da API para a Bronze...")
-df_raw_pd = wb.data.DataFrame(list(indicators.keys()), 'all', time=range(2010, 2025), columns='series')
-df_raw_pd = df_raw_pd.rename(columns=indicators).reset_index()
-
-# Converter para Spark DataFrame
-spark_raw = spark.createDataFrame(df_raw_pd)
+# MARKDOWN ********************
 
-# Criar o Schema e a Tabela na Bronze
-spark.sql("CREATE SCHEMA IF NOT EXISTS world_bank") # Ajusta se o nome do teu Lakehouse for outro
-spark.sql("USE world_bank")
+# # (2) Long-History Backfill
+# Runs only when `run_backfill = True` (parameter cell at the top). Each indicator set is fetched from `backfill_start_year` to the current year in chunks of series × decade × economy batch and appended to a `*_history` table in long format. If the run fails, re-running the notebook resumes from the last completed chunk (see **World Bank Ingestion Engine (NB)**).
 
-# Gravar como tabela física (Isto resolve o teu erro!)
-spark_raw.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Economic_Indicators") # Se usares 3 níveis, seria catalog.schema.table
+# CELL ********************
 
-print("✅ Tabela Bronze criada com sucesso!")
+if run_backfill:
+    # Os conjuntos do backfill vêm do registo (tabelas com history_table)
+    backfill_sets = {
+        target["history_table"]: registry_indicators(table_name)
+        for table_name, target in registry_targets.items()
+        if target.get("history_table")
+    }
+
+    for table_name, indicator_set in backfill_sets.items():
+        backfill_world_bank(indicator_set, table_name, start_year=backfill_start_year)
+
+    # Exemplo: população total 1980-presente no formato largo
+    history_to_wide(
+        "world_bank.population_migration_history",
+        registry_indicators("bronze_lakehouse.world_bank.population_migration")
+    ).filter(F.col("Year") >= 1980) \
+        .select("Country_Code", "Year", "Pop_Total_Count") \
+        .show(5)
+else:
+    print("Backfill desligado (run_backfill = False).")
 
 # METADATA ********************
 
@@ -23,48 +23,36 @@
 # META   }
 # META }
 
+# MARKDOWN ********************
+
+# # Bronze to Silver Transformations
+# Each cell below registers one step with the tables it reads and writes, and the last cell runs them with **Pipeline Scheduler (NB)**. Steps that share no tables (for example `Economic_Indicators`, `unemployment_rate` and the geography patch for the countries missing from the M49 file) run at the same time, each in its own FAIR pool. Steps whose code and input tables did not change since their last run are skipped (build cache).
+
 # CELL ********************
 
-from pyspark.sql import functions as F
-from pyspark.sql.window import Window
+%run Pipeline Scheduler (NB)
 
-df_social = spark.read.table("bronze_lakehouse.world_bank.Social_Barriers")
-
-# Limpeza de Valores Impossíveis e Nulos
-# - Literacy e Internet não podem ser > 100 ou < 0
-# - Child Mortality não pode ser negativa
-df_cleaned = df_social.filter(
-    (F.col("Country_Code").isNotNull()) & 
-    (F.col("Year").isNotNull())
-).withColumn(
-    "Literacy_Rate", F.when(F.col("Literacy_Rate") > 100, 100).otherwise(F.col("Literacy_Rate"))
-).withColumn(
-    "Internet_Access", F.when(F.col("Internet_Access") > 100, 100).otherwise(F.col("Internet_Access"))
-)
+# METADATA ********************
 
-# Tratamento de Nulos (Forward Fill - Opcional mas Recomendado)
-# Como o Banco Mundial não reporta todos os anos, preenchemos o ano vazio com o valor do ano anterior
-window_spec = Window.partitionBy("Country_Code").orderBy("Year").rowsBetween(Window.unboundedPreceding, 0)
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-df_final = df_cleaned.withColumn(
-    "Literacy_Rate", F.last("Literacy_Rate", ignorenulls=True).over(window_spec)
-).withColumn(
-    "School_Attendance", F.last("School_Attendance", ignorenulls=True).over(window_spec)
-).withColumn(
-    "Female_Account_Ownership", F.last("Female_Account_Ownership", ignorenulls=True).over(window_spec)
-)
+# CELL ********************
 
-# Remover linhas onde todos os indicadores sociais estão vazios
-# (Não nos serve ter um país/ano se não sabemos nada sobre ele)
-indicadores = ["School_Attendance", "Literacy_Rate", "Internet_Access", 
-               "Female_Account_Ownership", "Child_Mortality_Rate", "Life_Expectancy"]
+%run Data Lineage (NB)
 
-df_final = df_final.na.drop(subset=indicadores, how='all')
+# METADATA ********************
 
-# 5. Guardar a tabela limpa
-df_final.write.format("delta").mode("overwrite").saveAsTable("bronze_lakehouse.world_bank.Social_Barriers")
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-print("✅ Limpeza concluída! Tabela 'Social_Barriers' pronta.")
+# CELL ********************
+
+%run Country Code Crosswalk (NB)
 
 # METADATA ********************
 
@@ -76,38 +64,51 @@ print("✅ Limpeza concluída! Tabela 'Social_Barriers' pronta.")
 # CELL ********************
 
 from pyspark.sql import functions as F
+from pyspark.sql.window import Window
 
-# 1. Carregar as duas tabelas
-# Nota: Ajusta os nomes se os nomes das tabelas no catálogo forem diferentes
-df_social = spark.read.table("bronze_lakehouse.world_bank.Social_Barriers")
-df_mpi = spark.read.table("silver_lakehouse.dbo.MPI")
-
-# 2. Realizar o Join
-# Usamos "left" para manter todos os dados da Social_Barriers, 
-# mesmo que não haja um MPI correspondente para aquele país/ano.
-df_social_silver = df_social.join(
-    df_mpi, 
-    (df_social.Country_Code == df_mpi.Country_Code_Iso3) & (df_social.Year == df_mpi.Year), 
-    "left"
-)
 
-# 3. Limpeza pós-join
-# Como o join cria colunas duplicadas (Country_Code e Year), vamos selecionar apenas as que interessam
-# e remover a coluna redundante do MPI
-df_social_silver = df_social_silver.select(
-    df_social["*"],          # Mantém todas as colunas da tabela social (incluindo Country_Code e Year)
-    df_mpi["MPI"]            # Adiciona apenas a coluna do valor do MPI
+@step(
+    inputs=["bronze_lakehouse.world_bank.Social_Barriers"],
+    outputs=["bronze_lakehouse.world_bank.Social_Barriers"],
+    extra=code_fingerprint(forward_fill_with_mask)
 )
+def clean_social_barriers():
+    df_social = spark.read.table("bronze_lakehouse.world_bank.Social_Barriers")
+
+    # Limpeza de Valores Impossíveis e Nulos
+    # - Literacy e Internet não podem ser > 100 ou < 0
+    # - Child Mortality não pode ser negativa
+    df_cleaned = df_social.filter(
+        (F.col("Country_Code").isNotNull()) & 
+        (F.col("Year").isNotNull())
+    ).withColumn(
+        "Literacy_Rate", F.when(F.col("Literacy_Rate") > 100, 100).otherwise(F.col("Literacy_Rate"))
+    ).withColumn(
+        "Internet_Access", F.when(F.col("Internet_Access") > 100, 100).otherwise(F.col("Internet_Access"))
+    )
+
+    # Tratamento de Nulos (Forward Fill - Opcional mas Recomendado)
+    # Como o Banco Mundial não reporta todos os anos, preenchemos o ano vazio com o valor do ano anterior
+    # Os valores preenchidos ficam marcados na coluna Imputed_Mask (ver Data Lineage (NB))
+    window_spec = Window.partitionBy("Country_Code").orderBy("Year").rowsBetween(Window.unboundedPreceding, 0)
+
+    df_final = forward_fill_with_mask(
+        df_cleaned,
+        ["Literacy_Rate", "School_Attendance", "Female_Account_Ownership"],
+        window_spec
+    )
 
-# 4. Guardar na Camada Silver
-table_name_silver = "silver_lakehouse.dbo.Social_Barriers"
+    # Remover linhas onde todos os indicadores sociais estão vazios
+    # (Não nos serve ter um país/ano se não sabemos nada sobre ele)
+    indicadores = ["School_Attendance", "Literacy_Rate", "Internet_Access", 
+                   "Female_Account_Ownership", "Child_Mortality_Rate", "Life_Expectancy"]
 
-df_social_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(table_name_silver)
+    df_final = df_final.na.drop(subset=indicadores, how='all')
 
-print(f"✅ Sucesso! A tabela '{table_name_silver}' foi criada com o MPI integrado.")
+    # 5. Guardar a tabela limpa
+    df_final.write.format("delta").mode("overwrite").option("overwriteSchema", "true").saveAsTable("bronze_lakehouse.world_bank.Social_Barriers")
+
+    print("✅ Limpeza concluída! Tabela 'Social_Barriers' pronta.")
 
 # METADATA ********************
 
@@ -120,48 +121,46 @@ print(f"✅ Sucesso! A tabela '{table_name_silver}' foi criada com o MPI integra
 
 from pyspark.sql import functions as F
 
-# 1. Carregar as tabelas originais da Silver
-# Nota: Certifica-te que os caminhos dos nomes das tabelas estão corretos no teu novo Lakehouse
-df_fact = spark.read.table("silver_lakehouse.dbo.Social_Barriers")
-df_geo = spark.read.table("silver_lakehouse.dbo.geography")
-
-# --- PASSO A: ISOLAR AGREGADOS (WLD, SSA, HIC, etc.) ---
-# Usamos a condição explícita porque os nomes das colunas diferem entre as tabelas
-df_aggregates = df_fact.join(
-    df_geo, 
-    df_fact.Country_Code == df_geo.Country_Code_Iso3, 
-    "left_anti"
+
+@step(
+    inputs=[
+        "bronze_lakehouse.world_bank.Social_Barriers",
+        "silver_lakehouse.dbo.MPI"
+    ],
+    outputs=["silver_lakehouse.dbo.Social_Barriers"]
 )
+def social_barriers_with_mpi():
+    # 1. Carregar as duas tabelas
+    # Nota: Ajusta os nomes se os nomes das tabelas no catálogo forem diferentes
+    df_social = spark.read.table("bronze_lakehouse.world_bank.Social_Barriers")
+    df_mpi = spark.read.table("silver_lakehouse.dbo.MPI")
+
+    # 2. Realizar o Join
+    # Usamos "left" para manter todos os dados da Social_Barriers, 
+    # mesmo que não haja um MPI correspondente para aquele país/ano.
+    df_social_silver = df_social.join(
+        df_mpi, 
+        (df_social.Country_Code == df_mpi.Country_Code_Iso3) & (df_social.Year == df_mpi.Year), 
+        "left"
+    )
+
+    # 3. Limpeza pós-join
+    # Como o join cria colunas duplicadas (Country_Code e Year), vamos selecionar apenas as que interessam
+    # e remover a coluna redundante do MPI
+    df_social_silver = df_social_silver.select(
+        df_social["*"],          # Mantém todas as colunas da tabela social (incluindo Country_Code e Year)
+        df_mpi["MPI"]            # Adiciona apenas a coluna do valor do MPI
+    )
+
+    # 4. Guardar na Camada Silver
+    table_name_silver = "silver_lakehouse.dbo.Social_Barriers"
 
-# Gravar a tabela de Benchmarks/Agregados (Regiões e Grupos Económicos)
-df_aggregates.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.Global_Social_Barriers")
-
-# --- PASSO B: ISOLAR PAÍSES REAIS ---
-# 1. Fazemos o inner join para filtrar apenas o que é país real
-# 2. Renomeamos logo a coluna para manter o padrão ISO3 na Gold
-df_fact_countries = df_fact.join(
-    df_geo.select("Country_Code_Iso3"), 
-    df_fact.Country_Code == df_geo.Country_Code_Iso3, 
-    how="inner"
-).drop(df_geo.Country_Code_Iso3) # Removemos a duplicada do join
-
-# Padronizar o nome da coluna para a Gold
-df_fact_countries = df_fact_countries.withColumnRenamed("Country_Code", "Country_Code_Iso3")
-
-# Gravar a tabela de Factos principal (a que vais usar nos Mapas do Power BI)
-df_fact_countries.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.Countries_Social_Barriers")
-
-# --- PASSO C: DIAGNÓSTICO FINAL ---
-print("🚀 Processo de Separação Concluído com Sucesso!")
-print(f"📊 Registos Totais Originais: {df_fact.count()}")
-print(f"🌍 Registos na Countries (Países): {df_fact_countries.count()}")
-print(f"📈 Registos na Aggregates (Regiões/Mundo): {df_aggregates.count()}")
+    df_social_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(table_name_silver)
+
+    print(f"✅ Sucesso! A tabela '{table_name_silver}' foi criada com o MPI integrado.")
 
 # METADATA ********************
 
@@ -174,16 +173,60 @@ print(f"📈 Registos na Aggregates (Regiões/Mundo): {df_aggregates.count()}")
 
 from pyspark.sql import functions as F
 
-# Carregar, filtrar e sobrescrever a tabela Silver
-df_silver_clean = spark.read.table("silver_lakehouse.dbo.Global_Social_Barriers") \
-    .filter(F.col("Country_Code") != "XKX")
 
-df_silver_clean.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.Global_Social_Barriers")
+@step(
+    inputs=[
+        "silver_lakehouse.dbo.Social_Barriers",
+        "silver_lakehouse.dbo.Geography"
+    ],
+    outputs=[
+        "silver_lakehouse.dbo.Global_Social_Barriers",
+        "silver_lakehouse.dbo.Countries_Social_Barriers"
+    ]
+)
+def split_social_barriers():
+    # 1. Carregar as tabelas originais da Silver
+    # Nota: Certifica-te que os caminhos dos nomes das tabelas estão corretos no teu novo Lakehouse
+    df_fact = spark.read.table("silver_lakehouse.dbo.Social_Barriers")
+    df_geo = spark.read.table("silver_lakehouse.dbo.geography")
+
+    # --- PASSO A: ISOLAR AGREGADOS (WLD, SSA, HIC, etc.) ---
+    # Usamos a condição explícita porque os nomes das colunas diferem entre as tabelas
+    df_aggregates = df_fact.join(
+        df_geo, 
+        df_fact.Country_Code == df_geo.Country_Code_Iso3, 
+        "left_anti"
+    )
 
-print("🗑️ Kosovo (XKX) removido da tabela Silver com sucesso!")
+    # Gravar a tabela de Benchmarks/Agregados (Regiões e Grupos Económicos)
+    df_aggregates.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.Global_Social_Barriers")
+
+    # --- PASSO B: ISOLAR PAÍSES REAIS ---
+    # 1. Fazemos o inner join para filtrar apenas o que é país real
+    # 2. Renomeamos logo a coluna para manter o padrão ISO3 na Gold
+    df_fact_countries = df_fact.join(
+        df_geo.select("Country_Code_Iso3"), 
+        df_fact.Country_Code == df_geo.Country_Code_Iso3, 
+        how="inner"
+    ).drop(df_geo.Country_Code_Iso3) # Removemos a duplicada do join
+
+    # Padronizar o nome da coluna para a Gold
+    df_fact_countries = df_fact_countries.withColumnRenamed("Country_Code", "Country_Code_Iso3")
+
+    # Gravar a tabela de Factos principal (a que vais usar nos Mapas do Power BI)
+    df_fact_countries.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.Countries_Social_Barriers")
+
+    # --- PASSO C: DIAGNÓSTICO FINAL ---
+    print("🚀 Processo de Separação Concluído com Sucesso!")
+    print(f"📊 Registos Totais Originais: {df_fact.count()}")
+    print(f"🌍 Registos na Countries (Países): {df_fact_countries.count()}")
+    print(f"📈 Registos na Aggregates (Regiões/Mundo): {df_aggregates.count()}")
 
 # METADATA ********************
 
@@ -196,24 +239,22 @@ print("🗑️ Kosovo (XKX) removido da tabela Silver com sucesso!")
 
 from pyspark.sql import functions as F
 
-# 1. Ler a tabela da Bronze
-df_econ_raw = spark.read.table("Bronze_LakeHouse.world_bank.Economic_Indicators")
 
-# 2. Seleção estratégica e limpeza
-df_econ_silver = df_econ_raw.select(
-    F.col("economy").alias("Country_Code_Iso3"),
-    F.regexp_replace(F.col("time"), "YR", "").cast("int").alias("Year"),
-    F.col("GDP_Per_Capita").cast("double"),
-    F.col("Inflation_CPI_Pct").cast("double"),
-    F.col("GDP_Growth_Annual_Pct").cast("double").alias("GDP_Annual_Growth_Pct")
-).filter(F.col("Year") >= 2010)
+@step(
+    inputs=["silver_lakehouse.dbo.Global_Social_Barriers"],
+    outputs=["silver_lakehouse.dbo.Global_Social_Barriers"]
+)
+def remove_kosovo_from_benchmarks():
+    # Carregar, filtrar e sobrescrever a tabela Silver
+    df_silver_clean = spark.read.table("silver_lakehouse.dbo.Global_Social_Barriers") \
+        .filter(F.col("Country_Code") != "XKX")
 
-df_econ_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("Silver_LakeHouse.dbo.Economic_Indicators")
+    df_silver_clean.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.Global_Social_Barriers")
 
-print("🚀 Sucesso! Tabela Silver criada com as colunas renomeadas e limpas.")
+    print("🗑️ Kosovo (XKX) removido da tabela Silver com sucesso!")
 
 # METADATA ********************
 
@@ -226,34 +267,30 @@ print("🚀 Sucesso! Tabela Silver criada com as colunas renomeadas e limpas.")
 
 from pyspark.sql import functions as F
 
-# 1. Criar o DataFrame base
-anos = spark.createDataFrame([(y,) for y in range(2010, 2025)], ["Year"])
 
-# 2. Aplicar as transformações e forçar o tipo Integer no Year
-dim_date = anos.withColumn("Year", F.col("Year").cast("int")) \
-    .withColumn(
-        "Decade", 
-        F.concat((F.floor(F.col("Year") / 10) * 10).cast("string"), F.lit("s"))
-    ).withColumn(
-        "Economic_Context",
-        F.when(F.col("Year") <= 2012, "Post-2008 Financial Crisis Recovery")
-         .when((F.col("Year") >= 2013) & (F.col("Year") <= 2019), "Global Growth Period")
-         .when((F.col("Year") >= 2020) & (F.col("Year") <= 2022), "COVID-19 Impact")
-         .otherwise("Post-Pandemic Recovery")
-    ).withColumn(
-        "Global_Goals",
-        F.when(F.col("Year") < 2015, "Millennium Development Goals (MDGs)")
-         .otherwise("Sustainable Development Goals (SDGs)")
-    )
-
-# 3. Gravar na Silver
-dim_date.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.Dim_Date")
-
-print("✅ Dim_Date atualizada! O campo 'Year' agora é Integer.")
-dim_date.printSchema()
+@step(
+    inputs=["bronze_lakehouse.world_bank.Economic_Indicators"],
+    outputs=["silver_lakehouse.dbo.Economic_Indicators"]
+)
+def economic_indicators_silver():
+    # 1. Ler a tabela da Bronze
+    df_econ_raw = spark.read.table("Bronze_LakeHouse.world_bank.Economic_Indicators")
+
+    # 2. Seleção estratégica e limpeza
+    df_econ_silver = df_econ_raw.select(
+        F.col("Country_Code").alias("Country_Code_Iso3"),
+        F.col("Year").cast("int"),
+        F.col("GDP_Per_Capita").cast("double"),
+        F.col("Inflation_CPI_Pct").cast("double"),
+        F.col("GDP_Growth_Annual_Pct").cast("double").alias("GDP_Annual_Growth_Pct")
+    ).filter(F.col("Year") >= 2010)
+
+    df_econ_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("Silver_LakeHouse.dbo.Economic_Indicators")
+
+    print("🚀 Sucesso! Tabela Silver criada com as colunas renomeadas e limpas.")
 
 # METADATA ********************
 
@@ -262,38 +299,158 @@ dim_date.printSchema()
 # META   "language_group": "synapse_pyspark"
 # META }
 
+# MARKDOWN ********************
+
+# ## Dim_Date
+# `Dim_Date` is generated from the era table `silver_lakehouse.dbo.Date_Eras`, one row per `(Attribute, Label, Start_Year, End_Year)` (a null year leaves that side open). Each `Attribute` becomes a column of the dimension (`Economic_Context`, `Global_Goals`) and each year gets the label of the era that contains it. A new era or a new attribute is one more entry in `date_eras`, with no code change.
+#
+# The years go from the first to the last year found in the Silver tables of `date_year_sources` (not before `date_first_year`, because the WID income shares go back to the 19th century), and never fewer than the years already in the table. The table is written with `append_new_keys`: a run that only adds years appends the new rows, so the Direct Lake model does not reload the dimension. Changing a label of an existing year rewrites it.
+
 # CELL ********************
 
 from pyspark.sql import functions as F
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType
 
-# 1. Carregar a Geografia atual e remover a coluna 'sub_region_name' extra
-# (O erro mostrou que tens 'sub-region_name' e 'sub_region_name', vamos manter apenas a correta)
-df_geo_current = spark.read.table("silver_lakehouse.dbo.Geography").drop("sub_region_name")
+# Eras de cada atributo do Dim_Date: (Attribute, Label, Start_Year, End_Year), None = sem limite
+date_eras = [
+    ("Economic_Context", "Late Cold War Era", None, 1989),
+    ("Economic_Context", "Post-Cold War Globalization", 1990, 1999),
+    ("Economic_Context", "Pre-2008 Expansion", 2000, 2007),
+    ("Economic_Context", "2008 Global Financial Crisis", 2008, 2009),
+    ("Economic_Context", "Post-2008 Financial Crisis Recovery", 2010, 2012),
+    ("Economic_Context", "Global Growth Period", 2013, 2019),
+    ("Economic_Context", "COVID-19 Impact", 2020, 2022),
+    ("Economic_Context", "Post-Pandemic Recovery", 2023, None),
+    ("Global_Goals", "Pre-Millennium Declaration", None, 1999),
+    ("Global_Goals", "Millennium Development Goals (MDGs)", 2000, 2014),
+    ("Global_Goals", "Sustainable Development Goals (SDGs)", 2015, None)
+]
+
+# Tabelas da Silver com Year que definem o intervalo de anos do Dim_Date
+date_year_sources = [
+    "silver_lakehouse.dbo.Social_Barriers",
+    "silver_lakehouse.dbo.Economic_Indicators",
+    "silver_lakehouse.dbo.unemployment_rate",
+    "silver_lakehouse.dbo.income_share",
+    "silver_lakehouse.dbo.hdi",
+    "silver_lakehouse.dbo.un_gini_index",
+    "silver_lakehouse.dbo.un_monthly_employee_earnings"
+]
+date_first_year = 1960
+
+
+@step(
+    inputs=[],
+    outputs=["silver_lakehouse.dbo.Date_Eras"],
+    extra=repr(date_eras)
+)
+def date_eras_silver():
+    df_eras = spark.createDataFrame(date_eras, "Attribute string, Label string, Start_Year int, End_Year int")
+
+    # Duas eras do mesmo atributo não se podem sobrepor
+    a, b = df_eras.alias("a"), df_eras.alias("b")
+    overlaps = a.join(b, (F.col("a.Attribute") == F.col("b.Attribute")) & (F.col("a.Label") < F.col("b.Label"))) \
+        .filter(
+            (F.coalesce(F.col("a.Start_Year"), F.lit(-9999)) <= F.coalesce(F.col("b.End_Year"), F.lit(9999)))
+            & (F.coalesce(F.col("b.Start_Year"), F.lit(-9999)) <= F.coalesce(F.col("a.End_Year"), F.lit(9999)))
+        ).select("a.Attribute", "a.Label", "b.Label").collect()
+    if overlaps:
+        raise ValueError(f"Eras sobrepostas em date_eras: {[tuple(r) for r in overlaps]}")
+
+    df_eras.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.Date_Eras")
+
+
+def fact_year_range(sources=date_year_sources, first_year=date_first_year):
+    """(primeiro, último) ano das tabelas de origem que existem, incluindo os anos já no Dim_Date."""
+    tables = [t for t in sources + ["silver_lakehouse.dbo.Dim_Date"] if spark.catalog.tableExists(t)]
+    bounds = [
+        spark.read.table(t).agg(F.min(F.col("Year").cast("int")), F.max(F.col("Year").cast("int"))).collect()[0]
+        for t in tables
+    ]
+    bounds = [(lo, hi) for lo, hi in bounds if lo is not None]
+    if not bounds:
+        raise ValueError(f"Nenhuma tabela com anos em {sources}")
+    return max(min(lo for lo, _ in bounds), first_year), max(hi for _, hi in bounds)
+
+
+def build_dim_date(first_year, last_year, df_eras):
+    """Uma linha por ano com a década e uma coluna por atributo das eras."""
+    attributes = [r["Attribute"] for r in df_eras.select("Attribute").distinct().orderBy("Attribute").collect()]
+    years = spark.range(first_year, last_year + 1).select(F.col("id").cast("int").alias("Year"))
+
+    in_era = (F.col("Year") >= F.coalesce(F.col("Start_Year"), F.col("Year"))) \
+        & (F.col("Year") <= F.coalesce(F.col("End_Year"), F.col("Year")))
+    labels = years.join(F.broadcast(df_eras), in_era) \
+        .groupBy("Year") \
+        .pivot("Attribute", attributes) \
+        .agg(F.first("Label"))
+
+    return years.join(labels, "Year", "left") \
+        .select(
+            "Year",
+            F.concat((F.floor(F.col("Year") / 10) * 10).cast("string"), F.lit("s")).alias("Decade"),
+            *attributes
+        ).orderBy("Year")
+
+
+@step(
+    inputs=["silver_lakehouse.dbo.Date_Eras"] + date_year_sources,
+    outputs=["silver_lakehouse.dbo.Dim_Date"],
+    extra=code_fingerprint(fact_year_range) + code_fingerprint(build_dim_date) + repr(date_first_year)
+)
+def dim_date_silver():
+    first_year, last_year = fact_year_range()
+    dim_date = build_dim_date(first_year, last_year, spark.read.table("silver_lakehouse.dbo.Date_Eras"))
 
-# 2. Criar o DataFrame de Taiwan SEM a coluna extra
-schema_geo = StructType([
-    StructField("region_name", StringType(), True),
-    StructField("sub-region_name", StringType(), True),
-    StructField("intermediate_region_name", StringType(), True),
-    StructField("country_or_area", StringType(), True),
-    StructField("Country_Code_Numeric", IntegerType(), True),
-    StructField("Country_Code_Iso2", StringType(), True),
-    StructField("Country_Code_Iso3", StringType(), True)
-])
+    # Só os anos novos são acrescentados; a tabela só é reescrita se um rótulo existente mudar
+    append_new_keys(dim_date, "silver_lakehouse.dbo.Dim_Date", ["Year"])
 
-twn_data = [("Asia", "Eastern Asia", "Eastern Asia", "Taiwan", 158, "TW", "TWN")]
-df_twn = spark.createDataFrame(twn_data, schema=schema_geo)
+    print(f"✅ Dim_Date de {first_year} a {last_year}")
 
-# 3. Unir e Gravar (Overwrite) para limpar o modelo da Silver
-df_geo_final = df_geo_current.union(df_twn).distinct()
+# METADATA ********************
 
-df_geo_final.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable("silver_lakehouse.dbo.Geography")
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
 
-print("✅ Coluna extra removida e Taiwan adicionado à Silver.")
+# CELL ********************
+
+from pyspark.sql import functions as F
+
+
+@step(
+    inputs=["silver_lakehouse.dbo.Geography"],
+    outputs=["silver_lakehouse.dbo.Geography"],
+    extra=code_fingerprint(with_extra_countries) + repr(extra_countries)
+)
+def add_extra_countries_to_geography():
+    # 1. Carregar a Geografia atual e remover a coluna 'sub_region_name' extra
+    # (O erro mostrou que tens 'sub-region_name' e 'sub_region_name', vamos manter apenas a correta)
+    df_geo_current = spark.read.table("silver_lakehouse.dbo.Geography")
+    if "sub_region_name" in df_geo_current.columns:
+        df_geo_clean = df_geo_current.drop("sub_region_name")
+    else:
+        df_geo_clean = df_geo_current
+
+    # 2. Os países que faltam no ficheiro M49 (Taiwan, 158) já entram na Bronze pelo crosswalk;
+    # aqui só são acrescentados se a Silver tiver sido gerada a partir de uma Bronze anterior
+    df_geo_final = with_extra_countries(df_geo_clean, silver_geography_names)
+
+    # Já corrigida: não reescrever (mantém a versão Delta e a cache válidas)
+    if df_geo_final is df_geo_current:
+        print("✅ A Silver já tem todos os países do crosswalk, nada a fazer.")
+        return
+
+    # 3. Gravar (Overwrite) para limpar o modelo da Silver
+    df_geo_final.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable("silver_lakehouse.dbo.Geography")
+
+    print("✅ Coluna extra removida e países em falta adicionados à Silver.")
 
 # METADATA ********************
 
@@ -306,35 +463,53 @@ print("✅ Coluna extra removida e Taiwan adicionado à Silver.")
 
 from pyspark.sql import functions as F
 
-df_bronze = spark.read.table("world_bank.unemployment")
 
+@step(
+    inputs=["bronze_lakehouse.world_bank.Unemployment"],
+    outputs=["silver_lakehouse.dbo.unemployment_rate"]
+)
+def unemployment_rate_silver():
+    df_bronze = spark.read.table("world_bank.unemployment")
+
+
+    df_silver = df_bronze.select(
+        F.col("country_code_iso3"),
+        F.col("Year"),
+        F.round("Unemployment_Total", 2).alias("Unemployment_Total"),
+        F.round("Unemployment_Female", 2).alias("Unemployment_Female"),
+        F.round("Unemployment_Male", 2).alias("Unemployment_Male")
+    ).dropna(how='all', subset=['Unemployment_Total', 'Unemployment_Female', 'Unemployment_Male'])
+
+    df_silver = df_silver.dropDuplicates(['country_code_iso3', 'Year'])
 
-df_silver = df_bronze.select(
-    F.col("country_code_iso3"),
-    F.col("Year"),
-    F.round("Unemployment_Total", 2).alias("Unemployment_Total"),
-    F.round("Unemployment_Female", 2).alias("Unemployment_Female"),
-    F.round("Unemployment_Male", 2).alias("Unemployment_Male")
-).dropna(how='all', subset=['Unemployment_Total', 'Unemployment_Female', 'Unemployment_Male'])
+    catalog_name = "silver_lakehouse"
+    dbo_schema = "dbo"
+    table_name = "unemployment_rate"
+    full_path = f"{catalog_name}.{dbo_schema}.{table_name}"
 
-df_silver = df_silver.dropDuplicates(['country_code_iso3', 'Year'])
+    print(f"🚀 A gravar dados arredondados em {full_path}...")
 
-catalog_name = "silver_lakehouse"
-dbo_schema = "dbo"
-table_name = "unemployment_rate"
-full_path = f"{catalog_name}.{dbo_schema}.{table_name}"
+    spark.sql(f"CREATE SCHEMA IF NOT EXISTS {catalog_name}.{dbo_schema}")
 
-print(f"🚀 A gravar dados arredondados em {full_path}...")
+    df_silver.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .saveAsTable(full_path)
 
-spark.sql(f"CREATE SCHEMA IF NOT EXISTS {catalog_name}.{dbo_schema}")
+    print("✅ Processo concluído com arredondamento!")
+    df_silver.select("country_code_iso3", "Year", "Unemployment_Total").show(5)
 
-df_silver.write.format("delta") \
-    .mode("overwrite") \
-    .option("overwriteSchema", "true") \
-    .saveAsTable(full_path)
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
 
-print("✅ Processo concluído com arredondamento!")
-df_silver.select("country_code_iso3", "Year", "Unemployment_Total").show(5)
+describe_dag(pipeline_steps)
+run_steps(pipeline_steps, cache=True, scope="world_bank_silver")
 
 # METADATA ********************
 
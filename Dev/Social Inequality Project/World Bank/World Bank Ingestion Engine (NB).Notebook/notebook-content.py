@@ -0,0 +1,771 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {
+# META     "lakehouse": {
+# META       "default_lakehouse": "83e7b47e-7c74-45e9-a96b-b66ae0bf51aa",
+# META       "default_lakehouse_name": "Bronze_LakeHouse",
+# META       "default_lakehouse_workspace_id": "32338175-e0e6-4c7a-b3cf-225d1b46c410",
+# META       "known_lakehouses": [
+# META         {
+# META           "id": "83e7b47e-7c74-45e9-a96b-b66ae0bf51aa"
+# META         }
+# META       ]
+# META     }
+# META   }
+# META }
+
+# MARKDOWN ********************
+
+# # (1) World Bank Ingestion Engine
+# Shared functions used by **World Bank Data Gathering (NB)** through `%run`. This notebook only defines functions, it does not read or write any table by itself.
+#
+# The ingestion path does not build pandas DataFrames from the API:
+# 1. `iter_world_bank_rows` pages through the API results as a generator (`wb.data.fetch`), with the year already numeric.
+# 2. `iter_record_batches` packs the rows into `pyarrow.RecordBatch`es with the explicit `wb_long_schema` (`Year` is `int16`).
+# 3. `batches_to_spark` hands each batch to Spark as it arrives (`arrow_to_spark`: Arrow enabled and an explicit schema, so there is no row-by-row serialization or schema inference) and unions the chunks. The Python side never holds more than one batch; the batches already sent stay in the JVM driver, in Arrow format, until the table is written.
+# 4. `pivot_series` turns the long table into the wide Bronze layout (one column per indicator) in a single `groupBy().pivot()` with explicit pivot values. The `economy` codes go through the `wb` scheme of **Country Code Crosswalk (NB)**, so the Bronze key is the same ISO3 code as in the UN and OWID tables (aggregates such as `WLD` are kept as they are).
+#
+# The HTTP calls made by `wbgapi` go through the transport in section (3) (rate limiting, retries and circuit breaker).
+
+# CELL ********************
+
+%run Country Code Crosswalk (NB)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# CELL ********************
+
+import pyarrow as pa
+import wbgapi as wb
+from pyspark.sql import functions as F
+from pyspark.sql.types import StructType, StructField, StringType, ShortType, DoubleType
+
+# Esquema longo (uma linha por país/série/ano), igual em Arrow e em Spark
+wb_long_schema = pa.schema([
+    ("Country_Code", pa.string()),
+    ("Series_Code", pa.string()),
+    ("Year", pa.int16()),
+    ("Value", pa.float64())
+])
+
+wb_long_spark_schema = StructType([
+    StructField("Country_Code", StringType(), True),
+    StructField("Series_Code", StringType(), True),
+    StructField("Year", ShortType(), True),
+    StructField("Value", DoubleType(), True)
+])
+
+
+def iter_world_bank_rows(series, economy="all", time="all", mrv=None):
+    """Gerador de linhas da API do Banco Mundial (a paginação é feita pelo wbgapi)."""
+    for row in wb.data.fetch(series, economy, time=time, mrv=mrv, numericTimeKeys=True):
+        yield row["economy"], row["series"], row["time"], row["value"]
+
+
+def iter_record_batches(rows, batch_size=50000):
+    """Agrupa as linhas em RecordBatches Arrow com o esquema explícito, sem passar por pandas."""
+    columns = ([], [], [], [])
+    for row in rows:
+        for buffer, value in zip(columns, row):
+            buffer.append(value)
+        if len(columns[0]) >= batch_size:
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(buffer, type=field.type) for buffer, field in zip(columns, wb_long_schema)],
+                schema=wb_long_schema
+            )
+            columns = ([], [], [], [])
+    if columns[0]:
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(buffer, type=field.type) for buffer, field in zip(columns, wb_long_schema)],
+            schema=wb_long_schema
+        )
+
+
+def arrow_to_spark(table):
+    """Entrega uma tabela Arrow ao Spark através do Arrow (sem inferência de esquema)."""
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    if int(spark.version.split(".")[0]) >= 4:
+        # Spark 4 aceita tabelas Arrow diretamente
+        return spark.createDataFrame(table, schema=wb_long_spark_schema)
+    # Spark 3.x: a conversão para pandas reutiliza os buffers Arrow e o envio para a JVM é feito em Arrow
+    return spark.createDataFrame(table.to_pandas(), schema=wb_long_spark_schema)
+
+
+def batches_to_spark(batches):
+    """(DataFrame, linhas, bytes) a partir dos RecordBatches, entregues ao Spark um a um.
+
+    No Python só um lote (batch_size linhas) está em memória de cada vez; o driver JVM guarda os lotes já
+    enviados em formato Arrow até à escrita, sem a cópia para uma tabela Arrow única nem para pandas.
+    """
+    df, rows, size = None, 0, 0
+    for batch in batches:
+        part = arrow_to_spark(pa.Table.from_batches([batch], schema=wb_long_schema))
+        df = part if df is None else df.unionByName(part)
+        rows += batch.num_rows
+        size += batch.nbytes
+    if df is None:
+        df = spark.createDataFrame([], wb_long_spark_schema)
+    return df, rows, size
+
+
+def pivot_series(df_long, indicators, key_name="Country_Code"):
+    """Passa do formato longo para o formato largo da Bronze (uma coluna por indicador)."""
+    df_wide = df_long.groupBy("Country_Code", "Year") \
+        .pivot("Series_Code", list(indicators.keys())) \
+        .agg(F.first("Value"))
+
+    return df_wide.select(
+        code_map_expr("Country_Code", "wb", keep_unmapped=True).alias(key_name),
+        F.col("Year"),
+        *[F.col(f"`{code}`").alias(name) for code, name in indicators.items()]
+    )
+
+
+def fetch_world_bank(indicators, time="all", mrv=None, economy="all", key_name="Country_Code"):
+    """Descarrega os indicadores pedidos e devolve um DataFrame Spark no formato largo."""
+    batches = iter_record_batches(iter_world_bank_rows(list(indicators.keys()), economy, time, mrv))
+    df_long, rows, size = batches_to_spark(batches)
+    print(f"📥 {rows} linhas recebidas da API ({size / 1024:.0f} KB em Arrow)")
+
+    return pivot_series(df_long, indicators, key_name)
+
+
+def save_wide(df_wide, table_name, key_name="Country_Code", description=None):
+    """Grava uma tabela no formato largo como tabela Delta na Bronze (substitui a anterior)."""
+    df_wide = df_wide.orderBy(key_name, "Year")
+
+    writer = df_wide.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true")
+    if description:
+        writer = writer.option("description", description)
+    writer.saveAsTable(table_name)
+    return df_wide
+
+
+def ingest_world_bank(indicators, table_name, time="all", mrv=None, key_name="Country_Code", description=None):
+    """Descarrega os indicadores e grava-os como tabela Delta na Bronze."""
+    df_wide = fetch_world_bank(indicators, time=time, mrv=mrv, key_name=key_name)
+    df_wide = save_wide(df_wide, table_name, key_name, description)
+
+    print(f"✅ {table_name} gravada ({len(indicators)} indicadores)")
+    print(f"📊 API: {http_client.latency_summary()}")
+    save_request_metrics(http_client, table_name)
+    return df_wide
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (2) Long-History Backfill Mode
+# Fetching 1960–present for all ~260 economies in one request can time out, so `backfill_world_bank` splits the request space into chunks of **series × decade × economy batch**:
+# - Every chunk is appended to a long-format Bronze table partitioned by `Series_Code` and `Decade` (append-only, nothing is overwritten).
+# - Completed chunks are checkpointed in `world_bank.backfill_manifest`. Re-running the same backfill after a failure skips them and resumes with the next chunk.
+# - The appends use Delta idempotent writes (`txnAppId`/`txnVersion`), so a chunk that was written just before a failure, but not yet checkpointed, is not duplicated on resume.
+#
+# `history_to_wide` rebuilds the usual wide layout (one column per indicator) from the long table.
+
+# CELL ********************
+
+import hashlib
+from datetime import datetime, timezone
+
+backfill_manifest_table = "world_bank.backfill_manifest"
+
+
+def plan_backfill_chunks(series, start_year=1960, end_year=None, economy_batch_size=50):
+    """Divide o pedido em blocos série × década × lote de economias (ordem determinística)."""
+    end_year = end_year or datetime.now(timezone.utc).year
+    economies = sorted(row["id"] for row in wb.economy.list())
+    batches = [economies[i:i + economy_batch_size] for i in range(0, len(economies), economy_batch_size)]
+
+    chunks = []
+    for code in series:
+        for decade in range(start_year - start_year % 10, end_year + 1, 10):
+            years = range(max(decade, start_year), min(decade + 9, end_year) + 1)
+            for batch in batches:
+                batch_hash = hashlib.sha1(";".join(batch).encode()).hexdigest()[:8]
+                chunks.append({
+                    "Chunk_Id": f"{code}|{decade}|{batch_hash}",
+                    "Series_Code": code,
+                    "Decade": decade,
+                    "Years": years,
+                    "Economies": batch
+                })
+    return chunks
+
+
+def completed_chunks(backfill_name):
+    if not spark.catalog.tableExists(backfill_manifest_table):
+        return set()
+    return {
+        row["Chunk_Id"] for row in spark.read.table(backfill_manifest_table)
+        .filter(F.col("Backfill_Name") == backfill_name)
+        .select("Chunk_Id").collect()
+    }
+
+
+def backfill_world_bank(indicators, table_name, start_year=1960, end_year=None, economy_batch_size=50, backfill_name=None):
+    """Backfill retomável: cada bloco é acrescentado à tabela longa e registado no manifesto."""
+    chunks = plan_backfill_chunks(list(indicators.keys()), start_year, end_year, economy_batch_size)
+
+    # O plano faz parte da identidade do backfill: se a lista de economias mudar, começa um novo
+    plan_hash = hashlib.sha1("".join(c["Chunk_Id"] for c in chunks).encode()).hexdigest()[:8]
+    backfill_name = backfill_name or f"{table_name}|{plan_hash}"
+    done = completed_chunks(backfill_name)
+
+    print(f"🚀 Backfill '{backfill_name}': {len(chunks)} blocos, {len(done)} já concluídos")
+
+    for version, chunk in enumerate(chunks):
+        if chunk["Chunk_Id"] in done:
+            continue
+
+        rows = iter_world_bank_rows([chunk["Series_Code"]], chunk["Economies"], chunk["Years"])
+        table = pa.Table.from_batches(iter_record_batches(rows), schema=wb_long_schema)
+
+        df_chunk = arrow_to_spark(table) \
+            .withColumn("Decade", F.lit(chunk["Decade"]).cast("short")) \
+            .withColumn("Chunk_Id", F.lit(chunk["Chunk_Id"])) \
+            .withColumn("Loaded_At", F.current_timestamp())
+
+        # Escrita idempotente: se este bloco já foi escrito numa execução anterior, o Delta ignora-o
+        df_chunk.write.format("delta") \
+            .mode("append") \
+            .partitionBy("Series_Code", "Decade") \
+            .option("txnAppId", backfill_name) \
+            .option("txnVersion", version) \
+            .saveAsTable(table_name)
+
+        spark.createDataFrame(
+            [(backfill_name, chunk["Chunk_Id"], chunk["Series_Code"], chunk["Decade"], table.num_rows)],
+            "Backfill_Name string, Chunk_Id string, Series_Code string, Decade short, Rows long"
+        ).withColumn("Completed_At", F.current_timestamp()) \
+            .write.format("delta").mode("append").saveAsTable(backfill_manifest_table)
+
+        print(f"✅ {chunk['Chunk_Id']}: {table.num_rows} linhas")
+        save_request_metrics(http_client, backfill_name)
+
+    print(f"✅ Backfill concluído em {table_name}")
+
+
+def history_to_wide(table_name, indicators, key_name="Country_Code"):
+    """Formato largo (uma coluna por indicador) a partir da tabela longa do backfill."""
+    return pivot_series(spark.read.table(table_name), indicators, key_name)
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (3) HTTP Transport for the World Bank API
+# By default `wbgapi` calls `requests.get` with no timeout, retry or throttling, so one `429` or `5xx` stops the Gathering notebook halfway through. `WorldBankHttpClient` replaces the `wbgapi` request function (`wb._queryAPI`) with the same contract (`(header, result)` or `wb.APIError`), so the paging in `wb.data.fetch` and everything above stays the same:
+# - **Connection pool:** one `requests.Session` with a pooled `HTTPAdapter`, so the pages of a request reuse the same TLS connection.
+# - **Token bucket:** at most `rate` requests per second, with bursts up to `capacity`. It is thread-safe, so parallel fetches share the same budget.
+# - **Retry with backoff:** `429`, `5xx`, timeouts and connection errors are retried with jittered exponential backoff (`Retry-After` is respected when the API sends it). Other `4xx` fail immediately.
+# - **Circuit breaker:** after `failure_threshold` consecutive failures, calls fail fast for `reset_timeout` seconds instead of hammering the API, then a single trial call decides whether to close the circuit again. While that trial is in flight the other threads keep failing fast (only one caller is let through in `half_open`).
+# - **Latency metrics:** every attempt is recorded in `client.metrics` (status, latency, attempt). `latency_summary()` aggregates them and `save_request_metrics()` appends them to `world_bank.api_request_metrics`.
+#
+# `start_api_stand_in` starts a local HTTP server that answers in the API format with injected latency and errors; `transport_smoke_test()` runs the client against it (no network access needed) and checks the half-open trial; **World Bank Data Gathering (NB)** runs it before the first API call.
+
+# CELL ********************
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+api_metrics_table = "world_bank.api_request_metrics"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Limite de pedidos por segundo (rate) com rajadas até capacity."""
+
+    def __init__(self, rate=5.0, capacity=10):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Abre o circuito após failure_threshold falhas seguidas e volta a testar após reset_timeout segundos.
+
+    Em half_open só passa um pedido de teste; os outros continuam a falhar logo até esse pedido terminar.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Início do pedido de teste em curso (half_open); um teste sem resposta após reset_timeout deixa de contar
+        self.trial_started = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self, url):
+        with self.lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpenError(f"Circuito aberto após {self.failures} falhas seguidas: {url}")
+            if state == "half_open":
+                now = time.monotonic()
+                if self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                    raise CircuitOpenError(f"Circuito em teste (half_open), pedido recusado: {url}")
+                self.trial_started = now
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_started = None
+            # Em half_open uma única falha volta a abrir o circuito
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class WorldBankHttpClient:
+    """Transporte HTTP para o wbgapi: pool de ligações, token bucket, backoff com jitter e circuit breaker."""
+
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate=5.0, burst=10, max_retries=5, backoff_base=0.5, backoff_cap=30.0,
+                 timeout=(5, 60), pool_size=16, failure_threshold=5, reset_timeout=60.0):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.metrics = []
+        self.metrics_lock = threading.Lock()
+
+    def backoff(self, attempt, retry_after=None):
+        # Full jitter: espera aleatória entre 0 e o teto exponencial
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def record(self, url, status, latency, attempt, error=None):
+        with self.metrics_lock:
+            self.metrics.append({
+                "Url": url,
+                "Status": status,
+                "Latency_Ms": round(latency * 1000, 1),
+                "Attempt": attempt,
+                "Error": error,
+                "Requested_At": time.time()
+            })
+
+    def get(self, url):
+        options = {"timeout": self.timeout, **wb.get_options}
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call(url)
+            self.bucket.acquire()
+
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, **options)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record(url, None, time.perf_counter() - start, attempt, type(e).__name__)
+                self.breaker.record_failure()
+                retry_after = None
+            else:
+                self.record(url, response.status_code, time.perf_counter() - start, attempt)
+                if response.status_code not in self.retry_statuses:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff(attempt, retry_after))
+
+        raise wb.APIError(url, f"Sem resposta válida após {self.max_retries + 1} tentativas")
+
+    def query(self, url):
+        """Mesmo contrato que wb._queryAPI: devolve (header, result) ou levanta wb.APIError."""
+        response = self.get(url)
+        if response.status_code != 200:
+            raise wb.APIError(url, response.reason, response.status_code)
+
+        try:
+            result = response.json()
+        except ValueError:
+            raise wb.APIResponseError(url, "JSON decoding error")
+
+        hdr = wb._responseHeader(url, result)
+        if hdr.get("message"):
+            msg = hdr["message"][0]
+            raise wb.APIError(url, "{}: {}".format(msg["key"], msg["value"]))
+        return hdr, result
+
+    def latency_summary(self):
+        with self.metrics_lock:
+            latencies = sorted(m["Latency_Ms"] for m in self.metrics)
+            failed = sum(1 for m in self.metrics if m["Status"] != 200)
+            retries = sum(1 for m in self.metrics if m["Attempt"] > 0)
+        if not latencies:
+            return {"requests": 0}
+        return {
+            "requests": len(latencies),
+            "failed": failed,
+            "retries": retries,
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max_ms": latencies[-1],
+            "circuit": self.breaker.state
+        }
+
+
+def install_http_client(client=None):
+    """Liga o cliente ao wbgapi (todas as chamadas da API passam a usar o transporte)."""
+    client = client or WorldBankHttpClient()
+    wb._queryAPI = client.query
+    return client
+
+
+def save_request_metrics(client, run_name):
+    """Acrescenta as métricas por pedido à tabela world_bank.api_request_metrics e limpa o buffer."""
+    with client.metrics_lock:
+        rows, client.metrics = client.metrics, []
+    if not rows:
+        return
+    spark.createDataFrame(
+        [(run_name, m["Url"], m["Status"], m["Latency_Ms"], m["Attempt"], m["Error"], m["Requested_At"]) for m in rows],
+        "Run_Name string, Url string, Status int, Latency_Ms double, Attempt int, Error string, Requested_At double"
+    ).withColumn("Requested_At", F.col("Requested_At").cast("timestamp")) \
+        .write.format("delta").mode("append").saveAsTable(api_metrics_table)
+
+
+def start_api_stand_in(total_rows=2500, latency=0.0, error_rate=0.0, error_status=503):
+    """Servidor HTTP local que responde no formato da API, com latência e erros injetados."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if random.random() < error_rate:
+                self.send_response(error_status)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+
+            query = parse_qs(urlparse(self.path).query)
+            page, per_page = int(query["page"][0]), int(query["per_page"][0])
+            first = (page - 1) * per_page
+            data = [
+                {"variable": [{"concept": "Economy", "id": f"C{i % 250:03d}"},
+                              {"concept": "Series", "id": "TEST.SERIES"},
+                              {"concept": "Time", "id": 2000 + i // 250}],
+                 "value": float(i)}
+                for i in range(first, min(first + per_page, total_rows))
+            ]
+            body = json.dumps({
+                "page": page, "pages": -(-total_rows // per_page), "per_page": per_page,
+                "total": total_rows, "source": {"id": "2", "data": data}
+            }).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def transport_smoke_test(latency=0.05, error_rate=0.3):
+    """Testa o cliente contra o servidor local: paginação com erros injetados e depois o circuit breaker."""
+    original_endpoint = wb.endpoint
+    server = start_api_stand_in(latency=latency, error_rate=error_rate)
+    try:
+        wb.endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+        # 1. Erros transitórios: todas as páginas chegam apesar das falhas
+        client = WorldBankHttpClient(rate=50, burst=5, backoff_base=0.01, failure_threshold=20)
+        wb._queryAPI = client.query
+        rows = sum(1 for _ in wb.fetch("sources/2/data"))
+        print(f"✅ {rows} linhas recebidas com erros injetados: {client.latency_summary()}")
+
+        # 2. API sempre em erro: o circuito abre e os pedidos seguintes falham logo
+        server.shutdown()
+        server = start_api_stand_in(latency=latency, error_rate=1.0)
+        wb.endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        client = WorldBankHttpClient(rate=50, backoff_base=0.01, max_retries=10, failure_threshold=3)
+        wb._queryAPI = client.query
+        try:
+            list(wb.fetch("sources/2/data"))
+        except CircuitOpenError as e:
+            print(f"✅ Circuit breaker aberto: {e} ({client.latency_summary()})")
+
+        # 3. Half-open: depois do reset_timeout só um pedido de teste passa, os outros são recusados
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        admitted, refused = [], []
+
+        def trial(i):
+            try:
+                breaker.before_call(f"trial-{i}")
+                admitted.append(i)
+            except CircuitOpenError:
+                refused.append(i)
+
+        threads = [threading.Thread(target=trial, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(admitted) == 1, f"half_open deixou passar {len(admitted)} pedidos"
+        breaker.record_success()
+        assert breaker.state == "closed"
+        print(f"✅ Half-open: 1 pedido de teste, {len(refused)} recusados")
+    finally:
+        server.shutdown()
+        wb.endpoint = original_endpoint
+        install_http_client(http_client)
+
+
+# O transporte fica ativo para todos os notebooks que fazem %run deste motor
+http_client = install_http_client()
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (4) Aggregate Membership
+# `ingest_aggregate_membership` writes `world_bank.aggregate_membership`, one row per aggregate code and member economy (`WLD`, regions such as `SSF`, income groups such as `HIC`, lending groups such as `IDX`). It is the reference used by **Gold Cleaning Tables** to recompute the benchmark aggregates from the country facts. Region, income and lending groups come from the API group lists (`wb.region/income/lending.members`). `WLD` is every non-aggregate economy. Totals that are unions of other groups (`IDA`, `IBT`, `LMY`, `MIC`) are built from their parts when the API has no list for them.
+
+# CELL ********************
+
+aggregate_membership_table = "world_bank.aggregate_membership"
+
+# Agregados que são a união de outros grupos
+composite_aggregates = {
+    "IDA": ["IDB", "IDX"],
+    "IBT": ["IBD", "IDB", "IDX"],
+    "LMY": ["LIC", "LMC", "UMC"],
+    "MIC": ["LMC", "UMC"]
+}
+
+
+def fetch_aggregate_membership():
+    """Lista (Aggregate_Code, Country_Code, Group_Type) de todos os agregados da base de dados."""
+    economies = list(wb.economy.list())
+    countries = {e["id"] for e in economies if not e["aggregate"]}
+    aggregates = sorted(e["id"] for e in economies if e["aggregate"])
+    income_groups = {g["id"] for g in wb.income.list()}
+    lending_groups = {g["id"] for g in wb.lending.list()}
+
+    members = {"WLD": ("world", countries)}
+    for code in aggregates:
+        if code == "WLD":
+            continue
+        if code in income_groups:
+            group_type, found = "income", wb.income.members(code)
+        elif code in lending_groups:
+            group_type, found = "lending", wb.lending.members(code)
+        else:
+            group_type, found = "region", wb.region.members(code)
+        members[code] = (group_type, found & countries)
+
+    for code, parts in composite_aggregates.items():
+        if code in aggregates and not members.get(code, (None, set()))[1]:
+            members[code] = ("composite", set().union(*(members.get(p, (None, set()))[1] for p in parts)))
+
+    empty = [code for code, (_, found) in members.items() if not found]
+    if empty:
+        print(f"⚠️ Agregados sem membros na API: {empty}")
+
+    return [
+        (code, country, group_type)
+        for code, (group_type, found) in sorted(members.items())
+        for country in sorted(found)
+    ]
+
+
+def ingest_aggregate_membership(table_name=aggregate_membership_table):
+    rows = fetch_aggregate_membership()
+    df_members = spark.createDataFrame(rows, "Aggregate_Code string, Country_Code string, Group_Type string")
+
+    df_members.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .option("description", "Member economies of each World Bank aggregate (region, income, lending, world)") \
+        .saveAsTable(table_name)
+
+    print(f"✅ {table_name} gravada ({df_members.select('Aggregate_Code').distinct().count()} agregados, {len(rows)} linhas)")
+    save_request_metrics(http_client, table_name)
+    return df_members
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
+
+# MARKDOWN ********************
+
+# ## (5) Registry-Driven Ingestion
+# `ingest_registry` loads the Bronze tables listed in **World Bank Source Registry (NB)** (run it with `%run` before calling). It writes every table that is due (see `Cadence`), or only the tables passed in `tables`:
+# 1. Each series is fetched **once**, over the widest year range of the tables that use it. Series that share the same range go in the same API request, so `IT.NET.USER.ZS`, read by two tables, costs one fetch.
+# 2. Every table is pivoted from the same long Arrow data with `pivot_series`, keeping only its own series and years. The column names come from the registry and the unit of each series becomes the column comment.
+# 3. The tables are written with `save_wide`, as `ingest_world_bank` does.
+
+# CELL ********************
+
+from datetime import datetime, timezone
+from functools import reduce
+
+
+def table_is_due(table_name, days):
+    """True se a tabela não existe ou se o último commit Delta tem mais de days dias."""
+    if not spark.catalog.tableExists(table_name):
+        return True
+    return spark.sql(f"DESCRIBE HISTORY {table_name} LIMIT 1") \
+        .select((F.col("timestamp") < F.expr(f"current_timestamp() - INTERVAL {days} DAYS")).alias("Due")) \
+        .first()["Due"]
+
+
+def registry_fetch_plan(rows):
+    """{(Start_Year, End_Year): [Series_Code]}: cada série uma vez, no intervalo mais largo das suas tabelas."""
+    current_year = datetime.now(timezone.utc).year
+    windows = {}
+    for row in rows:
+        start, end = row["Start_Year"], row["End_Year"] or current_year
+        previous = windows.get(row["Series_Code"], (start, end))
+        windows[row["Series_Code"]] = (min(previous[0], start), max(previous[1], end))
+
+    plan = {}
+    for code, window in sorted(windows.items()):
+        plan.setdefault(window, []).append(code)
+    return plan
+
+
+def ingest_registry(tables=None, force=False):
+    """Descarrega cada série do registo uma vez e grava todas as tabelas da Bronze que a usam."""
+    rows = registry_rows()
+    table_names = list(dict.fromkeys(r["Target_Table"] for r in rows)) if tables is None else list(tables)
+    unknown = [t for t in table_names if t not in registry_targets]
+    if unknown:
+        raise ValueError(f"Tabelas que não estão no registo: {unknown}")
+
+    due = [
+        t for t in table_names
+        if force or table_is_due(t, min(cadence_days[r["Cadence"]] for r in rows if r["Target_Table"] == t))
+    ]
+    skipped = [t for t in table_names if t not in due]
+    if skipped:
+        print(f"⏭️ Dentro da cadência, não atualizadas: {skipped}")
+    if not due:
+        return {}
+    rows = [r for r in rows if r["Target_Table"] in due]
+
+    # 1. Um pedido à API por intervalo de anos, cada série uma só vez
+    df_long = None
+    for (start, end), codes in registry_fetch_plan(rows).items():
+        batches = iter_record_batches(iter_world_bank_rows(codes, time=range(start, end + 1)))
+        part, part_rows, part_size = batches_to_spark(batches)
+        print(f"📥 {len(codes)} séries, {start}-{end}: {part_rows} linhas ({part_size / 1024:.0f} KB em Arrow)")
+        df_long = part if df_long is None else df_long.unionByName(part)
+    print(f"📊 API: {http_client.latency_summary()}")
+    save_request_metrics(http_client, source_registry_table)
+
+    # 2. Cada tabela fica só com as suas séries e anos
+    current_year = datetime.now(timezone.utc).year
+    written = {}
+    for table_name in due:
+        target = registry_targets[table_name]
+        target_rows = [r for r in rows if r["Target_Table"] == table_name]
+        in_range = reduce(lambda a, b: a | b, [
+            (F.col("Series_Code") == r["Series_Code"]) & F.col("Year").between(r["Start_Year"], r["End_Year"] or current_year)
+            for r in target_rows
+        ])
+
+        df_wide = pivot_series(df_long.filter(in_range), registry_indicators(table_name), target["key_name"])
+        for r in target_rows:
+            df_wide = df_wide.withMetadata(r["Table_Column"], {"comment": r["Unit"]})
+
+        spark.sql(f"CREATE SCHEMA IF NOT EXISTS {table_name.rsplit('.', 1)[0]}")
+        written[table_name] = save_wide(df_wide, table_name, target["key_name"], target.get("description"))
+        print(f"✅ {table_name} gravada ({len(target_rows)} indicadores)")
+
+    return written
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }
@@ -0,0 +1,179 @@
+# Fabric notebook source
+
+# METADATA ********************
+
+# META {
+# META   "kernel_info": {
+# META     "name": "synapse_pyspark"
+# META   },
+# META   "dependencies": {}
+# META }
+
+# MARKDOWN ********************
+
+# # (1) World Bank Source Registry
+# Single list of every World Bank series loaded into Bronze, used by **World Bank Data Gathering (NB)** through `%run` (after **World Bank Ingestion Engine (NB)**). `ingest_registry` reads it, fetches each series **once** (over the widest year range any table asks for) and writes every table that uses it. Adding an indicator is one line in `source_registry`; a new Bronze table is one entry in `registry_targets`.
+#
+# One row of `source_registry` per series and target table:
+# - **Series_Code:** the World Bank series (`SP.POP.TOTL`);
+# - **Column:** the canonical column name of the series. A series has one name and one unit in the whole registry, checked by `registry_rows`;
+# - **Unit:** unit of the values, written as the column comment of the Delta table;
+# - **Target_Table:** the Bronze table that gets the column (one of `registry_targets`);
+# - **Start_Year / End_Year:** years kept in that table (`End_Year = None` is the current year);
+# - **Cadence:** how often the table is refreshed (`monthly`, `quarterly` or `yearly`). A table is rewritten when its last Delta commit is older than the shortest cadence of its series, or always with `force=True`.
+#
+# `registry_targets` holds what belongs to the table and not to a series: the country key column, the table description, the `*_history` table of the backfill and `columns`, the names the table still uses instead of the canonical ones. Those names (`Internet_Access`, `Female_Account_Ownership`) and the key columns (`Country_Code`, `country_code_iso3`, `Country_Code_Iso3`) are read by the Silver and Gold notebooks, so they are kept until those notebooks move to the canonical names. `save_source_registry` writes the resolved registry to `bronze_lakehouse.reference_database.source_registry`.
+
+# CELL ********************
+
+source_registry_table = "bronze_lakehouse.reference_database.source_registry"
+
+cadence_days = {"monthly": 31, "quarterly": 92, "yearly": 366}
+
+# (Series_Code, Column, Unit, Target_Table, Start_Year, End_Year, Cadence)
+source_registry = [
+    # Demografia e migração
+    ("SP.POP.TOTL", "Pop_Total_Count", "persons", "bronze_lakehouse.world_bank.population_migration", 2010, 2025, "yearly"),
+    ("SP.POP.TOTL.MA.IN", "Pop_Male_Count", "persons", "bronze_lakehouse.world_bank.population_migration", 2010, 2025, "yearly"),
+    ("SP.POP.TOTL.FE.IN", "Pop_Female_Count", "persons", "bronze_lakehouse.world_bank.population_migration", 2010, 2025, "yearly"),
+    ("SM.POP.TOTL", "Migrant_Stock_Total_Count", "persons", "bronze_lakehouse.world_bank.population_migration", 2010, 2025, "yearly"),
+    ("SM.MET.NETM", "Net_Migration_Flow", "persons", "bronze_lakehouse.world_bank.population_migration", 2010, 2025, "yearly"),
+    ("SP.DYN.TFRT.IN", "Fertility_Rate_Births_Per_Woman", "births per woman", "bronze_lakehouse.world_bank.fertility_rates", 2010, 2025, "yearly"),
+
+    # Emprego
+    ("SL.UEM.TOTL.ZS", "Unemployment_Total", "% of total labor force", "bronze_lakehouse.world_bank.Unemployment", 2010, 2025, "quarterly"),
+    ("SL.UEM.TOTL.FE.ZS", "Unemployment_Female", "% of female labor force", "bronze_lakehouse.world_bank.Unemployment", 2010, 2025, "quarterly"),
+    ("SL.UEM.TOTL.MA.ZS", "Unemployment_Male", "% of male labor force", "bronze_lakehouse.world_bank.Unemployment", 2010, 2025, "quarterly"),
+
+    # Perguntas de nível 2 (antes mrv=40)
+    ("SE.XPD.TOTL.GD.ZS", "Gov_Education_Exp_Pct_GDP", "% of GDP", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("SE.SEC.NENR", "School_Enrollment_Secondary_Net_Pct", "% net", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("IT.NET.USER.ZS", "Internet_Usage_Pct_Pop", "% of population", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("SI.POV.DDAY", "Poverty_Headcount_Ratio_2_15_Day", "% of population", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("FX.OWN.TOTL.FE.ZS", "Account_Ownership_Female_Pct", "% of female population age 15+", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("WP_time_01.2", "Digital_Payments_Past_Year_Female_Pct", "% of female population age 15+", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+    ("SL.TLF.CACT.FE.ZS", "Labor_Force_Participation_Female_Pct", "% of female population age 15+", "bronze_lakehouse.world_bank.social_development_indicators", 1985, None, "yearly"),
+
+    # Barreiras sociais
+    ("SE.PRM.TENR", "School_Attendance", "% of primary school age children", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+    ("SE.ADT.LITR.ZS", "Literacy_Rate", "% of people ages 15 and above", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+    ("IT.NET.USER.ZS", "Internet_Usage_Pct_Pop", "% of population", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+    ("FX.OWN.TOTL.FE.ZS", "Account_Ownership_Female_Pct", "% of female population age 15+", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+    ("SH.DYN.MORT", "Child_Mortality_Rate", "per 1,000 live births", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+    ("SP.DYN.LE00.IN", "Life_Expectancy", "years", "bronze_lakehouse.world_bank.Fact_Social_Barriers", 2010, 2024, "yearly"),
+
+    # Economia
+    ("NY.GDP.PCAP.PP.CD", "GDP_Per_Capita", "current international $ (PPP)", "bronze_lakehouse.world_bank.Economic_Indicators", 2010, 2024, "quarterly"),
+    ("FP.CPI.TOTL.ZG", "Inflation_CPI_Pct", "annual %", "bronze_lakehouse.world_bank.Economic_Indicators", 2010, 2024, "quarterly"),
+    ("NY.GDP.MKTP.KD.ZG", "GDP_Growth_Annual_Pct", "annual %", "bronze_lakehouse.world_bank.Economic_Indicators", 2010, 2024, "quarterly"),
+
+    # Fatores de conversão (Gold: rendimentos em dólares PPP constantes)
+    ("PA.NUS.PPP", "PPP_Conversion_Factor", "LCU per international $", "bronze_lakehouse.reference_database.conversion_factors", 2010, 2024, "yearly"),
+    ("PA.NUS.PRVT.PP", "PPP_Private_Consumption_Factor", "LCU per international $", "bronze_lakehouse.reference_database.conversion_factors", 2010, 2024, "yearly"),
+    ("PA.NUS.FCRF", "Exchange_Rate_LCU_per_USD", "LCU per US$, period average", "bronze_lakehouse.reference_database.conversion_factors", 2010, 2024, "yearly")
+]
+
+# O que é da tabela e não da série (columns: nomes antigos ainda lidos pela Silver/Gold)
+# history_table sem o prefixo do lakehouse: o nome faz parte da identidade do backfill (retoma pelo manifesto)
+registry_targets = {
+    "bronze_lakehouse.world_bank.population_migration": {
+        "key_name": "Country_Code",
+        "description": "Global population counts and migration flows sourced from World Bank API",
+        "history_table": "world_bank.population_migration_history"
+    },
+    "bronze_lakehouse.world_bank.fertility_rates": {
+        "key_name": "Country_Code",
+        "description": "Total fertility rate (births per woman) sourced from World Bank API",
+        "history_table": "world_bank.fertility_rates_history"
+    },
+    "bronze_lakehouse.world_bank.Unemployment": {
+        "key_name": "country_code_iso3",
+        "history_table": "world_bank.unemployment_history"
+    },
+    "bronze_lakehouse.world_bank.social_development_indicators": {
+        "key_name": "Country_Code",
+        "description": "Social and education indicators (Gini, Poverty, Education) sourced from World Bank"
+    },
+    "bronze_lakehouse.world_bank.Fact_Social_Barriers": {
+        "key_name": "Country_Code",
+        "history_table": "world_bank.social_barriers_history",
+        "columns": {
+            "Internet_Usage_Pct_Pop": "Internet_Access",
+            "Account_Ownership_Female_Pct": "Female_Account_Ownership"
+        }
+    },
+    "bronze_lakehouse.world_bank.Economic_Indicators": {
+        "key_name": "Country_Code",
+        "history_table": "world_bank.economic_indicators_history"
+    },
+    "bronze_lakehouse.reference_database.conversion_factors": {
+        "key_name": "Country_Code_Iso3",
+        "description": "PPP conversion factors and official exchange rates sourced from World Bank"
+    }
+}
+
+registry_fields = ["Series_Code", "Column", "Unit", "Target_Table", "Start_Year", "End_Year", "Cadence"]
+
+
+def registry_rows(registry=None, targets=None):
+    """Linhas do registo como dicionários, com Table_Column e Key_Column resolvidos (valida o registo)."""
+    registry = source_registry if registry is None else registry
+    targets = registry_targets if targets is None else targets
+
+    rows, names, seen = [], {}, set()
+    for entry in registry:
+        row = dict(zip(registry_fields, entry))
+        code, table_name = row["Series_Code"], row["Target_Table"]
+        if table_name not in targets:
+            raise ValueError(f"{code}: tabela {table_name} não está em registry_targets")
+        if row["Cadence"] not in cadence_days:
+            raise ValueError(f"{code}: cadência desconhecida '{row['Cadence']}' (esperado um de {list(cadence_days)})")
+        if (code, table_name) in seen:
+            raise ValueError(f"{code} aparece duas vezes para {table_name}")
+        if names.setdefault(code, (row["Column"], row["Unit"])) != (row["Column"], row["Unit"]):
+            raise ValueError(f"{code} tem dois nomes ou unidades no registo: {names[code]} e {(row['Column'], row['Unit'])}")
+        seen.add((code, table_name))
+
+        target = targets[table_name]
+        row["Table_Column"] = target.get("columns", {}).get(row["Column"], row["Column"])
+        row["Key_Column"] = target["key_name"]
+        rows.append(row)
+
+    for table_name, target in targets.items():
+        stale = set(target.get("columns", {})) - {r["Column"] for r in rows if r["Target_Table"] == table_name}
+        if stale:
+            raise ValueError(f"{table_name}: columns com nomes que não estão no registo: {sorted(stale)}")
+    return rows
+
+
+def registry_indicators(table_name):
+    """{Series_Code: coluna} de uma tabela, no formato dos dicionários do motor de ingestão."""
+    return {r["Series_Code"]: r["Table_Column"] for r in registry_rows() if r["Target_Table"] == table_name}
+
+
+def save_source_registry(table_name=source_registry_table):
+    """Grava o registo resolvido (uma linha por série e tabela) na reference_database."""
+    rows = registry_rows()
+    spark.sql(f"CREATE SCHEMA IF NOT EXISTS {table_name.rsplit('.', 1)[0]}")
+    df_registry = spark.createDataFrame(
+        [(r["Series_Code"], r["Column"], r["Table_Column"], r["Unit"], r["Target_Table"], r["Key_Column"],
+          r["Start_Year"], r["End_Year"], r["Cadence"]) for r in rows],
+        "Series_Code string, Column_Name string, Table_Column string, Unit string, Target_Table string, "
+        "Key_Column string, Start_Year int, End_Year int, Cadence string"
+    )
+
+    df_registry.write.format("delta") \
+        .mode("overwrite") \
+        .option("overwriteSchema", "true") \
+        .option("description", "World Bank series loaded into Bronze: canonical column, unit, target table, years and cadence") \
+        .saveAsTable(table_name)
+
+    print(f"✅ {table_name} gravada ({len({r['Series_Code'] for r in rows})} séries, {len(rows)} linhas)")
+    return df_registry
+
+# METADATA ********************
+
+# META {
+# META   "language": "python",
+# META   "language_group": "synapse_pyspark"
+# META }